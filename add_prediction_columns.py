@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Migration script to add in-flight prediction columns to avatar_requests table.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# Load environment variables
+load_dotenv()
+
+# Get database URL
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("❌ DATABASE_URL not set!")
+    sys.exit(1)
+
+def add_prediction_columns():
+    """Add prediction_provider and prediction_id columns to avatar_requests table."""
+    print("=" * 60)
+    print("Adding prediction columns to avatar_requests table")
+    print("=" * 60)
+    
+    # Create engine
+    engine = create_engine(DATABASE_URL)
+    
+    try:
+        with engine.connect() as conn:
+            # Check if columns already exist
+            result = conn.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'avatar_requests' 
+                AND column_name IN ('prediction_provider', 'prediction_id')
+            """)).fetchall()
+            
+            existing_columns = [row[0] for row in result]
+            print(f"Existing columns: {existing_columns}")
+            
+            # Add prediction_provider column if it doesn't exist
+            if 'prediction_provider' not in existing_columns:
+                print("\nAdding prediction_provider column...")
+                conn.execute(text("""
+                    ALTER TABLE avatar_requests 
+                    ADD COLUMN prediction_provider VARCHAR(20) NULL
+                """))
+                conn.commit()
+                print("✅ Added prediction_provider column")
+            else:
+                print("⚠️  prediction_provider column already exists")
+            
+            # Add prediction_id column if it doesn't exist
+            if 'prediction_id' not in existing_columns:
+                print("\nAdding prediction_id column...")
+                conn.execute(text("""
+                    ALTER TABLE avatar_requests 
+                    ADD COLUMN prediction_id VARCHAR(100) NULL
+                """))
+                conn.commit()
+                print("✅ Added prediction_id column")
+            else:
+                print("⚠️  prediction_id column already exists")
+            
+            # Verify columns were added
+            result = conn.execute(text("""
+                SELECT column_name, data_type, is_nullable
+                FROM information_schema.columns 
+                WHERE table_name = 'avatar_requests' 
+                AND column_name IN ('prediction_provider', 'prediction_id')
+                ORDER BY column_name
+            """)).fetchall()
+            
+            print("\n" + "-" * 40)
+            print("Prediction columns in avatar_requests table:")
+            for col_name, data_type, is_nullable in result:
+                print(f"  - {col_name}: {data_type} (nullable: {is_nullable})")
+            
+            print("\n✅ Migration completed successfully!")
+            
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
+    
+    finally:
+        engine.dispose()
+    
+    print("=" * 60)
+
+if __name__ == "__main__":
+    add_prediction_columns()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the request_attempt idempotency key to generation_jobs table.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# Load environment variables
+load_dotenv()
+
+# Get database URL
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("❌ DATABASE_URL not set!")
+    sys.exit(1)
+
+def add_request_attempt_column():
+    """Add request_attempt column and its unique constraint to generation_jobs table."""
+    print("=" * 60)
+    print("Adding request_attempt column to generation_jobs table")
+    print("=" * 60)
+    
+    # Create engine
+    engine = create_engine(DATABASE_URL)
+    
+    try:
+        with engine.connect() as conn:
+            # Check if column already exists
+            result = conn.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'generation_jobs' 
+                AND column_name = 'request_attempt'
+            """)).fetchall()
+            
+            if not result:
+                print("\nAdding request_attempt column...")
+                conn.execute(text("""
+                    ALTER TABLE generation_jobs 
+                    ADD COLUMN request_attempt INTEGER NULL
+                """))
+                conn.commit()
+                print("✅ Added request_attempt column")
+            else:
+                print("⚠️  request_attempt column already exists")
+            
+            # Check if unique constraint already exists
+            result = conn.execute(text("""
+                SELECT constraint_name 
+                FROM information_schema.table_constraints 
+                WHERE table_name = 'generation_jobs' 
+                AND constraint_name = 'uq_generation_jobs_request_attempt'
+            """)).fetchall()
+            
+            if not result:
+                # Jobs enqueued before this migration have no attempt (NULLs never collide)
+                print("\nAdding uq_generation_jobs_request_attempt constraint...")
+                conn.execute(text("""
+                    ALTER TABLE generation_jobs 
+                    ADD CONSTRAINT uq_generation_jobs_request_attempt 
+                    UNIQUE (request_id, request_attempt)
+                """))
+                conn.commit()
+                print("✅ Added uq_generation_jobs_request_attempt constraint")
+            else:
+                print("⚠️  uq_generation_jobs_request_attempt constraint already exists")
+            
+            print("\n✅ Migration completed successfully!")
+            
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
+    
+    finally:
+        engine.dispose()
+    
+    print("=" * 60)
+
+if __name__ == "__main__":
+    add_request_attempt_column()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the generation tier column to avatar_requests table.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# Load environment variables
+load_dotenv()
+
+# Get database URL
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("❌ DATABASE_URL not set!")
+    sys.exit(1)
+
+def add_tier_column():
+    """Add tier column to avatar_requests table."""
+    print("=" * 60)
+    print("Adding tier column to avatar_requests table")
+    print("=" * 60)
+    
+    # Create engine
+    engine = create_engine(DATABASE_URL)
+    
+    try:
+        with engine.connect() as conn:
+            # Check if column already exists
+            result = conn.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'avatar_requests' 
+                AND column_name = 'tier'
+            """)).fetchall()
+            
+            existing_columns = [row[0] for row in result]
+            print(f"Existing columns: {existing_columns}")
+            
+            # Add tier column if it doesn't exist
+            if 'tier' not in existing_columns:
+                print("\nAdding tier column...")
+                conn.execute(text("""
+                    ALTER TABLE avatar_requests 
+                    ADD COLUMN tier VARCHAR(20) NULL
+                """))
+                conn.commit()
+                print("✅ Added tier column")
+            else:
+                print("⚠️  tier column already exists")
+            
+            # Verify column was added
+            result = conn.execute(text("""
+                SELECT column_name, data_type, is_nullable
+                FROM information_schema.columns 
+                WHERE table_name = 'avatar_requests' 
+                AND column_name = 'tier'
+            """)).fetchall()
+            
+            print("\n" + "-" * 40)
+            print("Tier column in avatar_requests table:")
+            for col_name, data_type, is_nullable in result:
+                print(f"  - {col_name}: {data_type} (nullable: {is_nullable})")
+            
+            print("\n✅ Migration completed successfully!")
+            
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        sys.exit(1)
+    
+    finally:
+        engine.dispose()
+    
+    print("=" * 60)
+
+if __name__ == "__main__":
+    add_tier_column()
@@ -1,5 +1,6 @@
 """Superhero Avatar Generator - Main Streamlit Application."""
 
+import hashlib
 import os
 import time
 from pathlib import Path
@@ -10,20 +11,25 @@ from PIL import Image
 from dotenv import load_dotenv
 
 from config import AppConfig
-from image_generator import ImageGenerator
+from circuit_breaker import get_breaker_states
 from database import db_manager
+from generation_executor import generation_executor
+from generation_pipeline import run_generation_pipeline, save_variant
+from generation_queue import enqueue_generation
+from metrics import metrics
+from model_versions import warm_model_versions
+from variant_prefetcher import variant_prefetcher
 from utils import (
     validate_name,
     validate_email_address,
     validate_car_input,
     validate_color_input,
     save_image,
-    generate_unique_filename,
-    create_participant_record,
     show_error,
     show_success,
     show_info,
     reset_session_state,
+    cancel_generation,
     format_generation_time
 )
 
@@ -60,6 +66,41 @@ def init_session_state():
         st.session_state.generation_time = None
     if "request_id" not in st.session_state:
         st.session_state.request_id = None
+    if "generation_job" not in st.session_state:
+        st.session_state.generation_job = None
+    if "variant_pool" not in st.session_state:
+        st.session_state.variant_pool = []
+    if "speculative_key" not in st.session_state:
+        st.session_state.speculative_key = None
+    if "generation_attempt" not in st.session_state:
+        st.session_state.generation_attempt = 0
+
+# Reattach a reconnecting browser to its in-flight generation
+def resume_in_flight_request():
+    """Restore a request that is still generating after a browser refresh."""
+    request_id = st.query_params.get("request_id")
+    if not request_id or st.session_state.request_id:
+        return
+    
+    try:
+        request = db_manager.get_request(request_id)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return
+    
+    if request and request["status"] == "processing" and request["prediction_id"]:
+        st.session_state.request_id = request_id
+        # Same attempt as before the refresh, so the generation is joined, not repeated
+        try:
+            st.session_state.generation_attempt = int(st.query_params.get("attempt", 0))
+        except ValueError:
+            st.session_state.generation_attempt = 0
+        st.session_state.form_data = {
+            key: request[key] for key in ("name", "email", "superhero", "car", "color")
+        }
+        st.session_state.step = 4
+    else:
+        del st.query_params["request_id"]
 
 # Step indicator
 def show_step_indicator(current_step: int):
@@ -199,10 +240,18 @@ def step_photo_capture():
             st.session_state.photo = Image.open(uploaded_file)
             st.image(st.session_state.photo, caption="Your photo", use_container_width=True)
     
+    # Start generating while the user looks at their photo (the upload wins,
+    # as it does for st.session_state.photo above)
+    captured = uploaded_file if uploaded_file is not None else photo
+    if AppConfig.ENABLE_SPECULATIVE_GENERATION and captured is not None:
+        start_speculative_generation(hashlib.sha256(captured.getvalue()).hexdigest())
+    
     col1, col2 = st.columns(2)
     
     with col1:
         if st.button("← Back", key="back_3", use_container_width=True):
+            # Preferences may change, so a speculative job would be wasted
+            discard_speculative_generation()
             st.session_state.step = 2
             st.rerun()
     
@@ -211,158 +260,244 @@ def step_photo_capture():
             if st.session_state.photo is None:
                 show_error("Please take or upload a photo first")
             else:
+                if st.session_state.generation_job is not None:
+                    metrics.increment("speculative_generations_total", result="used")
                 st.session_state.step = 4
                 st.rerun()
 
+def start_speculative_generation(photo_key: str) -> None:
+    """Start generating for a captured photo before the user confirms it.
+    
+    A different photo cancels the running speculative job and starts a new
+    one; the Generate click then reattaches to whichever job is running.
+    
+    Args:
+        photo_key: Content hash of the captured photo
+    """
+    if st.session_state.generation_job is not None:
+        if st.session_state.speculative_key == photo_key:
+            return
+        discard_speculative_generation()
+    
+    try:
+        start_generation()
+    except Exception as e:
+        # Not fatal - the Generate click submits the job instead
+        print(f"Could not start speculative generation: {e}")
+        return
+    st.session_state.speculative_key = photo_key
+    metrics.increment("speculative_generations_total", result="started")
+
+def discard_speculative_generation() -> None:
+    """Cancel a speculative generation and delete its request.
+    
+    The user never asked for this avatar, so a retake or Back leaves no
+    failed request behind.
+    """
+    if st.session_state.generation_job is None:
+        return
+    request_id = st.session_state.request_id
+    cancel_generation()
+    metrics.increment("speculative_generations_total", result="discarded")
+    if request_id:
+        try:
+            db_manager.delete_request(request_id)
+        except Exception as e:
+            print(f"Could not discard speculative request: {e}")
+
+# Start generation in the background
+def start_generation():
+    """Create the database request and submit its generation job.
+    
+    Returns:
+        Job handle to poll for progress and result, also kept in
+        st.session_state.generation_job
+    """
+    # Validate configuration
+    AppConfig.validate()
+    
+    # A tier in the URL (e.g. ?tier=express) pins this session's
+    # generation tier; otherwise the pipeline picks one by load
+    requested_tier = st.query_params.get("tier")
+    if requested_tier in AppConfig.GENERATION_TIERS:
+        st.session_state.form_data["tier"] = requested_tier
+    
+    # Create database request if not already created
+    if not st.session_state.request_id:
+        try:
+            st.session_state.request_id = db_manager.create_avatar_request(
+                name=st.session_state.form_data["name"],
+                email=st.session_state.form_data["email"],
+                superhero=st.session_state.form_data["superhero"],
+                car=st.session_state.form_data["car"],
+                color=st.session_state.form_data["color"],
+                tier=st.session_state.form_data.get("tier")
+            )
+            # Keep the request in the URL so a refreshed browser can reattach
+            st.query_params["request_id"] = st.session_state.request_id
+        except Exception as e:
+            print(f"Database error: {e}")
+            # Continue even if database fails
+    
+    # Duplicate submissions of one attempt (double clicks, interrupted reruns,
+    # refreshes) attach to the job already in flight. Attempts after the
+    # first (Regenerate, Try Again) must not repeat a cached avatar
+    attempt = st.session_state.generation_attempt
+    if st.session_state.request_id:
+        st.query_params["attempt"] = str(attempt)
+    
+    if AppConfig.GENERATION_BACKEND == "queue" and st.session_state.request_id:
+        # Worker processes pick the job up from Postgres
+        job = enqueue_generation(
+            st.session_state.photo,
+            st.session_state.request_id,
+            attempt
+        )
+    elif st.session_state.request_id:
+        job = generation_executor.submit_once(
+            (st.session_state.request_id, attempt),
+            run_generation_pipeline,
+            st.session_state.photo,
+            dict(st.session_state.form_data),
+            st.session_state.request_id,
+            variants=AppConfig.GENERATION_VARIANTS,
+            regenerate=attempt > 0
+        )
+    else:
+        job = generation_executor.submit(
+            run_generation_pipeline,
+            st.session_state.photo,
+            dict(st.session_state.form_data),
+            st.session_state.request_id,
+            variants=AppConfig.GENERATION_VARIANTS,
+            regenerate=attempt > 0
+        )
+    st.session_state.generation_job = job
+    st.session_state.variant_pool = []
+    return job
+
 # Step 4: Generate Avatar
 def step_generate_avatar():
     """Generate the superhero avatar."""
     st.header("🎨 Creating your superhero avatar...")
     
+    # Let booth staff know when a provider is being bypassed
+    for provider, state in get_breaker_states().items():
+        if state != "closed":
+            st.caption(f"⚠️ {provider.title()} is having trouble ({state.replace('_', '-')}) - using a backup or failing fast")
+    
     # Show progress
     progress_bar = st.progress(0)
     status_text = st.empty()
     
     try:
-        # Validate configuration
-        AppConfig.validate()
+        job = st.session_state.generation_job
         
-        # Create database request if not already created
-        if not st.session_state.request_id:
-            try:
-                st.session_state.request_id = db_manager.create_avatar_request(
-                    name=st.session_state.form_data["name"],
-                    email=st.session_state.form_data["email"],
-                    superhero=st.session_state.form_data["superhero"],
-                    car=st.session_state.form_data["car"],
-                    color=st.session_state.form_data["color"]
-                )
-                status_text.text("Request saved to database...")
-                progress_bar.progress(10)
-            except Exception as e:
-                print(f"Database error: {e}")
-                # Continue even if database fails
-        
-        # Update status to processing
-        if st.session_state.request_id:
-            try:
-                db_manager.update_request_processing(st.session_state.request_id)
-            except Exception as e:
-                print(f"Database update error: {e}")
+        # Submit generation to the background pool on first run of this step
+        if job is None:
+            job = start_generation()
         
-        # Initialize generator
-        status_text.text("Initializing AI model...")
-        progress_bar.progress(20)
-        generator = ImageGenerator()
+        progress_bar.progress(job.progress)
+        status_text.text(job.message)
         
-        # Generate avatar
-        status_text.text("Transforming you into a superhero...")
-        progress_bar.progress(50)
-        
-        avatar, generation_time, error = generator.generate_avatar(
-            st.session_state.photo,
-            st.session_state.form_data["superhero"],
-            st.session_state.form_data["color"],
-            st.session_state.form_data["car"]
-        )
+        # Poll until the worker finishes; reruns reattach to the same job
+        if not job.done():
+            if st.button("← Back", key="cancel_generation", use_container_width=True):
+                # Stop the prediction rather than leave it running on the provider
+                cancel_generation()
+                st.session_state.step = 3
+                st.rerun()
+            time.sleep(AppConfig.GENERATION_POLL_INTERVAL_SECONDS)
+            st.rerun()
         
-        progress_bar.progress(80)
+        outcome = job.result()
         
-        if error:
-            show_error(f"Generation failed: {error}")
-            # Update database with failure
-            if st.session_state.request_id:
-                try:
-                    db_manager.update_request_failed(st.session_state.request_id, error)
-                except Exception as e:
-                    print(f"Database update error: {e}")
+        if outcome["error"]:
+            show_error(f"Generation failed: {outcome['error']}")
             if st.button("← Try Again", use_container_width=True):
+                st.session_state.generation_job = None
+                st.session_state.generation_attempt += 1
                 st.session_state.step = 3
                 st.rerun()
         else:
-            # Save images
-            status_text.text("Saving your avatar...")
-            progress_bar.progress(85)
-            
-            try:
-                # Save original
-                original_filename = generate_unique_filename("original", "jpg")
-                original_path = save_image(
-                    st.session_state.photo,
-                    AppConfig.ORIGINALS_DIR,
-                    original_filename
-                )
-                
-                progress_bar.progress(90)
-                
-                # Save avatar
-                avatar_filename = generate_unique_filename("avatar", "png")
-                avatar_path = save_image(
-                    avatar,
-                    AppConfig.AVATARS_DIR,
-                    avatar_filename
-                )
-                
-                progress_bar.progress(95)
-            except Exception as e:
-                print(f"Error saving images: {e}")
-                # Continue anyway - we have the generated avatar in memory
-                original_path = f"temp_{original_filename}"
-                avatar_path = f"temp_{avatar_filename}"
-            
-            # Create participant record
-            if AppConfig.ENABLE_EMAIL_CAPTURE:
-                record = create_participant_record(
-                    st.session_state.form_data["name"],
-                    st.session_state.form_data["email"],
-                    st.session_state.form_data["superhero"],
-                    st.session_state.form_data["car"],
-                    st.session_state.form_data["color"],
-                    original_path,
-                    avatar_path,
-                    generation_time
-                )
-            
-            # Update database with success
-            if st.session_state.request_id:
-                try:
-                    db_manager.update_request_completed(
-                        st.session_state.request_id,
-                        generation_time,
-                        original_path,
-                        avatar_path
-                    )
-                except Exception as e:
-                    print(f"Database update error: {e}")
-            
             progress_bar.progress(100)
             status_text.text("Complete!")
             
-            # Store results
-            st.session_state.generated_avatar = avatar
-            st.session_state.generation_time = generation_time
+            # Store results (a prefetched Regenerate variant is saved once shown)
+            if outcome.get("prefetched"):
+                show_variant(outcome["avatar"], outcome["generation_time"])
+            else:
+                st.session_state.generated_avatar = outcome["avatar"]
+                st.session_state.generation_time = outcome["generation_time"]
+            # Extra variants from the same call, served by Regenerate
+            st.session_state.variant_pool = list(outcome.get("variants") or [])
+            st.session_state.generation_job = None
+            # A later Regenerate is a new attempt, not a duplicate of this one
+            st.session_state.generation_attempt += 1
             st.session_state.step = 5
             
-            time.sleep(1)
+            # Pause on "Complete!" unless the result was ready before the click
+            if st.session_state.speculative_key is None:
+                time.sleep(1)
+            st.session_state.speculative_key = None
             st.rerun()
             
     except Exception as e:
         show_error(f"An error occurred: {str(e)}")
         if st.button("← Back", use_container_width=True):
+            cancel_generation()
             st.session_state.step = 3
             st.rerun()
 
+# Show a pre-generated avatar
+def show_variant(variant: Image.Image, generation_time: float):
+    """Show a Regenerate variant and save it in the background.
+    
+    Args:
+        variant: Finished variant from the pool or a prefetch
+        generation_time: Generation time of the call that produced it
+    """
+    st.session_state.generated_avatar = variant
+    st.session_state.generation_time = generation_time
+    try:
+        generation_executor.submit(
+            save_variant,
+            variant,
+            st.session_state.request_id,
+            generation_time
+        )
+    except Exception as e:
+        print(f"Could not save variant: {e}")
+
+# Prefetch the next Regenerate result
+def prefetch_next_variant():
+    """Start generating one more variant while the result page is open."""
+    if not AppConfig.ENABLE_VARIANT_PREFETCH or st.session_state.variant_pool:
+        return
+    if st.session_state.request_id and st.session_state.photo is not None:
+        variant_prefetcher.start(
+            st.session_state.request_id,
+            st.session_state.photo,
+            dict(st.session_state.form_data)
+        )
+
 # Step 5: Display Result
 def step_display_result():
     """Display the generated avatar."""
     st.header("🦸 Your Superhero Avatar is Ready!")
     
-    # Display side by side
-    col1, col2 = st.columns(2)
+    # Use the time spent on this page to prepare the next Regenerate
+    prefetch_next_variant()
     
-    with col1:
-        st.subheader("Original Photo")
-        st.image(st.session_state.photo, use_container_width=True)
+    # Display side by side (the original is gone if the browser reconnected mid-generation)
+    if st.session_state.photo is not None:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("Original Photo")
+            st.image(st.session_state.photo, use_container_width=True)
+    else:
+        col2 = st.container()
     
     with col2:
         st.subheader("Superhero Avatar")
@@ -514,8 +649,28 @@ def step_display_result():
     # Regenerate button with special styling
     st.markdown("---")
     if st.button("🎲 Regenerate Avatar", key="regenerate", use_container_width=True, type="primary"):
-        # Keep all data but go back to generation step
-        st.session_state.step = 4
+        prefetch = None
+        if not st.session_state.variant_pool and AppConfig.ENABLE_VARIANT_PREFETCH and st.session_state.request_id:
+            prefetch = variant_prefetcher.take(st.session_state.request_id)
+        prefetched = prefetch.result() if prefetch is not None and prefetch.done() else None
+        
+        if st.session_state.variant_pool:
+            # Show a variant generated alongside this avatar
+            metrics.increment("regenerations_total", source="pool")
+            show_variant(st.session_state.variant_pool.pop(0), st.session_state.generation_time)
+        elif prefetched and not prefetched["error"]:
+            # Show the variant prefetched while this page was open
+            metrics.increment("regenerations_total", source="prefetch")
+            show_variant(prefetched["avatar"], prefetched["generation_time"])
+        elif prefetch is not None and not prefetch.done():
+            # Follow the prefetch that is already running instead of starting over
+            metrics.increment("regenerations_total", source="prefetch")
+            st.session_state.generation_job = prefetch
+            st.session_state.step = 4
+        else:
+            # Keep all data but go back to generation step
+            metrics.increment("regenerations_total", source="pipeline")
+            st.session_state.step = 4
         st.rerun()
     
     # Action buttons
@@ -523,12 +678,14 @@ def step_display_result():
     
     with col1:
         if st.button("🔄 Create Another", use_container_width=True):
+            variant_prefetcher.discard(st.session_state.request_id)
             reset_session_state()
             st.session_state.step = 1
             st.rerun()
     
     with col2:
         if st.button("🏠 Home", use_container_width=True):
+            variant_prefetcher.discard(st.session_state.request_id)
             reset_session_state()
             st.session_state.step = 1
             st.rerun()
@@ -541,8 +698,12 @@ def main():
     
     # Top right area intentionally left blank
     
+    # Pin the Replicate model version once per process
+    warm_model_versions()
+    
     # Initialize session state
     init_session_state()
+    resume_in_flight_request()
     
     # Header
     st.markdown(
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark input encoding profiles for provider payloads.
+
+Reports encoded size, base64 size and encode time for every profile in
+AppConfig.INPUT_ENCODING_PROFILES, and optionally end-to-end generation
+latency per provider:
+
+    uv run python benchmark_encoding.py photo.jpg
+    uv run python benchmark_encoding.py photo.jpg --generate --runs 3
+"""
+
+import argparse
+import base64
+import statistics
+import time
+from typing import Dict, List
+
+from PIL import Image
+
+from config import AppConfig
+from image_encoding import encode_image
+from upload_cache import upload_cache
+from utils import process_uploaded_image
+
+
+def benchmark_encoding(image: Image.Image, iterations: int) -> List[Dict[str, float]]:
+    """Measure size and encode time for each encoding profile.
+
+    Args:
+        image: Processed photo
+        iterations: Encodes per profile
+
+    Returns:
+        List of results with profile, bytes, base64_bytes and encode_ms
+    """
+    results = []
+    for profile in AppConfig.INPUT_ENCODING_PROFILES:
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            data, _ = encode_image(image, profile)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        results.append({
+            "profile": profile,
+            "bytes": len(data),
+            "base64_bytes": len(base64.b64encode(data)),
+            "encode_ms": statistics.median(timings)
+        })
+    return results
+
+
+def benchmark_generation(photo: Image.Image, runs: int) -> List[Dict[str, float]]:
+    """Measure end-to-end generation latency for each provider and profile.
+
+    Args:
+        photo: Original photo
+        runs: Generations per provider and profile
+
+    Returns:
+        List of results with provider, profile, median_s and failures
+    """
+    from image_generator import ImageGenerator
+
+    # Measure each provider on its own
+    AppConfig.ENABLE_HEDGING = False
+
+    results = []
+    for provider in AppConfig.get_available_providers():
+        for profile in AppConfig.INPUT_ENCODING_PROFILES:
+            timings = []
+            failures = 0
+            for _ in range(runs):
+                # Start cold so every run pays for its own upload
+                upload_cache.clear()
+                generator = ImageGenerator()
+                generator.generators = {provider: generator._create_generator(provider)}
+                generator.provider = provider
+                generator.generator = generator.generators[provider]
+                generator.generator.input_encoding = profile
+
+                _, generation_time, error = generator.generate_avatar(
+                    photo, "Superman", "Blue", "Tesla Model S"
+                )
+                if error:
+                    print(f"   {provider}/{profile} failed: {error}")
+                    failures += 1
+                else:
+                    timings.append(generation_time)
+
+            results.append({
+                "provider": provider,
+                "profile": profile,
+                "median_s": statistics.median(timings) if timings else None,
+                "failures": failures
+            })
+    return results
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark input encoding profiles")
+    parser.add_argument("photo", help="Camera photo to encode")
+    parser.add_argument("--iterations", type=int, default=10, help="Encodes per profile")
+    parser.add_argument("--generate", action="store_true", help="Also measure end-to-end generation")
+    parser.add_argument("--runs", type=int, default=3, help="Generations per provider and profile")
+    args = parser.parse_args()
+
+    photo = Image.open(args.photo)
+    processed = process_uploaded_image(photo)
+
+    print("=" * 60)
+    print(f"Input encoding benchmark ({processed.width}x{processed.height})")
+    print("=" * 60)
+
+    results = benchmark_encoding(processed, args.iterations)
+    baseline = next((r["bytes"] for r in results if r["profile"] == "png"), None)
+    print(f"{'Profile':<10} {'Bytes':>12} {'Base64':>12} {'Encode ms':>10} {'vs PNG':>8}")
+    for result in results:
+        ratio = f"{baseline / result['bytes']:.1f}x" if baseline else "-"
+        print(
+            f"{result['profile']:<10} {result['bytes']:>12,} {result['base64_bytes']:>12,} "
+            f"{result['encode_ms']:>10.1f} {ratio:>8}"
+        )
+
+    if args.generate:
+        AppConfig.validate()
+        print("\n" + "=" * 60)
+        print("End-to-end generation latency")
+        print("=" * 60)
+        print(f"{'Provider':<10} {'Profile':<10} {'Median s':>10} {'Failures':>9}")
+        for result in benchmark_generation(photo, args.runs):
+            median = f"{result['median_s']:.1f}" if result["median_s"] is not None else "-"
+            print(f"{result['provider']:<10} {result['profile']:<10} {median:>10} {result['failures']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Per-provider circuit breakers for Superhero Avatar Generator.
+
+When a provider keeps failing, its breaker opens and requests fail fast (or
+fail over to another provider) instead of paying for retries. After a
+cool-down the breaker goes half-open and lets a single probe request
+through; the probe's outcome closes or re-opens it.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config import AppConfig
+from metrics import metrics
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider's circuit breaker rejects a request."""
+
+
+class CircuitBreaker:
+    """Circuit breaker for a single provider."""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize a closed breaker.
+        
+        Args:
+            name: Provider name (used in metrics)
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds to stay open before allowing a probe
+            clock: Time source (for tests)
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        metrics.set_gauge("circuit_breaker_state", 0, provider=name)
+    
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down ends."""
+        with self._lock:
+            self._refresh_state()
+            return self._state
+    
+    def is_available(self) -> bool:
+        """Check whether a request would be allowed, without taking the probe slot."""
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            return self._state == self.HALF_OPEN and not self._probe_in_flight
+    
+    def allow_request(self) -> bool:
+        """Ask to send a request.
+        
+        In half-open state only one probe request is allowed at a time.
+        
+        Returns:
+            True if the request may go ahead
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        metrics.increment("circuit_breaker_rejections_total", provider=self.name)
+        return False
+    
+    def check(self) -> None:
+        """Raise if a request is not allowed.
+        
+        Raises:
+            CircuitOpenError: If the breaker is open or already probing
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+    
+    def record_success(self) -> None:
+        """Record a successful request."""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+    
+    def record_failure(self) -> None:
+        """Record a failed or timed-out request."""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN:
+                # Probe failed - back to open for another cool-down
+                self._transition(self.OPEN)
+            elif self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._transition(self.OPEN)
+    
+    def release_probe(self) -> None:
+        """Give back the probe slot when a request ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def _refresh_state(self) -> None:
+        """Move from open to half-open once the cool-down has passed. Caller holds the lock."""
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+    
+    def _transition(self, state: str) -> None:
+        """Change state and record it. Caller holds the lock."""
+        print(f"Circuit breaker for {self.name}: {self._state} -> {state}")
+        self._state = state
+        if state == self.OPEN:
+            self._opened_at = self._clock()
+        metrics.set_gauge("circuit_breaker_state", self._STATE_VALUES[state], provider=self.name)
+        metrics.increment("circuit_breaker_transitions_total", provider=self.name, state=state)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get the shared circuit breaker for a provider."""
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=AppConfig.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=AppConfig.CIRCUIT_RESET_SECONDS
+            )
+        return _breakers[provider]
+
+
+def get_breaker_states() -> Dict[str, str]:
+    """Get the state of every provider's breaker.
+    
+    Returns:
+        Dictionary of provider name to state
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.state for breaker in breakers}
@@ -2,7 +2,7 @@
 
 import os
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List
 
 from dotenv import load_dotenv
 
@@ -26,22 +26,75 @@ class AppConfig:
     TEXT_COLOR = "#FFFFFF"
 
     # AI Model Settings
-    AI_PROVIDER = os.getenv("AI_PROVIDER", "replicate")  # Options: "fal" or "replicate"
+    AI_PROVIDER = os.getenv("AI_PROVIDER", "replicate")  # Options: "fal", "replicate" or "auto"
+    
+    # Adaptive routing (AI_PROVIDER=auto): pick the provider with the best
+    # expected completion time, sending a small share of traffic elsewhere
+    ROUTER_DEFAULT_PROVIDER = os.getenv("ROUTER_DEFAULT_PROVIDER", "replicate")
+    ROUTER_EXPLORATION_RATE = float(os.getenv("ROUTER_EXPLORATION_RATE", "0.1"))
     
     # Replicate settings
     REPLICATE_MODEL = os.getenv("AI_MODEL", "black-forest-labs/flux-kontext-pro")
+    # The latest version is resolved once and pinned for the process; set a TTL
+    # (seconds) to pick up new versions without a restart
+    REPLICATE_VERSION_TTL_SECONDS = float(os.getenv("REPLICATE_VERSION_TTL_SECONDS", "0"))
     REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
     
     # Fal AI settings
     FAL_MODEL = os.getenv("AI_MODEL", "fal-ai/flux-pro/kontext")
     FAL_API_KEY = os.getenv("FAL_KEY")
+    # Ask Fal to return the image inline as a data URI instead of a CDN URL
+    FAL_SYNC_MODE = os.getenv("FAL_SYNC_MODE", "true").lower() == "true"
     
     MODEL_VERSION = "latest"
 
+    # Hedged generation: send to the primary provider, then also to the other
+    # one if no result arrives within HEDGE_PERCENTILE of recent latencies
+    ENABLE_HEDGING = os.getenv("ENABLE_HEDGING", "false").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+    HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "25"))
+
+    # Upload the processed photo to provider file storage once and reference
+    # it by URL for every retry and regeneration instead of a data URI
+    ENABLE_INPUT_UPLOADS = os.getenv("ENABLE_INPUT_UPLOADS", "true").lower() == "true"
+    INPUT_UPLOAD_CACHE_SIZE = 128
+    INPUT_UPLOAD_TTL_SECONDS = 3600
+
+    # Input photo encoding profiles (compare with benchmark_encoding.py)
+    INPUT_ENCODING_PROFILES = {
+        "png": {"format": "PNG", "mime_type": "image/png", "options": {}},
+        "jpeg-hq": {
+            "format": "JPEG",
+            "mime_type": "image/jpeg",
+            "options": {"quality": 92, "subsampling": 0, "optimize": True}
+        },
+        "webp": {"format": "WEBP", "mime_type": "image/webp", "options": {"quality": 90, "method": 4}},
+    }
+    REPLICATE_INPUT_ENCODING = os.getenv("REPLICATE_INPUT_ENCODING", "png")
+    FAL_INPUT_ENCODING = os.getenv("FAL_INPUT_ENCODING", "png")
+    # Raw image bytes base64-encoded per chunk of a streamed request body
+    STREAMING_BODY_CHUNK_BYTES = 64 * 1024
+
+    # Rolling provider latency statistics
+    LATENCY_WINDOW_SIZE = 100
+    LATENCY_MIN_SAMPLES = 10
+
+    # Provider progress reporting: queue position and inference progress are
+    # mapped onto this slice of the progress bar while the provider works
+    PROVIDER_PROGRESS_START = 25
+    PROVIDER_PROGRESS_END = 75
+    PROVIDER_POLL_INTERVAL_SECONDS = 0.5
+    PROVIDER_EXPECTED_SECONDS = 20
+
     # Image Settings
     IMAGE_SIZE = "1024x1024"
     IMAGE_FORMAT = "png"
     MAX_FILE_SIZE_MB = 10
+
+    # Limits on generated images, enforced while they stream in
+    MAX_OUTPUT_IMAGE_BYTES = int(os.getenv("MAX_OUTPUT_IMAGE_BYTES", str(25 * 1024 * 1024)))
+    MAX_OUTPUT_IMAGE_PIXELS = int(os.getenv("MAX_OUTPUT_IMAGE_PIXELS", str(4096 * 4096)))
+    DOWNLOAD_CHUNK_BYTES = 64 * 1024
     ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 
     # Superhero Options
@@ -79,6 +132,8 @@ class AppConfig:
 
     # Prompt Template
     PROMPT_TEMPLATE = """Move the person into a showroom garage, dressed as a {superhero}, preserving the original facial features, hairstyle, expression, and pose. Place a {color} {car} in the background behind them. Have them raise both thumbs‑up. Render in a clean, family‑friendly 1990s cartoon style, with their face extremely similar to the original photo but cartoon‑like."""
+    # Simplified prompt used after a content-filter (E005) rejection
+    FALLBACK_PROMPT_TEMPLATE = "Professional portrait of person as {superhero} character with {car} and {color} theme. Family-friendly superhero costume."
 
     # Event Configuration
     EVENT_NAME = os.getenv("EVENT_NAME", "Databricks @ Innovation Garage 2025")
@@ -125,7 +180,122 @@ class AppConfig:
     # Session Settings
     SESSION_TIMEOUT_MINUTES = 30
     MAX_RETRIES = 3
-    GENERATION_TIMEOUT_SECONDS = 60
+    # End-to-end budget for one generation, from submit to saved avatar
+    GENERATION_TIMEOUT_SECONDS = float(os.getenv("GENERATION_TIMEOUT_SECONDS", "60"))
+    # Held back from the provider run for download, overlays and saves
+    DEADLINE_FINISH_RESERVE_SECONDS = 5
+    # Optional stages are skipped when less than this remains
+    DEADLINE_COMMENTARY_MIN_SECONDS = 5
+    DEADLINE_OVERLAY_MIN_SECONDS = 1
+    DEADLINE_ORIGINAL_SAVE_MIN_SECONDS = 2
+    # Per-request caps within the remaining budget
+    DOWNLOAD_TIMEOUT_SECONDS = 30
+    CLAUDE_TIMEOUT_SECONDS = 30
+
+    # Circuit breaker per provider: open after consecutive failures (calls slower
+    # than CIRCUIT_SLOW_CALL_SECONDS count as failures), probe again after cool-down.
+    # Provider calls are cut off when the finish reserve is reached, so the
+    # slow-call threshold is the provider's share of the budget
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+    CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    CIRCUIT_SLOW_CALL_SECONDS = GENERATION_TIMEOUT_SECONDS - DEADLINE_FINISH_RESERVE_SECONDS
+
+    # Retry policies shared by provider, Claude and storage calls: attempts
+    # (including the first) and decorrelated-jitter delay bounds in seconds
+    RETRY_POLICIES = {
+        "replicate": {"max_attempts": MAX_RETRIES, "base_delay": 1.0, "max_delay": 8.0},
+        "fal": {"max_attempts": MAX_RETRIES, "base_delay": 1.0, "max_delay": 8.0},
+        "claude": {"max_attempts": 2, "base_delay": 0.5, "max_delay": 2.0},
+        "storage": {"max_attempts": 3, "base_delay": 0.5, "max_delay": 4.0},
+    }
+    RETRY_RATE_LIMIT_DELAY_SECONDS = 5.0
+    # Retry budget per policy: retries allowed per first attempt, plus a slow
+    # time-based allowance, so a provider incident cannot cause a retry storm
+    RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+    RETRY_BUDGET_MIN_PER_SECOND = 0.1
+    RETRY_BUDGET_CAPACITY = 10
+
+    # Background Generation Settings
+    # Generations run on a process-wide worker pool shared by all sessions
+    GENERATION_MAX_WORKERS = int(os.getenv("GENERATION_MAX_WORKERS", "8"))
+    GENERATION_MAX_PENDING = int(os.getenv("GENERATION_MAX_PENDING", "32"))
+    GENERATION_POLL_INTERVAL_SECONDS = 0.5
+
+    # Generation backend: "local" runs on the in-process worker pool,
+    # "queue" enqueues jobs in Postgres for generation_worker.py processes
+    GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "local")
+    WORKER_LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", "90"))
+    WORKER_HEARTBEAT_SECONDS = 15
+    WORKER_IDLE_SLEEP_SECONDS = 1.0
+    WORKER_MAX_ATTEMPTS = 3
+
+    # Outbound HTTP: one keep-alive pool per host shared by every request
+    HTTP_POOL_HOSTS = 10
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "30"))
+
+    # Generation tiers trade quality for latency. Each tier maps provider
+    # input overrides (and optionally a different "model") on top of the
+    # defaults; express skips prompt upsampling and halves inference steps
+    GENERATION_TIERS = {
+        "express": {
+            "replicate": {"prompt_upsampling": False},
+            "fal": {"num_inference_steps": 14, "guidance_scale": 10},
+        },
+        "standard": {
+            "replicate": {"prompt_upsampling": True},
+            "fal": {"num_inference_steps": 28, "guidance_scale": 10},
+        },
+        "premium": {
+            "replicate": {"model": "black-forest-labs/flux-kontext-max", "prompt_upsampling": True},
+            "fal": {"model": "fal-ai/flux-pro/kontext/max", "num_inference_steps": 28, "guidance_scale": 10},
+        },
+    }
+    DEFAULT_GENERATION_TIER = os.getenv("DEFAULT_GENERATION_TIER", "standard")
+    # Requests without an explicit tier drop to express once this many
+    # generations are running or queued (0 disables the switch)
+    EXPRESS_TIER_LOAD_THRESHOLD = int(os.getenv("EXPRESS_TIER_LOAD_THRESHOLD", str(GENERATION_MAX_WORKERS)))
+
+    # Outputs requested per provider call. Extra outputs are post-processed
+    # alongside the first and kept per request, so Regenerate can show one
+    # instantly instead of running the pipeline again (1 disables variants)
+    GENERATION_VARIANTS = int(os.getenv("GENERATION_VARIANTS", "1"))
+    MAX_GENERATION_VARIANTS = 4
+
+    # Speculative generation: start generating as soon as a photo is captured
+    # instead of on the Generate click; a new photo cancels and restarts it
+    ENABLE_SPECULATIVE_GENERATION = os.getenv("ENABLE_SPECULATIVE_GENERATION", "false").lower() == "true"
+
+    # Regenerate prefetch: after a successful generation, one more variant is
+    # generated in the background while the result page is open. At most
+    # PREFETCH_MAX_CONCURRENT run at once, and none start while
+    # PREFETCH_MAX_LOAD or more generations are running or queued
+    ENABLE_VARIANT_PREFETCH = os.getenv("ENABLE_VARIANT_PREFETCH", "false").lower() == "true"
+    PREFETCH_MAX_CONCURRENT = int(os.getenv("PREFETCH_MAX_CONCURRENT", "2"))
+    PREFETCH_MAX_LOAD = int(os.getenv("PREFETCH_MAX_LOAD", str(max(GENERATION_MAX_WORKERS // 2, 1))))
+
+    # Sensitivity cache: selections that triggered a content-filter (E005)
+    # rejection go straight to the fallback prompt. A car on its own is treated
+    # as sensitive once it has been flagged in SENSITIVITY_FEATURE_THRESHOLD
+    # different combinations and in at least SENSITIVITY_FEATURE_RATIO of the
+    # lookups with that car. Superheroes and colors are never generalized: they
+    # come from short lists, and E005 is often triggered by the photo instead
+    ENABLE_SENSITIVITY_CACHE = os.getenv("ENABLE_SENSITIVITY_CACHE", "true").lower() == "true"
+    SENSITIVITY_FEATURE_THRESHOLD = 3
+    SENSITIVITY_FEATURE_RATIO = 0.5
+    SENSITIVITY_CACHE_TTL_HOURS = int(os.getenv("SENSITIVITY_CACHE_TTL_HOURS", "168"))
+
+    # Result cache for repeated demo runs: with demo mode on or a fixed
+    # GENERATION_SEED, a finished avatar is reused for the same photo
+    # (exact pixels), selections, seed and tier instead of calling the
+    # provider again. Entries are kept on local disk (LRU and TTL) and, on
+    # Databricks, shared through the volume (TTL)
+    ENABLE_DEMO_MODE = os.getenv("ENABLE_DEMO_MODE", "false").lower() == "true"
+    GENERATION_SEED = int(os.getenv("GENERATION_SEED", "-1"))
+    RESULT_CACHE_DIR = Path(os.getenv("RESULT_CACHE_DIR", "data/result_cache"))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "200"))
+    RESULT_CACHE_TTL_HOURS = int(os.getenv("RESULT_CACHE_TTL_HOURS", "24"))
 
     # Feature Flags
     ENABLE_EMAIL_CAPTURE = True
@@ -140,8 +310,35 @@ class AppConfig:
             raise ValueError("REPLICATE_API_TOKEN environment variable is required for Replicate provider")
         elif cls.AI_PROVIDER == "fal" and not cls.FAL_API_KEY:
             raise ValueError("FAL_KEY environment variable is required for Fal provider")
-        elif cls.AI_PROVIDER not in ["replicate", "fal"]:
-            raise ValueError(f"Invalid AI_PROVIDER: {cls.AI_PROVIDER}. Must be 'replicate' or 'fal'")
+        elif cls.AI_PROVIDER == "auto" and not cls.get_available_providers():
+            raise ValueError("REPLICATE_API_TOKEN or FAL_KEY is required for auto provider routing")
+        elif cls.AI_PROVIDER not in ["replicate", "fal", "auto"]:
+            raise ValueError(f"Invalid AI_PROVIDER: {cls.AI_PROVIDER}. Must be 'replicate', 'fal' or 'auto'")
+
+        if cls.ENABLE_HEDGING and not (cls.REPLICATE_API_TOKEN and cls.FAL_API_KEY):
+            raise ValueError("Hedged generation requires both REPLICATE_API_TOKEN and FAL_KEY")
+
+        for setting in ["REPLICATE_INPUT_ENCODING", "FAL_INPUT_ENCODING"]:
+            profile = getattr(cls, setting)
+            if profile not in cls.INPUT_ENCODING_PROFILES:
+                raise ValueError(
+                    f"Invalid {setting}: {profile}. Must be one of {', '.join(cls.INPUT_ENCODING_PROFILES)}"
+                )
+
+        if cls.GENERATION_BACKEND not in ["local", "queue"]:
+            raise ValueError(f"Invalid GENERATION_BACKEND: {cls.GENERATION_BACKEND}. Must be 'local' or 'queue'")
+
+        if not 1 <= cls.GENERATION_VARIANTS <= cls.MAX_GENERATION_VARIANTS:
+            raise ValueError(
+                f"Invalid GENERATION_VARIANTS: {cls.GENERATION_VARIANTS}. "
+                f"Must be between 1 and {cls.MAX_GENERATION_VARIANTS}"
+            )
+
+        if cls.DEFAULT_GENERATION_TIER not in cls.GENERATION_TIERS:
+            raise ValueError(
+                f"Invalid DEFAULT_GENERATION_TIER: {cls.DEFAULT_GENERATION_TIER}. "
+                f"Must be one of {', '.join(cls.GENERATION_TIERS)}"
+            )
 
         # Create directories if they don't exist
         # For Databricks volumes, directories will be created when saving files
@@ -157,7 +354,34 @@ class AppConfig:
 
         return True
 
+    @classmethod
+    def use_result_cache(cls) -> bool:
+        """Whether generations are deterministic enough to reuse cached results."""
+        return cls.ENABLE_DEMO_MODE or cls.GENERATION_SEED != -1
+
+    @classmethod
+    def get_available_providers(cls) -> List[str]:
+        """Get providers whose credentials are configured."""
+        providers = []
+        if cls.REPLICATE_API_TOKEN:
+            providers.append("replicate")
+        if cls.FAL_API_KEY:
+            providers.append("fal")
+        return providers
+
+    @classmethod
+    def get_tier_params(cls, tier: str, provider: str) -> Dict[str, Any]:
+        """Get a tier's input overrides for a provider (a copy, safe to modify)."""
+        if tier not in cls.GENERATION_TIERS:
+            raise ValueError(f"Unknown generation tier: {tier}. Must be one of {', '.join(cls.GENERATION_TIERS)}")
+        return dict(cls.GENERATION_TIERS[tier].get(provider, {}))
+
     @classmethod
     def get_prompt(cls, superhero: str, color: str, car: str) -> str:
         """Generate prompt with user selections."""
         return cls.PROMPT_TEMPLATE.format(superhero=superhero, color=color, car=car)
+
+    @classmethod
+    def get_fallback_prompt(cls, superhero: str, color: str, car: str) -> str:
+        """Generate the simplified prompt used after a content-filter rejection."""
+        return cls.FALLBACK_PROMPT_TEMPLATE.format(superhero=superhero, color=color, car=car)
@@ -2,11 +2,15 @@
 
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, Text, Boolean
+from sqlalchemy import (
+    create_engine, Column, String, DateTime, Integer, Text, Boolean, Float,
+    LargeBinary, UniqueConstraint, or_, and_
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import NullPool
@@ -48,6 +52,13 @@ class AvatarRequest(Base):
     original_image_path = Column(String(500), nullable=True)
     generated_image_path = Column(String(500), nullable=True)
     
+    # In-flight provider prediction, so reruns and reconnects can reattach to it
+    prediction_provider = Column(String(20), nullable=True)
+    prediction_id = Column(String(100), nullable=True)
+    
+    # Generation tier requested, then the tier actually used (express under load)
+    tier = Column(String(20), nullable=True)
+    
     # Email tracking fields
     email_requested = Column(Boolean, default=False, nullable=False)
     email_request_time = Column(DateTime, nullable=True)
@@ -67,11 +78,99 @@ class AvatarRequest(Base):
             'error_message': self.error_message,
             'original_image_path': self.original_image_path,
             'generated_image_path': self.generated_image_path,
+            'prediction_provider': self.prediction_provider,
+            'prediction_id': self.prediction_id,
+            'tier': self.tier,
             'email_requested': self.email_requested,
             'email_request_time': self.email_request_time.isoformat() if self.email_request_time else None
         }
 
 
+class GenerationJob(Base):
+    """Model for queued avatar generation jobs processed by worker processes."""
+    __tablename__ = 'generation_jobs'
+    __table_args__ = (
+        # One job per generation attempt, so duplicate submissions from any replica attach to it
+        UniqueConstraint('request_id', 'request_attempt', name='uq_generation_jobs_request_attempt'),
+    )
+    
+    job_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    request_id = Column(String(36), nullable=False, index=True)
+    request_attempt = Column(Integer, nullable=True)
+    status = Column(String(20), default='queued', nullable=False, index=True)  # queued, running, completed, failed, cancelled
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Input photo (PNG bytes from encode_job_image) so workers on any node can pick up the job
+    input_image = Column(LargeBinary, nullable=False)
+    
+    # Lease tracking - an expired lease means the worker died and the job is claimable again
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    
+    # Progress reported back to the UI
+    progress = Column(Integer, default=0, nullable=False)
+    message = Column(String(200), nullable=True)
+    
+    # Result
+    result_image = Column(LargeBinary, nullable=True)
+    generation_time_seconds = Column(Float, nullable=True)
+    style_score = Column(Float, nullable=True)
+    commentary = Column(Text, nullable=True)
+    original_image_path = Column(String(500), nullable=True)
+    generated_image_path = Column(String(500), nullable=True)
+    error_message = Column(Text, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert model to dictionary (without image bytes)."""
+        return {
+            'job_id': self.job_id,
+            'request_id': self.request_id,
+            'request_attempt': self.request_attempt,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'worker_id': self.worker_id,
+            'attempts': self.attempts,
+            'progress': self.progress,
+            'message': self.message,
+            'generation_time_seconds': self.generation_time_seconds,
+            'style_score': self.style_score,
+            'commentary': self.commentary,
+            'original_image_path': self.original_image_path,
+            'generated_image_path': self.generated_image_path,
+            'error_message': self.error_message,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class SensitivePrompt(Base):
+    """Model for selections that triggered a content-filter (E005) rejection."""
+    __tablename__ = 'sensitive_prompts'
+    
+    # Normalized "superhero|car|color"
+    combination_key = Column(String(300), primary_key=True)
+    superhero = Column(String(100), nullable=False)
+    car = Column(String(100), nullable=False)
+    color = Column(String(50), nullable=False)
+    flag_count = Column(Integer, default=1, nullable=False)
+    first_flagged_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_flagged_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert model to dictionary."""
+        return {
+            'combination_key': self.combination_key,
+            'superhero': self.superhero,
+            'car': self.car,
+            'color': self.color,
+            'flag_count': self.flag_count,
+            'first_flagged_at': self.first_flagged_at.isoformat() if self.first_flagged_at else None,
+            'last_flagged_at': self.last_flagged_at.isoformat() if self.last_flagged_at else None
+        }
+
+
 class DatabaseManager:
     """Manages database connections and operations."""
     
@@ -117,7 +216,8 @@ class DatabaseManager:
         email: str,
         superhero: str,
         car: str,
-        color: str
+        color: str,
+        tier: Optional[str] = None
     ) -> str:
         """Create a new avatar request record.
         
@@ -127,6 +227,7 @@ class DatabaseManager:
             superhero: Selected superhero
             car: Selected car
             color: Selected color
+            tier: Requested generation tier (None picks one by load)
             
         Returns:
             request_id of the created record
@@ -138,22 +239,52 @@ class DatabaseManager:
                 superhero=superhero,
                 car=car,
                 color=color,
+                tier=tier,
                 status='pending'
             )
             session.add(request)
             session.flush()  # Get the ID before commit
             return request.request_id
     
-    def update_request_processing(self, request_id: str):
+    def update_request_processing(
+        self,
+        request_id: str,
+        tier: Optional[str] = None,
+        keep_prediction: bool = False
+    ):
         """Update request status to processing.
         
         Args:
             request_id: ID of the request to update
+            tier: Generation tier the request runs at
+            keep_prediction: Keep the recorded prediction because it is being
+                reattached to; otherwise a new attempt (e.g. Regenerate) is
+                starting and the previous attempt's prediction is cleared so a
+                refresh cannot reattach to it
         """
         with self.get_session() as session:
             request = session.query(AvatarRequest).filter_by(request_id=request_id).first()
             if request:
                 request.status = 'processing'
+                if tier:
+                    request.tier = tier
+                if not keep_prediction:
+                    request.prediction_provider = None
+                    request.prediction_id = None
+    
+    def update_request_prediction(self, request_id: str, provider: str, prediction_id: str):
+        """Record the provider prediction running for a request.
+        
+        Args:
+            request_id: ID of the request to update
+            provider: Provider running the prediction ("replicate" or "fal")
+            prediction_id: Provider's prediction/request ID
+        """
+        with self.get_session() as session:
+            request = session.query(AvatarRequest).filter_by(request_id=request_id).first()
+            if request:
+                request.prediction_provider = provider
+                request.prediction_id = prediction_id
     
     def update_request_completed(
         self,
@@ -175,7 +306,8 @@ class DatabaseManager:
             if request:
                 request.status = 'completed'
                 request.generation_time_seconds = int(generation_time)
-                request.original_image_path = str(original_image_path)
+                if original_image_path:
+                    request.original_image_path = str(original_image_path)
                 request.generated_image_path = str(generated_image_path)
     
     def update_request_failed(self, request_id: str, error_message: str):
@@ -191,6 +323,17 @@ class DatabaseManager:
                 request.status = 'failed'
                 request.error_message = error_message
     
+    def delete_request(self, request_id: str):
+        """Delete a request, e.g. a speculative generation the user never asked for.
+        
+        Later updates from its cancelled pipeline find no row and do nothing.
+        
+        Args:
+            request_id: ID of the request to delete
+        """
+        with self.get_session() as session:
+            session.query(AvatarRequest).filter_by(request_id=request_id).delete()
+    
     def get_request(self, request_id: str) -> Optional[Dict[str, Any]]:
         """Get a request by ID.
         
@@ -220,6 +363,339 @@ class DatabaseManager:
                 .all()
             return [req.to_dict() for req in requests]
 
+    
+    def enqueue_generation_job(
+        self,
+        request_id: str,
+        input_image: bytes,
+        request_attempt: Optional[int] = None
+    ) -> str:
+        """Queue a generation job for the worker processes.
+        
+        Enqueuing is idempotent per (request_id, request_attempt): a duplicate
+        submission, from this or any other replica, gets the existing job.
+        
+        Args:
+            request_id: ID of the avatar request
+            input_image: Encoded input photo
+            request_attempt: Generation attempt for the request (None skips
+                the idempotency check)
+            
+        Returns:
+            job_id of the queued (or already existing) job
+        """
+        if request_attempt is not None:
+            job_id = self._get_attempt_job_id(request_id, request_attempt)
+            if job_id is not None:
+                return job_id
+        
+        try:
+            with self.get_session() as session:
+                job = GenerationJob(
+                    request_id=request_id,
+                    request_attempt=request_attempt,
+                    input_image=input_image,
+                    status='queued',
+                    message="Waiting for an available worker..."
+                )
+                session.add(job)
+                session.flush()
+                return job.job_id
+        except IntegrityError:
+            # Another replica enqueued the same attempt first
+            job_id = self._get_attempt_job_id(request_id, request_attempt)
+            if job_id is None:
+                raise
+            return job_id
+    
+    def _get_attempt_job_id(self, request_id: str, request_attempt: int) -> Optional[str]:
+        """Get the job created for a generation attempt, if any."""
+        with self.get_session() as session:
+            job = session.query(GenerationJob)\
+                .filter_by(request_id=request_id, request_attempt=request_attempt)\
+                .first()
+            return job.job_id if job else None
+    
+    def claim_generation_job(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        max_attempts: int
+    ) -> Optional[Dict[str, Any]]:
+        """Claim the oldest available job for a worker.
+        
+        Queued jobs and running jobs whose lease has expired are both
+        claimable. Rows are locked with ``FOR UPDATE SKIP LOCKED`` so
+        concurrent workers never claim the same job.
+        
+        Args:
+            worker_id: ID of the claiming worker
+            lease_seconds: How long the claim is valid without a heartbeat
+            max_attempts: Jobs claimed this many times are failed instead
+            
+        Returns:
+            Job data including ``input_image`` bytes, or None if no job is available
+        """
+        now = datetime.utcnow()
+        with self.get_session() as session:
+            while True:
+                job = session.query(GenerationJob)\
+                    .filter(or_(
+                        GenerationJob.status == 'queued',
+                        and_(
+                            GenerationJob.status == 'running',
+                            GenerationJob.lease_expires_at < now
+                        )
+                    ))\
+                    .order_by(GenerationJob.created_at)\
+                    .with_for_update(skip_locked=True)\
+                    .first()
+                if job is None:
+                    return None
+                
+                if job.attempts >= max_attempts:
+                    # Keeps crashing workers - give up on it
+                    job.status = 'failed'
+                    job.error_message = "Generation worker crashed repeatedly"
+                    job.completed_at = now
+                    session.flush()
+                    continue
+                
+                job.status = 'running'
+                job.worker_id = worker_id
+                job.attempts += 1
+                job.heartbeat_at = now
+                job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+                
+                data = job.to_dict()
+                data['input_image'] = job.input_image
+                return data
+    
+    def heartbeat_generation_job(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend a worker's lease on a job.
+        
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker holding the lease
+            lease_seconds: New lease length from now
+            
+        Returns:
+            True if the worker still owns the job
+        """
+        now = datetime.utcnow()
+        with self.get_session() as session:
+            job = session.query(GenerationJob).filter_by(
+                job_id=job_id, worker_id=worker_id, status='running'
+            ).first()
+            if not job:
+                return False
+            job.heartbeat_at = now
+            job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+            return True
+    
+    def update_generation_job_progress(
+        self,
+        job_id: str,
+        worker_id: str,
+        progress: int,
+        message: Optional[str] = None
+    ):
+        """Record progress reported by a worker.
+        
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker holding the lease
+            progress: Percentage complete (0-100)
+            message: Optional status message
+        """
+        with self.get_session() as session:
+            job = session.query(GenerationJob).filter_by(
+                job_id=job_id, worker_id=worker_id, status='running'
+            ).first()
+            if job:
+                job.progress = max(job.progress, progress)
+                if message:
+                    job.message = message
+    
+    def complete_generation_job(
+        self,
+        job_id: str,
+        worker_id: str,
+        result_image: bytes,
+        generation_time: float,
+        style_score: Optional[float],
+        commentary: Optional[str],
+        original_image_path: str,
+        generated_image_path: str
+    ) -> bool:
+        """Store a finished job's result.
+        
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker holding the lease
+            result_image: Encoded avatar
+            generation_time: Time taken to generate in seconds
+            style_score: Claude quality score
+            commentary: Claude commentary
+            original_image_path: Path to original image
+            generated_image_path: Path to generated avatar
+            
+        Returns:
+            True if the result was stored, False if the lease was lost
+        """
+        with self.get_session() as session:
+            job = session.query(GenerationJob).filter_by(
+                job_id=job_id, worker_id=worker_id, status='running'
+            ).first()
+            if not job:
+                return False
+            job.status = 'completed'
+            job.progress = 100
+            job.message = "Complete!"
+            job.result_image = result_image
+            job.generation_time_seconds = generation_time
+            job.style_score = style_score
+            job.commentary = commentary
+            job.original_image_path = str(original_image_path)
+            job.generated_image_path = str(generated_image_path)
+            job.completed_at = datetime.utcnow()
+            return True
+    
+    def fail_generation_job(self, job_id: str, worker_id: str, error_message: str) -> bool:
+        """Mark a job as failed.
+        
+        Args:
+            job_id: ID of the job
+            worker_id: ID of the worker holding the lease
+            error_message: Error message describing the failure
+            
+        Returns:
+            True if the job was updated, False if the lease was lost
+        """
+        with self.get_session() as session:
+            job = session.query(GenerationJob).filter_by(
+                job_id=job_id, worker_id=worker_id, status='running'
+            ).first()
+            if not job:
+                return False
+            job.status = 'failed'
+            job.error_message = error_message
+            job.completed_at = datetime.utcnow()
+            return True
+    
+    def cancel_generation_job(self, job_id: str) -> bool:
+        """Cancel a queued or running job.
+        
+        A queued job is never claimed; the worker running a job notices at
+        its next heartbeat and cancels the provider prediction.
+        
+        Args:
+            job_id: ID of the job
+            
+        Returns:
+            True if the job was cancelled, False if it had already finished
+        """
+        with self.get_session() as session:
+            job = session.query(GenerationJob)\
+                .filter(
+                    GenerationJob.job_id == job_id,
+                    GenerationJob.status.in_(['queued', 'running'])
+                )\
+                .first()
+            if not job:
+                return False
+            job.status = 'cancelled'
+            job.error_message = "Generation was cancelled."
+            job.completed_at = datetime.utcnow()
+            return True
+    
+    def count_active_generation_jobs(self) -> int:
+        """Count generation jobs queued or running across all workers.
+        
+        Returns:
+            Number of queued and running jobs
+        """
+        with self.get_session() as session:
+            return session.query(GenerationJob)\
+                .filter(GenerationJob.status.in_(['queued', 'running']))\
+                .count()
+    
+    def get_active_generation_job_id(self, request_id: str) -> Optional[str]:
+        """Get the newest queued or running job for a request.
+        
+        Args:
+            request_id: ID of the avatar request
+            
+        Returns:
+            job_id or None if the request has no active job
+        """
+        with self.get_session() as session:
+            job = session.query(GenerationJob)\
+                .filter(
+                    GenerationJob.request_id == request_id,
+                    GenerationJob.status.in_(['queued', 'running'])
+                )\
+                .order_by(GenerationJob.created_at.desc())\
+                .first()
+            return job.job_id if job else None
+    
+    def get_generation_job(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """Get a generation job by ID.
+        
+        Args:
+            job_id: ID of the job
+            include_result: Whether to include ``result_image`` bytes
+            
+        Returns:
+            Job data as dictionary or None if not found
+        """
+        with self.get_session() as session:
+            job = session.query(GenerationJob).filter_by(job_id=job_id).first()
+            if not job:
+                return None
+            data = job.to_dict()
+            if include_result:
+                data['result_image'] = job.result_image
+            return data
+
+    
+    def record_sensitive_prompt(self, combination_key: str, superhero: str, car: str, color: str):
+        """Record that a combination of selections was flagged by a content filter.
+        
+        Args:
+            combination_key: Normalized "superhero|car|color" key
+            superhero: Normalized superhero
+            car: Normalized car
+            color: Normalized color
+        """
+        with self.get_session() as session:
+            flagged = session.query(SensitivePrompt).filter_by(combination_key=combination_key).first()
+            if flagged:
+                flagged.flag_count += 1
+                flagged.last_flagged_at = datetime.utcnow()
+            else:
+                session.add(SensitivePrompt(
+                    combination_key=combination_key,
+                    superhero=superhero,
+                    car=car,
+                    color=color
+                ))
+    
+    def get_sensitive_prompts(self, since: datetime) -> list[Dict[str, Any]]:
+        """Get combinations flagged since a point in time.
+        
+        Args:
+            since: Oldest flag to include
+            
+        Returns:
+            List of flagged combinations as dictionaries
+        """
+        with self.get_session() as session:
+            flagged = session.query(SensitivePrompt)\
+                .filter(SensitivePrompt.last_flagged_at >= since)\
+                .all()
+            return [row.to_dict() for row in flagged]
+
 
 # Create global database manager instance
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -1,14 +1,19 @@
 """Databricks Claude integration for image quality scoring and commentary."""
 
-import base64
-import io
 import json
 import os
 from typing import Dict, Optional, Tuple
-import requests
 from PIL import Image
 from dotenv import load_dotenv
 
+import requests
+
+from config import AppConfig
+from deadline import Deadline
+from http_transport import http_transport
+from image_encoding import InlineImage, StreamingJSONBody
+from retry_policy import get_retry_policy
+
 load_dotenv()
 
 
@@ -28,7 +33,8 @@ class DatabricksClaudeCommentator:
                       image: Image.Image, 
                       superhero: str, 
                       color: str, 
-                      car: str) -> Tuple[float, str, Dict]:
+                      car: str,
+                      timeout: Optional[float] = None) -> Tuple[float, str, Dict]:
         """
         Analyze the generated avatar using Claude for quality and commentary.
         
@@ -37,13 +43,14 @@ class DatabricksClaudeCommentator:
             superhero: Selected superhero
             color: Selected color
             car: Selected car
+            timeout: Request timeout in seconds (defaults to AppConfig.CLAUDE_TIMEOUT_SECONDS)
             
         Returns:
             Tuple of (quality_score, commentary, full_analysis)
         """
         try:
-            # Convert image to base64
-            image_base64 = self._image_to_base64(image)
+            # Encode the image once; it is base64-encoded as the request streams
+            inline_image = self._inline_image(image)
             
             # Create the prompt for Claude
             prompt = f"""You are a fun and enthusiastic comic book art critic reviewing superhero avatar transformations.
@@ -74,7 +81,7 @@ Respond in JSON format:
 }}"""
 
             # Make the API call
-            response = self._call_claude_endpoint(prompt, image_base64)
+            response = self._call_claude_endpoint(prompt, inline_image, timeout)
             
             if response:
                 return self._parse_response(response)
@@ -87,19 +94,17 @@ Respond in JSON format:
             # Return default values on error
             return 0.75, "Awesome transformation! You look ready for action!", {}
     
-    def _image_to_base64(self, image: Image.Image) -> str:
-        """Convert PIL Image to base64 string."""
+    def _inline_image(self, image: Image.Image) -> InlineImage:
+        """Encode PIL Image for embedding in the request body."""
         # Resize if too large
         max_size = 1024
         if image.width > max_size or image.height > max_size:
             image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
             
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_data = buffered.getvalue()
-        return base64.b64encode(img_data).decode('utf-8')
+        return InlineImage(image, "png")
     
-    def _call_claude_endpoint(self, prompt: str, image_base64: str) -> Optional[Dict]:
+    def _call_claude_endpoint(self, prompt: str, image: InlineImage,
+                              timeout: Optional[float] = None) -> Optional[Dict]:
         """Call the Databricks Claude endpoint."""
         headers = {
             "Authorization": f"Bearer {self.token}",
@@ -116,7 +121,7 @@ Respond in JSON format:
                         {"type": "text", "text": prompt},
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/png;base64,{image_base64}"}
+                            "image_url": {"url": image}
                         }
                     ]
                 }
@@ -125,13 +130,25 @@ Respond in JSON format:
             "temperature": 0.7
         }
         
-        try:
-            response = requests.post(
+        # Retries share the request's timeout rather than adding to it
+        deadline = Deadline(timeout or AppConfig.CLAUDE_TIMEOUT_SECONDS)
+        
+        def post(attempt: int) -> requests.Response:
+            # Stream the body so the base64 image is never held in memory whole
+            response = http_transport.post(
                 self.endpoint_url,
                 headers=headers,
-                json=data,
-                timeout=30
+                data=StreamingJSONBody(data),
+                timeout=deadline.timeout()
             )
+            if response.status_code == 429 or response.status_code >= 500:
+                raise requests.HTTPError(
+                    f"Claude endpoint error: {response.status_code}", response=response
+                )
+            return response
+        
+        try:
+            response = get_retry_policy("claude").call(post, deadline=deadline)
             
             if response.status_code == 200:
                 return response.json()
@@ -193,7 +210,8 @@ Respond in JSON format:
             return 0.75, "Fantastic superhero avatar! Ready to save the day!", {}
 
 
-def get_claude_commentary(image: Image.Image, superhero: str, color: str, car: str) -> Tuple[float, str]:
+def get_claude_commentary(image: Image.Image, superhero: str, color: str, car: str,
+                          timeout: Optional[float] = None) -> Tuple[float, str]:
     """
     Get Claude's commentary on the generated avatar.
     
@@ -202,13 +220,15 @@ def get_claude_commentary(image: Image.Image, superhero: str, color: str, car: s
         superhero: Selected superhero
         color: Theme color
         car: Selected car
+        timeout: Request timeout in seconds, such as what remains of the
+            generation deadline
         
     Returns:
         Tuple of (quality_score, commentary)
     """
     try:
         commentator = DatabricksClaudeCommentator()
-        score, commentary, _ = commentator.analyze_avatar(image, superhero, color, car)
+        score, commentary, _ = commentator.analyze_avatar(image, superhero, color, car, timeout)
         return score, commentary
     except Exception as e:
         print(f"Claude commentary error: {e}")
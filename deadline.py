@@ -0,0 +1,107 @@
+"""End-to-end deadline budget for Superhero Avatar Generator.
+
+A single Deadline is created when a generation starts and passed to every
+stage (provider run, retries, download, commentary, overlays and saves).
+Each stage takes only what remains of the budget instead of its own fixed
+timeout, and optional stages are skipped when time is short.
+"""
+
+import time
+from typing import Callable, Optional
+
+from metrics import metrics
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage runs out of generation budget."""
+
+    def __init__(self, stage: str):
+        """Initialize the error.
+
+        Args:
+            stage: Stage that was running when the budget ran out
+        """
+        super().__init__(f"Generation deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute point in time by which a generation must finish."""
+
+    def __init__(
+        self,
+        budget_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        expires_at: Optional[float] = None
+    ):
+        """Initialize the deadline.
+
+        Args:
+            budget_seconds: Seconds from now until the deadline
+            clock: Monotonic clock returning seconds
+            expires_at: Absolute clock time to expire at (overrides budget_seconds)
+        """
+        self._clock = clock
+        self.expires_at = expires_at if expires_at is not None else clock() + budget_seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(self.expires_at - self._clock(), 0.0)
+
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self.remaining() <= 0
+
+    def has_time_for(self, seconds: float) -> bool:
+        """Whether at least ``seconds`` remain, for deciding on optional stages."""
+        return self.remaining() >= seconds
+
+    def check(self, stage: str) -> None:
+        """Raise if the deadline has passed.
+
+        Args:
+            stage: Stage about to run, for the error and metrics
+
+        Raises:
+            DeadlineExceeded: If no budget remains
+        """
+        if self.expired():
+            metrics.increment("generation_deadline_exceeded_total", stage=stage)
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Timeout for a blocking call: what remains, capped at ``cap``.
+
+        Args:
+            cap: Upper bound in seconds, such as a per-request timeout
+
+        Returns:
+            Seconds the call may take (a small positive floor once expired,
+            so HTTP clients fail fast instead of waiting indefinitely)
+        """
+        remaining = max(self.remaining(), 0.001)
+        return remaining if cap is None else min(cap, remaining)
+
+    def reserve(self, seconds: float) -> "Deadline":
+        """Deadline ending ``seconds`` earlier, leaving time for later stages.
+
+        Args:
+            seconds: Budget held back for the stages that follow
+
+        Returns:
+            New Deadline sharing this one's clock
+        """
+        return Deadline(0, clock=self._clock, expires_at=self.expires_at - seconds)
+
+
+def within(deadline: Optional[Deadline], cap: float) -> float:
+    """Timeout for a call that may or may not have a deadline.
+
+    Args:
+        deadline: Generation deadline, or None
+        cap: Per-call timeout used when there is no deadline
+
+    Returns:
+        Seconds the call may take
+    """
+    return cap if deadline is None else deadline.timeout(cap)
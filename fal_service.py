@@ -1,17 +1,22 @@
 """Fal AI Image Generation service for Superhero Avatar Generator."""
 
 import base64
-import io
 import os
+import re
+import threading
 import time
-from typing import Optional, Tuple
-import requests
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from PIL import Image
 import fal_client
 from dotenv import load_dotenv
 
+from deadline import Deadline, DeadlineExceeded
+
 load_dotenv()
 
+# Step counters in Fal inference logs, e.g. "12/28"
+STEP_PATTERN = re.compile(r"(\d+)\s*/\s*(\d+)")
+
 
 class FalImageGenerator:
     """Handles AI image generation using Fal AI."""
@@ -30,55 +35,97 @@ class FalImageGenerator:
         
         # Get model name from config
         self.model_name = AppConfig.FAL_MODEL
+        self.sync_mode = AppConfig.FAL_SYNC_MODE
+        self.input_encoding = AppConfig.FAL_INPUT_ENCODING
     
     def generate_avatar(
         self,
-        original_image: Image.Image,
+        original_image: Optional[Image.Image],
         prompt: str,
-        seed: int = -1
+        seed: int = -1,
+        request_id: Optional[str] = None,
+        on_request: Optional[Callable[[str], None]] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+        params: Optional[Dict[str, Any]] = None,
+        num_images: int = 1
     ) -> Tuple[Optional[Image.Image], float, Optional[str]]:
         """Generate superhero avatar using Fal AI.
         
         Args:
-            original_image: Original photo
+            original_image: Original photo (unused when resuming)
             prompt: Generation prompt
             seed: Random seed (-1 for random)
+            request_id: ID of an in-flight Fal request to reattach to
+            on_request: Callback receiving the ID of a newly submitted request
+            progress_callback: Callback receiving (progress, message) while
+                the request is queued and running
+            cancel_event: Set to cancel the request while it is polled
+            deadline: Generation deadline; the request is cancelled if it is
+                still queued or running when the finish reserve is reached
+            params: Generation tier input overrides; a "model" entry runs
+                that model instead of the configured one
+            num_images: Images to request from the one call; the extras are
+                attached to the first image as its ``variants`` attribute
             
         Returns:
             Tuple of (generated_image, generation_time, error_message)
         """
         start_time = time.time()
+        params = dict(params or {})
+        model_name = params.pop("model", self.model_name)
         
         try:
-            # Convert image to base64
-            image_data = self._image_to_base64(original_image)
-            
-            # Prepare input for Fal API
-            input_data = {
-                "prompt": prompt,
-                "image_url": image_data,  # Fal accepts base64 data URLs
-                "seed": seed if seed != -1 else None,
-                "image_size": "square",
-                "num_inference_steps": 28,
-                "guidance_scale": 10,
-                "enable_safety_checker": True,
-                "safety_tolerance": 2
-            }
-            
-            # Remove None values
-            input_data = {k: v for k, v in input_data.items() if v is not None}
-            
-            
-            # Run the model
-            result = fal_client.run(
-                self.model_name,
-                arguments=input_data
-            )
+            if request_id:
+                # Reattach to a request that is already in the queue
+                handle = fal_client.sync_client.get_handle(model_name, request_id)
+            else:
+                if original_image is None:
+                    raise ValueError("Original photo is no longer available. Please retake your photo.")
+                
+                # Reference the uploaded photo (uploaded once per image)
+                image_data = self._image_input(original_image)
+                
+                # Prepare input for Fal API
+                input_data = {
+                    "prompt": prompt,
+                    "image_url": image_data,  # Fal accepts URLs or base64 data URLs
+                    "seed": seed if seed != -1 else None,
+                    "image_size": "square",
+                    "num_inference_steps": 28,
+                    "guidance_scale": 10,
+                    "enable_safety_checker": True,
+                    "safety_tolerance": 2,
+                    "num_images": num_images,
+                    "sync_mode": self.sync_mode  # Inline data URI result
+                }
+                input_data.update(params)
+                
+                # Remove None values
+                input_data = {k: v for k, v in input_data.items() if v is not None}
+                
+                # Submit to the Fal queue
+                handle = fal_client.submit(
+                    model_name,
+                    arguments=input_data
+                )
+                
+                if on_request:
+                    on_request(handle.request_id)
+            
+            # Poll the queue until the request completes
+            if not self._wait_for_completion(handle, progress_callback, cancel_event, deadline, model_name):
+                return None, time.time() - start_time, "Generation was cancelled."
+            
+            result = handle.get()
             
             # Extract the generated image URL
             if result and "images" in result and len(result["images"]) > 0:
                 image_url = result["images"][0]["url"]
-                generated_image = self._download_image(image_url)
+                generated_image = self._load_result_image(image_url, deadline)
+                if num_images > 1:
+                    setattr(generated_image, 'variants', self._load_variants(result["images"][1:], deadline))
                 generation_time = time.time() - start_time
                 return generated_image, generation_time, None
             else:
@@ -89,7 +136,9 @@ class FalImageGenerator:
             error_str = str(e)
             
             # Provide user-friendly error messages
-            if "rate limit" in error_str.lower():
+            if isinstance(e, DeadlineExceeded):
+                error_message = "Generation took too long. Please try again."
+            elif "rate limit" in error_str.lower():
                 error_message = "Service is busy. Please wait a moment and try again."
             elif "timeout" in error_str.lower():
                 error_message = "Generation took too long. Please try again."
@@ -100,42 +149,229 @@ class FalImageGenerator:
                 
             return None, generation_time, error_message
     
-    def _image_to_base64(self, image: Image.Image) -> str:
-        """Convert PIL Image to base64 string.
+    def _wait_for_completion(
+        self,
+        handle,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+        model_name: Optional[str] = None
+    ) -> bool:
+        """Poll a queued request, reporting queue position and progress.
+        
+        Args:
+            handle: Fal request handle
+            progress_callback: Callback receiving (progress, message)
+            cancel_event: Set to cancel the request
+            deadline: Generation deadline
+            model_name: Model the request runs (defaults to the configured one)
+            
+        Returns:
+            True when the request completed, False if it was cancelled
+            
+        Raises:
+            DeadlineExceeded: If the request had not finished in time to
+                leave the finish reserve for download and saves
+        """
+        from config import AppConfig
+        from provider_stats import latency_percentile
+        
+        start = AppConfig.PROVIDER_PROGRESS_START
+        end = AppConfig.PROVIDER_PROGRESS_END
+        
+        # Estimate inference time from recent latencies of the model being run
+        expected = latency_percentile("fal", model_name or self.model_name, 50) or AppConfig.PROVIDER_EXPECTED_SECONDS
+        inference_start = None
+        request_deadline = None
+        if deadline is not None:
+            request_deadline = deadline.reserve(AppConfig.DEADLINE_FINISH_RESERVE_SECONDS)
+        
+        def report(progress: int, message: str) -> None:
+            if progress_callback:
+                progress_callback(progress, message)
+        
+        for status in handle.iter_events(
+            with_logs=True, interval=AppConfig.PROVIDER_POLL_INTERVAL_SECONDS
+        ):
+            if cancel_event is not None and cancel_event.is_set():
+                handle.cancel()
+                print(f"Cancelled Fal request {handle.request_id}")
+                return False
+            
+            if request_deadline is not None and request_deadline.expired():
+                # Stop paying for a result that would arrive too late
+                handle.cancel()
+                print(f"Cancelled Fal request {handle.request_id} at the generation deadline")
+                request_deadline.check("provider")
+            
+            if isinstance(status, fal_client.Queued):
+                ahead = status.position
+                if ahead > 0:
+                    report(start, f"Waiting in line... {ahead} ahead of you")
+                else:
+                    report(start, "You're next in line...")
+            elif isinstance(status, fal_client.InProgress):
+                if inference_start is None:
+                    inference_start = time.time()
+                fraction = self._inference_fraction(status.logs, time.time() - inference_start, expected)
+                report(start + int((end - start) * fraction), "Transforming you into a superhero...")
+            elif isinstance(status, fal_client.Completed):
+                report(end, "Transforming you into a superhero...")
+        
+        return True
+    
+    @staticmethod
+    def _inference_fraction(logs: Optional[list], elapsed: float, expected: float) -> float:
+        """Estimate how far inference has got.
+        
+        Uses the latest step counter in the logs when there is one and
+        otherwise elapsed time against the expected duration.
+        
+        Args:
+            logs: Log entries reported by Fal
+            elapsed: Seconds since inference started
+            expected: Expected inference duration in seconds
+            
+        Returns:
+            Fraction between 0 and 0.95
+        """
+        for entry in reversed(logs or []):
+            match = STEP_PATTERN.search(str(entry.get("message", "")))
+            if match:
+                step, total = int(match.group(1)), int(match.group(2))
+                if 0 < total and step <= total:
+                    return min(step / total, 0.95)
+        
+        if expected <= 0:
+            return 0.0
+        return min(elapsed / expected, 0.95)
+    
+    def cancel(self, request_id: str, model_name: Optional[str] = None) -> None:
+        """Cancel a queued or running request.
+        
+        Args:
+            request_id: ID of the Fal request to cancel
+            model_name: Model endpoint the request was submitted to (defaults
+                to the configured one; tier overrides must be passed)
+        """
+        fal_client.cancel(model_name or self.model_name, request_id)
+    
+    def upload_image(self, image: Image.Image) -> str:
+        """Upload an input image to Fal storage.
         
         Args:
             image: PIL Image
             
         Returns:
-            Base64 encoded string with data URI prefix
+            URL of the uploaded image
+        """
+        from image_encoding import encode_image
+        
+        data, mime_type = encode_image(image, self.input_encoding)
+        return fal_client.upload(data, mime_type)
+    
+    def _image_input(self, image: Image.Image) -> str:
+        """Reference the photo by its uploaded URL, falling back to a data URI.
+        
+        Args:
+            image: Original photo
+            
+        Returns:
+            Uploaded URL, or base64 data URI if uploads are off or failed
+        """
+        from config import AppConfig
+        from upload_cache import upload_cache
+        
+        image = self._limit_size(image)
+        if AppConfig.ENABLE_INPUT_UPLOADS:
+            try:
+                return upload_cache.get_or_upload(f"fal:{self.input_encoding}", image, self.upload_image)
+            except Exception as e:
+                print(f"Input upload to fal failed, sending inline: {e}")
+        return self._image_to_base64(image, self.input_encoding)
+    
+    @staticmethod
+    def _limit_size(image: Image.Image) -> Image.Image:
+        """Shrink images larger than Fal accepts.
+        
+        Args:
+            image: PIL Image
+            
+        Returns:
+            The image, or a resized copy if it was too large
         """
-        # Resize if too large (Fal has limits)
         max_size = 1024
         if image.width > max_size or image.height > max_size:
+            image = image.copy()
             image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        return image
+    
+    def _image_to_base64(self, image: Image.Image, profile: str = "png") -> str:
+        """Convert PIL Image to base64 string.
         
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_data = buffered.getvalue()
-        base64_encoded = base64.b64encode(img_data).decode('utf-8')
-        return f"data:image/png;base64,{base64_encoded}"
+        Args:
+            image: PIL Image
+            profile: Encoding profile name
+            
+        Returns:
+            Base64 encoded string with data URI prefix
+        """
+        from image_encoding import encode_data_uri
+        
+        # Resize if too large (Fal has limits)
+        image = self._limit_size(image)
+        
+        return encode_data_uri(image, profile)
     
-    def _download_image(self, url: str) -> Image.Image:
+    def _load_result_image(self, url: str, deadline: Optional[Deadline] = None) -> Image.Image:
+        """Decode an inline result, or download it when Fal returned a URL.
+        
+        Args:
+            url: Data URI (sync mode) or image URL
+            deadline: Generation deadline bounding the download
+            
+        Returns:
+            PIL Image object
+        """
+        from image_download import decode_image_stream
+        
+        if url.startswith("data:"):
+            _, encoded = url.split(",", 1)
+            return decode_image_stream([base64.b64decode(encoded)])
+        
+        return self._download_image(url, deadline)
+    
+    def _load_variants(self, images: List[Dict[str, Any]], deadline: Optional[Deadline] = None) -> List[Image.Image]:
+        """Load extra result images, skipping any that fail.
+        
+        Args:
+            images: Result image entries after the first
+            deadline: Generation deadline bounding the downloads
+            
+        Returns:
+            Decoded variant images
+        """
+        variants = []
+        for image in images:
+            try:
+                variants.append(self._load_result_image(image["url"], deadline))
+            except Exception as e:
+                print(f"Could not load Fal variant image: {e}")
+        return variants
+    
+    def _download_image(self, url: str, deadline: Optional[Deadline] = None) -> Image.Image:
         """Download image from URL.
         
         Args:
             url: Image URL
+            deadline: Generation deadline bounding the download
             
         Returns:
             PIL Image object
         """
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        from image_download import download_image
         
-        image_data = io.BytesIO(response.content)
-        image = Image.open(image_data)
-        
-        return image
+        return download_image(url, "fal", deadline=deadline)
 
 
 def create_fal_generator() -> FalImageGenerator:
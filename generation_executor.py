@@ -0,0 +1,220 @@
+"""Background generation executor for Superhero Avatar Generator.
+
+Avatar generation takes 20-60 seconds, so it runs on a process-wide worker
+pool instead of the Streamlit script thread. The page keeps the returned
+``GenerationJob`` in ``st.session_state`` and polls it on every rerun.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config import AppConfig
+from metrics import metrics
+
+
+class GenerationJob:
+    """Handle for a generation running on the shared worker pool."""
+
+    def __init__(self):
+        """Initialize a queued job."""
+        self.job_id = str(uuid.uuid4())
+        self.status = "queued"  # queued, running, completed, failed, cancelled
+        self.progress = 0
+        self.message = "Waiting for an available worker..."
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def update_progress(self, progress: int, message: Optional[str] = None) -> None:
+        """Record progress reported by the worker.
+
+        Args:
+            progress: Percentage complete (0-100)
+            message: Optional status message for the UI
+        """
+        with self._lock:
+            # Never move the bar backwards when stages report out of order
+            self.progress = max(self.progress, min(int(progress), 100))
+            if message:
+                self.message = message
+
+    def cancel(self) -> None:
+        """Ask the job to stop and cancel its provider prediction.
+
+        A queued job never starts; a running job cancels its prediction at
+        the next status poll and finishes with a cancellation error.
+        """
+        self.cancel_event.set()
+        with self._lock:
+            if self.status in ("queued", "running"):
+                self.status = "cancelled"
+                self.message = "Generation cancelled"
+
+    def done(self) -> bool:
+        """Check whether the job has finished."""
+        return self._future is not None and self._future.done()
+
+    def result(self) -> Any:
+        """Get the job result.
+
+        Returns:
+            Value returned by the submitted function
+
+        Raises:
+            RuntimeError: If the job has not finished yet
+            Exception: Any exception raised by the submitted function
+        """
+        if not self.done():
+            raise RuntimeError(f"Generation job {self.job_id} is still running")
+        return self._future.result()
+
+    def _run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run the submitted function on a worker thread."""
+        with self._lock:
+            if self.cancel_event.is_set():
+                # Cancelled while waiting for a worker
+                return None
+            self.status = "running"
+            self.started_at = time.time()
+        try:
+            result = fn(
+                *args,
+                progress_callback=self.update_progress,
+                cancel_event=self.cancel_event,
+                **kwargs
+            )
+            with self._lock:
+                if not self.cancel_event.is_set():
+                    self.status = "completed"
+            return result
+        except Exception:
+            with self._lock:
+                if not self.cancel_event.is_set():
+                    self.status = "failed"
+            raise
+        finally:
+            with self._lock:
+                self.finished_at = time.time()
+
+
+class GenerationExecutor:
+    """Bounded worker pool shared by every session in the process."""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        """Initialize the executor.
+
+        Args:
+            max_workers: Number of generations that run concurrently
+            max_pending: Maximum jobs running or queued before rejecting
+        """
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="avatar-generation"
+        )
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Single-flight registry: in-flight jobs by caller-supplied key
+        self._inflight: Dict[Hashable, GenerationJob] = {}
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs running or waiting for a worker."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> GenerationJob:
+        """Submit a generation to the pool.
+
+        The function is called with extra ``progress_callback`` and
+        ``cancel_event`` keyword arguments. It reports ``(progress, message)``
+        updates through the callback and should stop when the event is set.
+
+        Args:
+            fn: Function to run
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            Job handle to poll for progress and result
+
+        Raises:
+            RuntimeError: If the pool is already at capacity
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RuntimeError("Service is busy. Please wait a moment and try again.")
+            self._pending += 1
+
+        job = GenerationJob()
+        try:
+            job._future = self._pool.submit(self._run_job, job, fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        return job
+
+    def submit_once(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> GenerationJob:
+        """Submit a generation unless one with the same key is already in flight.
+
+        Double clicks, reruns and reconnects that submit the same generation
+        again get the running job instead of paying for a second prediction.
+
+        Args:
+            key: Identifies the generation, e.g. (request_id, attempt)
+            fn: Function to run
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The in-flight job for ``key``, or a newly submitted one
+
+        Raises:
+            RuntimeError: If a new job is needed and the pool is at capacity
+        """
+        with self._inflight_lock:
+            job = self._inflight.get(key)
+            if job is not None and not job.done() and not job.cancel_event.is_set():
+                metrics.increment("generation_single_flight_total", result="joined")
+                return job
+
+            job = self.submit(fn, *args, **kwargs)
+            self._inflight[key] = job
+        metrics.increment("generation_single_flight_total", result="started")
+
+        # Forget the job once it finishes so the registry only holds live work
+        job._future.add_done_callback(lambda _: self._forget(key, job))
+        return job
+
+    def _forget(self, key: Hashable, job: GenerationJob) -> None:
+        """Remove a finished job from the single-flight registry."""
+        with self._inflight_lock:
+            if self._inflight.get(key) is job:
+                del self._inflight[key]
+
+    def _run_job(self, job: GenerationJob, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a job and free its slot before the result becomes visible."""
+        try:
+            return job._run(fn, *args, **kwargs)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        """Free a pending slot."""
+        with self._lock:
+            self._pending -= 1
+
+
+# Create global generation executor instance
+generation_executor = GenerationExecutor(
+    max_workers=AppConfig.GENERATION_MAX_WORKERS,
+    max_pending=AppConfig.GENERATION_MAX_PENDING
+)
@@ -0,0 +1,331 @@
+"""Avatar generation pipeline for Superhero Avatar Generator.
+
+Runs generation, saving and database bookkeeping for a single request. The
+pipeline does not touch Streamlit so it can run on a background worker.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from PIL import Image
+
+from config import AppConfig
+from database import db_manager
+from deadline import Deadline
+from generation_executor import generation_executor
+from image_generator import ImageGenerator
+from metrics import metrics
+from utils import (
+    save_image,
+    generate_unique_filename,
+    create_participant_record
+)
+
+
+def generation_load() -> int:
+    """Count generations running or waiting on this deployment's backend."""
+    if AppConfig.GENERATION_BACKEND == "queue":
+        return db_manager.count_active_generation_jobs()
+    return generation_executor.pending
+
+
+def choose_generation_tier(requested: Optional[str] = None) -> str:
+    """Pick the generation tier for a request.
+
+    An explicitly requested tier always wins. Otherwise the default tier is
+    used until the backlog reaches AppConfig.EXPRESS_TIER_LOAD_THRESHOLD,
+    when requests switch to express to keep the line moving.
+
+    Args:
+        requested: Tier asked for by the request, if any
+
+    Returns:
+        Name of a tier in AppConfig.GENERATION_TIERS
+    """
+    if requested in AppConfig.GENERATION_TIERS:
+        tier, reason = requested, "requested"
+    else:
+        tier, reason = AppConfig.DEFAULT_GENERATION_TIER, "default"
+        if tier != "express" and AppConfig.EXPRESS_TIER_LOAD_THRESHOLD > 0:
+            try:
+                load = generation_load()
+            except Exception as e:
+                print(f"Could not read generation load: {e}")
+                load = 0
+            if load >= AppConfig.EXPRESS_TIER_LOAD_THRESHOLD:
+                print(f"{load} generations in flight, switching to the express tier")
+                tier, reason = "express", "load"
+
+    metrics.increment("generation_tier_total", tier=tier, reason=reason)
+    return tier
+
+
+def run_generation_pipeline(
+    photo: Optional[Image.Image],
+    form_data: Dict[str, str],
+    request_id: Optional[str] = None,
+    progress_callback: Optional[Callable[[int, str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    variants: int = 1,
+    regenerate: bool = False
+) -> Dict[str, Any]:
+    """Generate, save and record an avatar.
+
+    Args:
+        photo: Original photo (None when resuming an in-flight prediction)
+        form_data: User's name, email, superhero, car and color, plus an
+            optional generation "tier"
+        request_id: Database request ID, if one was created
+        progress_callback: Optional callback receiving (progress, message)
+        cancel_event: Set to cancel the provider prediction (Back/Home clicked)
+        variants: Images to request from the provider call; extras are
+            returned unsaved for an instant Regenerate
+        regenerate: The user asked for another avatar; skips the result
+            cache and uses a random seed so the shown avatar is not repeated
+
+    Returns:
+        Dictionary with avatar, generation_time, error, original_path,
+        avatar_path and variants
+    """
+    # One end-to-end budget for every stage, from provider run to saves
+    deadline = Deadline(AppConfig.GENERATION_TIMEOUT_SECONDS)
+    
+    def report(progress: int, message: str) -> None:
+        if progress_callback:
+            progress_callback(progress, message)
+
+    outcome = {
+        "avatar": None,
+        "generation_time": 0,
+        "error": None,
+        "original_path": None,
+        "avatar_path": None,
+        "variants": []
+    }
+
+    # Look for a prediction still running from an earlier attempt at this
+    # request (a rerun, a reconnecting browser or a crashed worker)
+    resume_provider, resume_prediction_id, resume_tier = None, None, None
+    if request_id:
+        try:
+            request = db_manager.get_request(request_id)
+            if request and request["status"] == "processing" and request["prediction_id"]:
+                resume_provider = request["prediction_provider"]
+                resume_prediction_id = request["prediction_id"]
+                resume_tier = request.get("tier")
+        except Exception as e:
+            print(f"Database read error: {e}")
+
+    # A resumed prediction keeps the tier (and model) it was started with
+    tier = choose_generation_tier(resume_tier or form_data.get("tier"))
+
+    # Update status to processing
+    if request_id:
+        try:
+            # A new attempt forgets the previous attempt's finished prediction
+            db_manager.update_request_processing(request_id, tier, keep_prediction=resume_prediction_id is not None)
+        except Exception as e:
+            print(f"Database update error: {e}")
+
+    def record_prediction(provider: str, prediction_id: str) -> None:
+        if request_id:
+            try:
+                db_manager.update_request_prediction(request_id, provider, prediction_id)
+            except Exception as e:
+                print(f"Database update error: {e}")
+
+    try:
+        # Initialize generator
+        report(20, "Initializing AI model...")
+        generator = ImageGenerator(tier=tier, variants=variants, seed=-1 if regenerate else None)
+
+        if resume_prediction_id and resume_provider in generator.generators:
+            print(f"Reattaching to in-flight prediction {resume_prediction_id}")
+        else:
+            resume_prediction_id = None
+
+        # Generate avatar; the provider reports queue position and progress
+        avatar, generation_time, error = generator.generate_avatar(
+            photo,
+            form_data["superhero"],
+            form_data["color"],
+            form_data["car"],
+            prediction_id=resume_prediction_id,
+            on_prediction=record_prediction,
+            prediction_provider=resume_provider,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            deadline=deadline,
+            use_cache=not regenerate
+        )
+    except Exception as e:
+        avatar, generation_time, error = None, 0, str(e)
+
+    outcome["generation_time"] = generation_time
+    report(80, "Adding finishing touches...")
+
+    if error:
+        outcome["error"] = error
+        # Update database with failure
+        if request_id:
+            try:
+                db_manager.update_request_failed(request_id, error)
+            except Exception as e:
+                print(f"Database update error: {e}")
+        return outcome
+
+    # Save images
+    report(85, "Saving your avatar...")
+    original_filename = generate_unique_filename("original", "jpg")
+    avatar_filename = generate_unique_filename("avatar", "png")
+
+    try:
+        # Save original (not available when a reconnecting session resumed the
+        # prediction); it is optional, so it is skipped when the deadline is close
+        original_path = None
+        if photo is not None and not deadline.has_time_for(AppConfig.DEADLINE_ORIGINAL_SAVE_MIN_SECONDS):
+            print("Skipping original photo save: generation deadline is close")
+        elif photo is not None:
+            original_path = save_image(
+                photo,
+                AppConfig.ORIGINALS_DIR,
+                original_filename
+            )
+
+        report(90, "Saving your avatar...")
+
+        # Save avatar
+        avatar_path = save_image(
+            avatar,
+            AppConfig.AVATARS_DIR,
+            avatar_filename
+        )
+
+        report(95, "Saving your avatar...")
+    except Exception as e:
+        print(f"Error saving images: {e}")
+        # Continue anyway - we have the generated avatar in memory
+        original_path = f"temp_{original_filename}"
+        avatar_path = f"temp_{avatar_filename}"
+
+    # Create participant record
+    if AppConfig.ENABLE_EMAIL_CAPTURE:
+        record = create_participant_record(
+            form_data["name"],
+            form_data["email"],
+            form_data["superhero"],
+            form_data["car"],
+            form_data["color"],
+            original_path,
+            avatar_path,
+            generation_time
+        )
+
+    # Update database with success
+    if request_id:
+        try:
+            db_manager.update_request_completed(
+                request_id,
+                generation_time,
+                original_path,
+                avatar_path
+            )
+        except Exception as e:
+            print(f"Database update error: {e}")
+
+    report(100, "Complete!")
+
+    outcome.update(
+        avatar=avatar,
+        original_path=original_path,
+        avatar_path=avatar_path,
+        variants=getattr(avatar, 'variants', [])
+    )
+    return outcome
+
+
+def generate_variant(
+    photo: Image.Image,
+    form_data: Dict[str, str],
+    progress_callback: Optional[Callable[[int, str], None]] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """Generate and finish one more avatar for a request without saving it.
+
+    Used to prefetch a Regenerate result. Nothing is written to the
+    database or storage; ``save_variant`` does that if the user sees it.
+
+    Args:
+        photo: Original photo
+        form_data: User's superhero, car and color, plus an optional "tier"
+        progress_callback: Optional callback receiving (progress, message)
+        cancel_event: Set to cancel the provider prediction
+
+    Returns:
+        Outcome dictionary shaped like ``run_generation_pipeline``'s, with
+        ``prefetched`` set and no saved paths
+    """
+    outcome = {
+        "avatar": None,
+        "generation_time": 0,
+        "error": None,
+        "original_path": None,
+        "avatar_path": None,
+        "variants": [],
+        "prefetched": True
+    }
+    try:
+        # A prefetch is always a new avatar: no cache, random seed
+        generator = ImageGenerator(tier=form_data.get("tier"), seed=-1)
+        avatar, generation_time, error = generator.generate_avatar(
+            photo,
+            form_data["superhero"],
+            form_data["color"],
+            form_data["car"],
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            use_cache=False
+        )
+    except Exception as e:
+        avatar, generation_time, error = None, 0, str(e)
+
+    outcome.update(avatar=avatar, generation_time=generation_time, error=error)
+    return outcome
+
+
+def save_variant(
+    variant: Image.Image,
+    request_id: Optional[str] = None,
+    generation_time: float = 0,
+    progress_callback: Optional[Callable[[int, str], None]] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Optional[str]:
+    """Save a pooled variant shown by Regenerate and record it as the request's avatar.
+
+    Args:
+        variant: Finished variant image
+        request_id: Database request ID, if one was created
+        generation_time: Generation time of the call that produced the variant
+        progress_callback: Unused; accepted so the job can run on the generation pool
+        cancel_event: Unused; accepted so the job can run on the generation pool
+
+    Returns:
+        Saved avatar path, or None if saving failed
+    """
+    try:
+        avatar_path = save_image(
+            variant,
+            AppConfig.AVATARS_DIR,
+            generate_unique_filename("avatar", "png")
+        )
+    except Exception as e:
+        print(f"Error saving variant: {e}")
+        return None
+
+    if request_id:
+        try:
+            # The original photo was saved by the first run
+            db_manager.update_request_completed(request_id, generation_time, None, avatar_path)
+        except Exception as e:
+            print(f"Database update error: {e}")
+    return avatar_path
@@ -0,0 +1,161 @@
+"""Postgres-backed generation queue client for Superhero Avatar Generator.
+
+The Streamlit app enqueues jobs and watches them; ``generation_worker.py``
+processes run the generation pipeline on any node.
+"""
+
+import io
+import time
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from config import AppConfig
+from database import db_manager
+from utils import process_uploaded_image
+
+
+def encode_job_image(image: Image.Image) -> bytes:
+    """Encode an image for storage in the job queue.
+    
+    Args:
+        image: PIL Image
+        
+    Returns:
+        PNG bytes
+    """
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def decode_job_image(data: bytes) -> Image.Image:
+    """Decode an image stored in the job queue.
+    
+    Args:
+        data: Encoded image bytes
+        
+    Returns:
+        PIL Image object
+    """
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+class QueuedGenerationJob:
+    """Handle for a generation job processed by a worker process.
+    
+    Exposes the same interface as ``generation_executor.GenerationJob`` so
+    the app can poll either kind of job the same way.
+    """
+    
+    def __init__(self, job_id: str):
+        """Initialize the handle.
+        
+        Args:
+            job_id: ID of the queued job
+        """
+        self.job_id = job_id
+        self._state: Dict[str, Any] = {}
+        self._refreshed_at = 0.0
+    
+    def _refresh(self) -> None:
+        """Reload job state from the database if it is stale."""
+        if time.time() - self._refreshed_at < AppConfig.GENERATION_POLL_INTERVAL_SECONDS:
+            return
+        state = db_manager.get_generation_job(self.job_id)
+        if state is None:
+            raise RuntimeError(f"Generation job {self.job_id} not found")
+        self._state = state
+        self._refreshed_at = time.time()
+    
+    @property
+    def status(self) -> str:
+        """Job status: queued, running, completed, failed or cancelled."""
+        self._refresh()
+        return self._state["status"]
+    
+    @property
+    def progress(self) -> int:
+        """Percentage complete (0-100)."""
+        self._refresh()
+        return self._state["progress"]
+    
+    @property
+    def message(self) -> str:
+        """Status message for the UI."""
+        self._refresh()
+        return self._state["message"] or ""
+    
+    def cancel(self) -> None:
+        """Ask the worker to stop and cancel the provider prediction."""
+        db_manager.cancel_generation_job(self.job_id)
+        self._refreshed_at = 0.0
+    
+    def done(self) -> bool:
+        """Check whether the job has finished."""
+        return self.status in ("completed", "failed", "cancelled")
+    
+    def result(self) -> Dict[str, Any]:
+        """Get the job result.
+        
+        Returns:
+            Dictionary with avatar, generation_time, error, original_path
+            and avatar_path, matching ``run_generation_pipeline``
+            
+        Raises:
+            RuntimeError: If the job has not finished yet
+        """
+        if not self.done():
+            raise RuntimeError(f"Generation job {self.job_id} is still running")
+        
+        state = db_manager.get_generation_job(self.job_id, include_result=True)
+        outcome = {
+            "avatar": None,
+            "generation_time": state["generation_time_seconds"] or 0,
+            "error": state["error_message"],
+            "original_path": state["original_image_path"],
+            "avatar_path": state["generated_image_path"]
+        }
+        
+        if state["status"] == "completed" and state["result_image"]:
+            avatar = decode_job_image(state["result_image"])
+            # Re-attach the Claude analysis stored alongside the image
+            if state["style_score"] is not None:
+                setattr(avatar, 'style_score', state["style_score"])
+            if state["commentary"] is not None:
+                setattr(avatar, 'commentary', state["commentary"])
+            outcome["avatar"] = avatar
+        elif not outcome["error"]:
+            outcome["error"] = "No image generated"
+        
+        return outcome
+
+
+def enqueue_generation(
+    photo: Optional[Image.Image],
+    request_id: str,
+    attempt: Optional[int] = None
+) -> QueuedGenerationJob:
+    """Queue a generation for the worker processes.
+    
+    Args:
+        photo: Original photo, or None to reattach to the request's active job
+            after a browser reconnect
+        request_id: ID of the avatar request the job belongs to
+        attempt: Generation attempt for the request; duplicate submissions
+            of the same attempt attach to the job already queued
+        
+    Returns:
+        Handle to poll for progress and result
+    """
+    if photo is None:
+        job_id = db_manager.get_active_generation_job_id(request_id)
+        if job_id is None:
+            raise ValueError("Original photo is no longer available. Please retake your photo.")
+        return QueuedGenerationJob(job_id)
+    
+    input_image = encode_job_image(process_uploaded_image(photo))
+    job_id = db_manager.enqueue_generation_job(request_id, input_image, attempt)
+    return QueuedGenerationJob(job_id)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Generation worker process for the Postgres-backed job queue.
+
+Claims queued jobs from the ``generation_jobs`` table and runs the
+generation, overlay and save pipeline. Run as many workers as needed on
+any node that can reach the database:
+
+    uv run python generation_worker.py
+"""
+
+import os
+import socket
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+from config import AppConfig
+from database import db_manager
+from generation_pipeline import run_generation_pipeline
+from generation_queue import decode_job_image, encode_job_image
+from model_versions import warm_model_versions
+
+
+class GenerationWorker:
+    """Claims and processes queued generation jobs."""
+    
+    def __init__(self, worker_id: Optional[str] = None):
+        """Initialize the worker.
+        
+        Args:
+            worker_id: Unique worker ID (defaults to host, pid and a random suffix)
+        """
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+    
+    def stop(self) -> None:
+        """Stop after the current job finishes."""
+        self._stop.set()
+    
+    def run_forever(self) -> None:
+        """Process jobs until stopped."""
+        print(f"Generation worker {self.worker_id} started")
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(AppConfig.WORKER_IDLE_SLEEP_SECONDS)
+            except Exception as e:
+                print(f"Worker error: {e}")
+                self._stop.wait(AppConfig.WORKER_IDLE_SLEEP_SECONDS)
+        print(f"Generation worker {self.worker_id} stopped")
+    
+    def run_once(self) -> bool:
+        """Claim and process a single job.
+        
+        Returns:
+            True if a job was processed, False if the queue was empty
+        """
+        job = db_manager.claim_generation_job(
+            self.worker_id,
+            lease_seconds=AppConfig.WORKER_LEASE_SECONDS,
+            max_attempts=AppConfig.WORKER_MAX_ATTEMPTS
+        )
+        if job is None:
+            return False
+        
+        print(f"Claimed job {job['job_id']} (attempt {job['attempts']})")
+        self._process(job)
+        return True
+    
+    def _process(self, job: Dict[str, Any]) -> None:
+        """Run the pipeline for a claimed job while heartbeating its lease."""
+        job_id = job["job_id"]
+        lease_lost = threading.Event()
+        cancel_event = threading.Event()
+        finished = threading.Event()
+        
+        def heartbeat():
+            while not finished.wait(AppConfig.WORKER_HEARTBEAT_SECONDS):
+                try:
+                    if not db_manager.heartbeat_generation_job(
+                        job_id, self.worker_id, AppConfig.WORKER_LEASE_SECONDS
+                    ):
+                        state = db_manager.get_generation_job(job_id)
+                        if state and state["status"] == "cancelled":
+                            # User clicked Back/Home - stop the provider prediction
+                            print(f"Job {job_id} was cancelled")
+                            cancel_event.set()
+                        else:
+                            # Another worker owns the job and may have
+                            # reattached to our prediction, so leave it running
+                            print(f"Lost lease on job {job_id}")
+                        lease_lost.set()
+                        return
+                except Exception as e:
+                    # Keep trying - the lease only expires after WORKER_LEASE_SECONDS
+                    print(f"Heartbeat error: {e}")
+        
+        def report(progress: int, message: Optional[str] = None):
+            try:
+                db_manager.update_generation_job_progress(job_id, self.worker_id, progress, message)
+            except Exception as e:
+                print(f"Progress update error: {e}")
+        
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        
+        try:
+            request = db_manager.get_request(job["request_id"])
+            if request is None:
+                raise ValueError(f"Avatar request {job['request_id']} not found")
+            
+            photo = decode_job_image(job["input_image"])
+            outcome = run_generation_pipeline(
+                photo,
+                request,
+                job["request_id"],
+                progress_callback=report,
+                cancel_event=cancel_event,
+                # Later attempts at a request are Regenerate or Try Again
+                regenerate=bool(job.get("request_attempt"))
+            )
+        except Exception as e:
+            outcome = {"avatar": None, "error": str(e)}
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+        
+        if lease_lost.is_set():
+            # Another worker has taken over the job; discard our result
+            return
+        
+        if outcome["error"] or outcome["avatar"] is None:
+            db_manager.fail_generation_job(
+                job_id, self.worker_id, outcome["error"] or "No image generated"
+            )
+            print(f"Job {job_id} failed: {outcome['error']}")
+            return
+        
+        avatar = outcome["avatar"]
+        db_manager.complete_generation_job(
+            job_id,
+            self.worker_id,
+            result_image=encode_job_image(avatar),
+            generation_time=outcome["generation_time"],
+            style_score=getattr(avatar, 'style_score', None),
+            commentary=getattr(avatar, 'commentary', None),
+            original_image_path=outcome["original_path"],
+            generated_image_path=outcome["avatar_path"]
+        )
+        print(f"Job {job_id} completed in {outcome['generation_time']:.1f}s")
+
+
+def main():
+    """Run a generation worker until interrupted."""
+    AppConfig.validate()
+    warm_model_versions()
+    worker = GenerationWorker()
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Shared outbound HTTP transport for Superhero Avatar Generator.
+
+Every outbound call goes through one keep-alive connection pool per host
+instead of opening a new connection (and TLS handshake) per request. SDK
+clients that manage their own connections (Replicate, Databricks, GCS) are
+created once per process and reused for the same reason.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import AppConfig
+from metrics import metrics
+
+
+class HTTPTransport:
+    """Pooled ``requests`` session with default timeouts and per-host metrics."""
+
+    def __init__(
+        self,
+        pool_hosts: int = 10,
+        pool_size: int = 16,
+        connect_timeout: float = 5,
+        read_timeout: float = 30
+    ):
+        """Initialize the transport.
+
+        Args:
+            pool_hosts: Number of hosts to keep connection pools for
+            pool_size: Keep-alive connections kept per host
+            connect_timeout: Default connect timeout in seconds
+            read_timeout: Default read timeout in seconds
+        """
+        self.pool_hosts = pool_hosts
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Session holding the connection pools, created on first use."""
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_hosts,
+                    pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request over the pooled session.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            **kwargs: Passed to ``requests.Session.request``; ``timeout``
+                defaults to the transport's (connect, read) timeout
+
+        Returns:
+            Response (headers only when ``stream=True``)
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).hostname or "unknown"
+        start_time = time.time()
+
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            metrics.increment("http_request_errors_total", host=host, error=type(e).__name__)
+            raise
+
+        metrics.increment("http_requests_total", host=host, status=response.status_code)
+        metrics.observe("http_request_seconds", time.time() - start_time, host=host)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request."""
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+# Create global HTTP transport instance
+http_transport = HTTPTransport(
+    pool_hosts=AppConfig.HTTP_POOL_HOSTS,
+    pool_size=AppConfig.HTTP_POOL_SIZE,
+    connect_timeout=AppConfig.HTTP_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=AppConfig.HTTP_READ_TIMEOUT_SECONDS
+)
+
+
+# Shared SDK clients, keyed by their credentials
+_clients: Dict[Tuple[str, str], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(kind: str, key: str, factory) -> Any:
+    """Get a cached client, creating it on first use."""
+    with _clients_lock:
+        if (kind, key) not in _clients:
+            _clients[(kind, key)] = factory()
+        return _clients[(kind, key)]
+
+
+def get_replicate_client(api_token: str):
+    """Get the shared Replicate client.
+
+    Args:
+        api_token: Replicate API token
+
+    Returns:
+        replicate.Client reusing one connection pool
+    """
+    import replicate
+    return _get_client("replicate", api_token, lambda: replicate.Client(api_token=api_token))
+
+
+def get_workspace_client(host: str, token: str):
+    """Get the shared Databricks workspace client.
+
+    Args:
+        host: Databricks workspace URL
+        token: Databricks access token
+
+    Returns:
+        databricks.sdk.WorkspaceClient
+    """
+    from databricks.sdk import WorkspaceClient
+    return _get_client(
+        "databricks", f"{host}|{token}",
+        lambda: WorkspaceClient(host=host, token=token)
+    )
+
+
+def get_gcs_client(credentials_json: str):
+    """Get the shared Google Cloud Storage client.
+
+    Args:
+        credentials_json: Service account key JSON
+
+    Returns:
+        google.cloud.storage.Client
+    """
+    from google.cloud import storage
+    return _get_client(
+        "gcs", credentials_json,
+        lambda: storage.Client.from_service_account_info(json.loads(credentials_json))
+    )
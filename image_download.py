@@ -0,0 +1,144 @@
+"""Streamed download and decode of generated images for Superhero Avatar Generator.
+
+Generated images are decoded as bytes arrive instead of being buffered in
+full first, and are rejected once they exceed the configured byte or pixel
+limits so an oversized output cannot exhaust a worker's memory.
+"""
+
+import time
+from typing import Iterable, Optional
+
+from PIL import Image, ImageFile
+
+from config import AppConfig
+from deadline import Deadline, within
+from http_transport import http_transport
+from metrics import metrics
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when a generated image exceeds the byte or pixel limit."""
+
+
+def _check_pixels(image: Image.Image, max_pixels: int) -> None:
+    """Reject images whose dimensions exceed the pixel limit."""
+    if image.width * image.height > max_pixels:
+        raise ImageTooLargeError(
+            f"Generated image is {image.width}x{image.height}, over the {max_pixels:,} pixel limit"
+        )
+
+
+def decode_image_stream(
+    chunks: Iterable[bytes],
+    provider: Optional[str] = None,
+    started_at: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+    deadline: Optional[Deadline] = None
+) -> Image.Image:
+    """Decode an image from chunks as they arrive.
+
+    Args:
+        chunks: Encoded image bytes in chunks
+        provider: Provider label for download metrics (None records nothing)
+        started_at: When the request was sent, for time-to-first-byte
+        max_bytes: Maximum encoded size (defaults to AppConfig.MAX_OUTPUT_IMAGE_BYTES)
+        max_pixels: Maximum width x height (defaults to AppConfig.MAX_OUTPUT_IMAGE_PIXELS)
+        deadline: Generation deadline, checked as chunks arrive
+
+    Returns:
+        Decoded PIL Image
+
+    Raises:
+        ImageTooLargeError: If a limit is exceeded
+        DeadlineExceeded: If the deadline passes mid-download
+    """
+    max_bytes = max_bytes or AppConfig.MAX_OUTPUT_IMAGE_BYTES
+    max_pixels = max_pixels or AppConfig.MAX_OUTPUT_IMAGE_PIXELS
+    started_at = started_at or time.time()
+
+    parser = ImageFile.Parser()
+    total_bytes = 0
+    first_byte_at = None
+    header_checked = False
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if deadline is not None:
+            deadline.check("download")
+        if first_byte_at is None:
+            first_byte_at = time.time()
+
+        total_bytes += len(chunk)
+        if total_bytes > max_bytes:
+            raise ImageTooLargeError(f"Generated image is over the {max_bytes:,} byte limit")
+
+        parser.feed(chunk)
+
+        # Dimensions are known once the header is parsed; stop before decoding pixels
+        if not header_checked and parser.image is not None:
+            _check_pixels(parser.image, max_pixels)
+            header_checked = True
+
+    image = parser.close()
+    if not header_checked:
+        _check_pixels(image, max_pixels)
+
+    if provider and first_byte_at is not None:
+        metrics.observe("image_download_ttfb_seconds", first_byte_at - started_at, provider=provider)
+        metrics.observe("image_download_seconds", time.time() - started_at, provider=provider)
+        metrics.observe("image_download_bytes", total_bytes, provider=provider)
+
+    return image
+
+
+def download_image(
+    url: str,
+    provider: str,
+    timeout: Optional[float] = None,
+    deadline: Optional[Deadline] = None
+) -> Image.Image:
+    """Download and decode a generated image.
+
+    Args:
+        url: Image URL
+        provider: Provider label for download metrics
+        timeout: Connect and read timeout in seconds
+            (defaults to AppConfig.DOWNLOAD_TIMEOUT_SECONDS)
+        deadline: Generation deadline; the timeout never exceeds what remains
+
+    Returns:
+        Decoded PIL Image
+
+    Raises:
+        ImageTooLargeError: If a limit is exceeded
+        DeadlineExceeded: If the deadline passes before the image arrives
+    """
+    if deadline is not None:
+        deadline.check("download")
+    timeout = within(deadline, timeout or AppConfig.DOWNLOAD_TIMEOUT_SECONDS)
+
+    started_at = time.time()
+    response = http_transport.get(url, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+
+        # Reject up front when the server declares an oversized body
+        try:
+            declared_bytes = int(response.headers.get("Content-Length"))
+        except (TypeError, ValueError):
+            declared_bytes = None
+        if declared_bytes is not None and declared_bytes > AppConfig.MAX_OUTPUT_IMAGE_BYTES:
+            raise ImageTooLargeError(
+                f"Generated image is over the {AppConfig.MAX_OUTPUT_IMAGE_BYTES:,} byte limit"
+            )
+
+        return decode_image_stream(
+            response.iter_content(chunk_size=AppConfig.DOWNLOAD_CHUNK_BYTES),
+            provider=provider,
+            started_at=started_at,
+            deadline=deadline
+        )
+    finally:
+        response.close()
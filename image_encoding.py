@@ -0,0 +1,189 @@
+"""Input image encoding for Superhero Avatar Generator.
+
+Profiles are defined in ``AppConfig.INPUT_ENCODING_PROFILES`` and selected
+per provider with ``REPLICATE_INPUT_ENCODING`` and ``FAL_INPUT_ENCODING``.
+
+``StreamingJSONBody`` builds JSON request bodies that embed images as data
+URIs without materialising the base64 text: the compressed image is kept in
+a single buffer and base64-encoded chunk by chunk while the body is sent.
+"""
+
+import base64
+import io
+import json
+import re
+import uuid
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from PIL import Image
+
+from config import AppConfig
+
+
+def get_encoding_profile(name: str) -> Dict[str, Any]:
+    """Get an encoding profile by name.
+    
+    Args:
+        name: Profile name, e.g. "png" or "jpeg-hq"
+        
+    Returns:
+        Profile with format, mime_type and encoder options
+        
+    Raises:
+        ValueError: If the profile does not exist
+    """
+    if name not in AppConfig.INPUT_ENCODING_PROFILES:
+        raise ValueError(
+            f"Unknown encoding profile: {name}. "
+            f"Must be one of {', '.join(AppConfig.INPUT_ENCODING_PROFILES)}"
+        )
+    return AppConfig.INPUT_ENCODING_PROFILES[name]
+
+
+def encode_image_buffer(image: Image.Image, profile: str = "png") -> Tuple[io.BytesIO, str]:
+    """Encode an image into a buffer with an encoding profile.
+    
+    Args:
+        image: PIL Image
+        profile: Encoding profile name
+        
+    Returns:
+        Tuple of (buffer positioned at the start, mime_type)
+    """
+    settings = get_encoding_profile(profile)
+    
+    # JPEG has no alpha channel or palette
+    if settings["format"] == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    
+    buffered = io.BytesIO()
+    image.save(buffered, format=settings["format"], **settings["options"])
+    buffered.seek(0)
+    return buffered, settings["mime_type"]
+
+
+def encode_image(image: Image.Image, profile: str = "png") -> Tuple[bytes, str]:
+    """Encode an image with an encoding profile.
+    
+    Args:
+        image: PIL Image
+        profile: Encoding profile name
+        
+    Returns:
+        Tuple of (encoded_bytes, mime_type)
+    """
+    buffered, mime_type = encode_image_buffer(image, profile)
+    return buffered.getvalue(), mime_type
+
+
+def encode_data_uri(image: Image.Image, profile: str = "png") -> str:
+    """Encode an image as a base64 data URI.
+    
+    Args:
+        image: PIL Image
+        profile: Encoding profile name
+        
+    Returns:
+        Base64 encoded string with data URI prefix
+    """
+    buffered, mime_type = encode_image_buffer(image, profile)
+    # Encode straight from the buffer rather than a getvalue() copy
+    base64_encoded = base64.b64encode(buffered.getbuffer()).decode('ascii')
+    return f"data:{mime_type};base64,{base64_encoded}"
+
+
+class InlineImage:
+    """Image embedded in a ``StreamingJSONBody`` as a base64 data URI."""
+    
+    def __init__(self, image: Image.Image, profile: str = "png"):
+        """Encode the image once into a buffer.
+        
+        Args:
+            image: PIL Image
+            profile: Encoding profile name
+        """
+        self._buffer, self.mime_type = encode_image_buffer(image, profile)
+        self.prefix = f"data:{self.mime_type};base64,".encode('ascii')
+    
+    @property
+    def size(self) -> int:
+        """Size of the encoded image in bytes."""
+        return self._buffer.getbuffer().nbytes
+    
+    def __len__(self) -> int:
+        """Length of the data URI in bytes."""
+        return len(self.prefix) + 4 * ((self.size + 2) // 3)
+    
+    def iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """Yield the data URI in chunks.
+        
+        Args:
+            chunk_size: Approximate raw bytes encoded per chunk
+            
+        Yields:
+            Data URI prefix, then base64 chunks
+        """
+        yield self.prefix
+        
+        # Whole 3-byte groups so chunks concatenate without padding
+        step = max(chunk_size - chunk_size % 3, 3)
+        with self._buffer.getbuffer() as data:
+            for start in range(0, data.nbytes, step):
+                yield base64.b64encode(data[start:start + step])
+    
+    def to_data_uri(self) -> str:
+        """Get the whole data URI as a string."""
+        return b"".join(self.iter_chunks(AppConfig.STREAMING_BODY_CHUNK_BYTES)).decode('ascii')
+
+
+class StreamingJSONBody:
+    """JSON request body that streams its ``InlineImage`` values.
+    
+    Pass as ``data=`` to ``requests``; the body has a known length so it is
+    sent with Content-Length rather than chunked encoding, and can be
+    iterated again if the request is retried.
+    """
+    
+    def __init__(self, payload: Any, chunk_size: int = None):
+        """Serialize everything except the images.
+        
+        Args:
+            payload: JSON-serializable value that may contain InlineImage values
+            chunk_size: Raw image bytes encoded per chunk
+        """
+        self.chunk_size = chunk_size or AppConfig.STREAMING_BODY_CHUNK_BYTES
+        images: List[InlineImage] = []
+        marker = f"__inline_image_{uuid.uuid4().hex}_"
+        
+        def replace(value: Any) -> Any:
+            if isinstance(value, InlineImage):
+                images.append(value)
+                return f"{marker}{len(images) - 1}"
+            if isinstance(value, dict):
+                return {key: replace(item) for key, item in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [replace(item) for item in value]
+            return value
+        
+        text = json.dumps(replace(payload))
+        
+        # Alternate JSON text and images; base64 never needs JSON escaping
+        self._parts: List[Union[bytes, InlineImage]] = []
+        position = 0
+        for match in re.finditer(re.escape(marker) + r"(\d+)", text):
+            self._parts.append(text[position:match.start()].encode('utf-8'))
+            self._parts.append(images[int(match.group(1))])
+            position = match.end()
+        self._parts.append(text[position:].encode('utf-8'))
+    
+    def __len__(self) -> int:
+        """Total body length in bytes."""
+        return sum(len(part) for part in self._parts)
+    
+    def __iter__(self) -> Iterator[bytes]:
+        """Yield the body in chunks."""
+        for part in self._parts:
+            if isinstance(part, InlineImage):
+                yield from part.iter_chunks(self.chunk_size)
+            elif part:
+                yield part
@@ -1,18 +1,35 @@
 """AI Image Generation module for Superhero Avatar Generator."""
 
-import base64
-import io
 import time
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import replicate
-import requests
+from replicate.exceptions import ModelError, ReplicateError
+from replicate.helpers import FileOutput, transform_output
 from PIL import Image
 
 from config import AppConfig
 from utils import process_uploaded_image
 from databricks_claude import get_claude_commentary
 from logo_overlay import add_logo_to_image
+from circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from provider_router import provider_router
+from provider_stats import latency_percentile, record_failure, record_latency
+from upload_cache import upload_cache
+from image_encoding import encode_data_uri, encode_image_buffer
+from image_download import decode_image_stream, download_image
+from http_transport import get_replicate_client
+from deadline import Deadline, DeadlineExceeded
+from retry_policy import SAFETY, classify_error, get_retry_policy
+from sensitivity_cache import sensitivity_cache
+from result_cache import result_cache, result_key
+from model_versions import model_versions
+from metrics import metrics
+
+
+class PredictionCancelled(Exception):
+    """Raised when a provider prediction was cancelled before finishing."""
 
 
 class ReplicateImageGenerator:
@@ -23,81 +40,313 @@ class ReplicateImageGenerator:
         if not AppConfig.REPLICATE_API_TOKEN:
             raise ValueError("REPLICATE_API_TOKEN is required")
         
-        # Initialize Replicate client
-        self.client = replicate.Client(api_token=AppConfig.REPLICATE_API_TOKEN)
+        # Shared Replicate client so connections are reused across generations
+        self.client = get_replicate_client(AppConfig.REPLICATE_API_TOKEN)
         self.model_name = AppConfig.REPLICATE_MODEL
+        self.input_encoding = AppConfig.REPLICATE_INPUT_ENCODING
+    
+    def generate(
+        self,
+        image_data: Optional[str],
+        prompt: str,
+        seed: int = -1,
+        prediction_id: Optional[str] = None,
+        on_prediction: Optional[Callable[[str], None]] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Optional[Union[FileOutput, str]]:
+        """Run the Replicate model for a single output.
+        
+        Takes the same arguments as ``generate_outputs``.
+        
+        Returns:
+            File output to read the generated image from, the image URL for
+            legacy outputs, or None
+        """
+        outputs = self.generate_outputs(
+            image_data, prompt, seed, prediction_id, on_prediction,
+            progress_callback, cancel_event, deadline, params
+        )
+        return outputs[0] if outputs else None
     
-    def generate(self, image_data: str, prompt: str, seed: int = -1) -> Optional[str]:
+    def generate_outputs(
+        self,
+        image_data: Optional[str],
+        prompt: str,
+        seed: int = -1,
+        prediction_id: Optional[str] = None,
+        on_prediction: Optional[Callable[[str], None]] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+        params: Optional[Dict[str, Any]] = None,
+        num_outputs: int = 1
+    ) -> List[Union[FileOutput, str]]:
         """Run the Replicate model.
         
         Args:
-            image_data: Base64 encoded image data
+            image_data: Base64 encoded image data (unused when resuming)
             prompt: Generation prompt
             seed: Random seed (-1 for random)
+            prediction_id: ID of an in-flight prediction to reattach to
+            on_prediction: Callback receiving the ID of a newly created prediction
+            progress_callback: Callback receiving (progress, message) while
+                the prediction runs
+            cancel_event: Set to cancel the prediction while it is polled
+            deadline: Prediction is cancelled if still running at this deadline
+            params: Generation tier input overrides; a "model" entry runs
+                that model instead of the configured one
+            num_outputs: Images to request from the one prediction (models
+                without multiple outputs return one)
             
         Returns:
-            URL of generated image or None
+            File outputs to read the generated images from, or image URLs for
+            legacy outputs; empty if the prediction produced nothing
+            
+        Raises:
+            ModelError: If the prediction failed
+            PredictionCancelled: If the prediction was cancelled
+            DeadlineExceeded: If the deadline passed while the prediction ran
         """
+        params = dict(params or {})
+        model_name = params.pop("model", self.model_name)
         
-        # Standard Flux model parameters
-        input_params = {
-            "prompt": prompt,
-            "input_image": image_data,
-            "seed": seed,
-            "aspect_ratio": "match_input_image",
-            "output_format": "png",
-            "safety_tolerance": 2,
-            "prompt_upsampling": True,
-            "num_outputs": 1,
-            "disable_safety_check": False
-        }
+        if prediction_id:
+            # Reattach to a prediction that is already running
+            prediction = self.client.predictions.get(prediction_id)
+        else:
+            # Standard Flux model parameters
+            input_params = {
+                "prompt": prompt,
+                "input_image": image_data,
+                "seed": seed,
+                "aspect_ratio": "match_input_image",
+                "output_format": "png",
+                "safety_tolerance": 2,
+                "prompt_upsampling": True,
+                "num_outputs": num_outputs,
+                "disable_safety_check": False
+            }
+            input_params.update(params)
+            
+            # Create the prediction on the pinned version, so a new model
+            # version cannot change behaviour mid-event
+            version_id = model_versions.get(self.client, model_name)
+            if version_id:
+                try:
+                    prediction = self.client.predictions.create(
+                        version=version_id,
+                        input=input_params
+                    )
+                except ReplicateError as e:
+                    if ":" in model_name or e.status not in (404, 422) or "version" not in str(e).lower():
+                        raise
+                    # Model only runs through its model endpoint
+                    print(f"{model_name} rejected pinned version {version_id}, running by name")
+                    model_versions.mark_unversioned(model_name)
+                    version_id = None
+            if not version_id:
+                prediction = self.client.models.predictions.create(
+                    model=model_name,
+                    input=input_params
+                )
+            
+            if on_prediction:
+                on_prediction(prediction.id)
         
-        # Run the model
-        output = self.client.run(
-            self.model_name,
-            input=input_params
-        )
+        self.wait(prediction, progress_callback, cancel_event, deadline, model_name)
+        
+        if prediction.status == "failed":
+            raise ModelError(prediction)
+        if prediction.status == "canceled":
+            raise PredictionCancelled(f"Prediction {prediction.id} was canceled")
+        
+        # HTTPS and data URLs become file outputs that read through the
+        # client's pooled connection instead of a separate download
+        output = transform_output(prediction.output, self.client)
         
         # Handle different Replicate API response formats
-        if output is None:
-            return None
-        elif isinstance(output, str):
-            # Direct URL string
+        outputs = output if isinstance(output, list) else [output]
+        references = [self._output_reference(item) for item in outputs]
+        return [reference for reference in references if reference is not None]
+    
+    @staticmethod
+    def _output_reference(output) -> Optional[Union[FileOutput, str]]:
+        """Get a file output or URL from one item of a prediction's output."""
+        if output is None or isinstance(output, (FileOutput, str)):
             return output
         elif hasattr(output, 'url'):
-            # File object with url method
+            # Legacy file object with url method
             if callable(getattr(output, 'url')):
                 return output.url()
             else:
                 return output.url
-        elif isinstance(output, list) and len(output) > 0:
-            # List of URLs or objects - get the first one
-            first_item = output[0]
-            if isinstance(first_item, str):
-                return first_item
-            elif hasattr(first_item, 'url'):
-                if callable(getattr(first_item, 'url')):
-                    return first_item.url()
-                else:
-                    return first_item.url
         
         return None
+    
+    def wait(
+        self,
+        prediction,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+        model_name: Optional[str] = None
+    ) -> None:
+        """Poll a prediction until it reaches a terminal status.
+        
+        Args:
+            prediction: Replicate prediction, reloaded in place
+            progress_callback: Callback receiving (progress, message)
+            cancel_event: Set to cancel the prediction
+            deadline: Prediction is cancelled if still running at this deadline
+            model_name: Model the prediction runs (defaults to the configured one)
+            
+        Raises:
+            PredictionCancelled: If cancel_event was set
+            DeadlineExceeded: If the deadline passed
+        """
+        start = AppConfig.PROVIDER_PROGRESS_START
+        end = AppConfig.PROVIDER_PROGRESS_END
+        
+        # Estimate run time from recent latencies of the model being run
+        expected = latency_percentile("replicate", model_name or self.model_name, 50) or AppConfig.PROVIDER_EXPECTED_SECONDS
+        processing_start = None
+        
+        def report(progress: int, message: str) -> None:
+            if progress_callback:
+                progress_callback(progress, message)
+        
+        while prediction.status in ("starting", "processing"):
+            if cancel_event is not None and cancel_event.is_set():
+                prediction.cancel()
+                print(f"Cancelled Replicate prediction {prediction.id}")
+                raise PredictionCancelled(f"Prediction {prediction.id} was canceled")
+            
+            if deadline is not None and deadline.expired():
+                # Stop paying for a result that would arrive too late
+                prediction.cancel()
+                print(f"Cancelled Replicate prediction {prediction.id} at the generation deadline")
+                deadline.check("provider")
+            
+            if prediction.status == "starting":
+                report(start, "Warming up the AI model...")
+            else:
+                if processing_start is None:
+                    processing_start = time.time()
+                # Prefer the model's own progress bar, otherwise estimate from time
+                progress = prediction.progress
+                if progress is not None:
+                    fraction = min(progress.percentage, 0.95)
+                else:
+                    fraction = min((time.time() - processing_start) / expected, 0.95)
+                report(start + int((end - start) * fraction), "Transforming you into a superhero...")
+            
+            time.sleep(AppConfig.PROVIDER_POLL_INTERVAL_SECONDS)
+            prediction.reload()
+        
+        if prediction.status == "succeeded":
+            report(end, "Transforming you into a superhero...")
+    
+    def upload_image(self, image: Image.Image) -> str:
+        """Upload an input image to Replicate file storage.
+        
+        Args:
+            image: PIL Image
+            
+        Returns:
+            URL that model inputs can reference
+        """
+        buffered, mime_type = encode_image_buffer(image, self.input_encoding)
+        uploaded = self.client.files.create(
+            buffered,
+            filename=f"input.{mime_type.split('/')[1]}",
+            content_type=mime_type
+        )
+        return uploaded.urls["get"]
+    
+    def cancel(self, prediction_id: str, model_name: Optional[str] = None) -> None:
+        """Cancel a running prediction.
+        
+        Args:
+            prediction_id: ID of the prediction to cancel
+            model_name: Unused; Replicate cancels by prediction ID alone
+        """
+        self.client.predictions.cancel(prediction_id)
+
+
+class ProviderError(Exception):
+    """Provider failure whose message is already suitable for users."""
 
 
 class ImageGenerator:
     """Unified image generator that supports multiple providers."""
     
-    def __init__(self):
-        """Initialize the image generator with configured provider."""
-        self.provider = AppConfig.AI_PROVIDER
+    def __init__(self, tier: Optional[str] = None, variants: int = 1, seed: Optional[int] = None):
+        """Initialize the image generator with configured provider(s).
         
-        if self.provider == "replicate":
-            self.generator = ReplicateImageGenerator()
-        elif self.provider == "fal":
-            from fal_service import FalImageGenerator
-            self.generator = FalImageGenerator()
+        Args:
+            tier: Generation tier from AppConfig.GENERATION_TIERS
+                (defaults to AppConfig.DEFAULT_GENERATION_TIER)
+            variants: Images requested per provider call; extras are
+                post-processed and attached to the avatar as ``variants``
+            seed: Provider seed, -1 for random (defaults to
+                AppConfig.GENERATION_SEED); Regenerate passes -1 so a fixed
+                seed does not reproduce the avatar already shown
+        """
+        self.tier = tier or AppConfig.DEFAULT_GENERATION_TIER
+        if self.tier not in AppConfig.GENERATION_TIERS:
+            raise ValueError(f"Unknown generation tier: {self.tier}")
+        self.variants = max(1, min(variants, AppConfig.MAX_GENERATION_VARIANTS))
+        self.seed = AppConfig.GENERATION_SEED if seed is None else seed
+        
+        if AppConfig.AI_PROVIDER == "auto" or AppConfig.ENABLE_HEDGING:
+            providers = AppConfig.get_available_providers()
         else:
-            raise ValueError(f"Unsupported AI provider: {self.provider}")
+            providers = [AppConfig.AI_PROVIDER]
+        
+        self.generators = {}
+        for provider in providers:
+            self.generators[provider] = self._create_generator(provider)
+        if not self.generators:
+            raise ValueError("REPLICATE_API_TOKEN or FAL_KEY is required")
+        
+        # A fixed AI_PROVIDER wins; otherwise route on recent latency and errors,
+        # skipping providers whose circuit breaker is open
+        if AppConfig.AI_PROVIDER in self.generators:
+            self.provider = AppConfig.AI_PROVIDER
+        else:
+            candidates = {
+                provider: model for provider, model in self.models.items()
+                if get_circuit_breaker(provider).is_available()
+            }
+            self.provider = provider_router.choose(candidates or self.models)
+        self.generator = self.generators[self.provider]
+    
+    @staticmethod
+    def _create_generator(provider: str):
+        """Create the generator for a provider."""
+        if provider == "replicate":
+            return ReplicateImageGenerator()
+        elif provider == "fal":
+            from fal_service import FalImageGenerator
+            return FalImageGenerator()
+        raise ValueError(f"Unsupported AI provider: {provider}")
+    
+    @property
+    def models(self) -> Dict[str, str]:
+        """Model name used by each available provider at this generator's tier."""
+        return {
+            provider: AppConfig.get_tier_params(self.tier, provider).get("model", generator.model_name)
+            for provider, generator in self.generators.items()
+        }
+    
+    def _get_generator(self, provider: str):
+        """Get the generator instance for a provider."""
+        if provider not in self.generators:
+            raise ValueError(f"Unsupported AI provider: {provider}")
+        return self.generators[provider]
     
     def generate_avatar(
         self,
@@ -105,78 +354,193 @@ class ImageGenerator:
         superhero: str,
         color: str,
         car: str,
-        max_retries: int = 3
+        max_retries: int = 3,
+        prediction_id: Optional[str] = None,
+        on_prediction: Optional[Callable[[str, str], None]] = None,
+        prediction_provider: Optional[str] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+        use_cache: bool = True
     ) -> Tuple[Optional[Image.Image], float, Optional[str]]:
         """Generate superhero avatar using AI.
         
         Args:
-            original_image: Original photo
+            original_image: Original photo (may be None when resuming a prediction)
             superhero: Selected superhero
             color: Selected color
             car: Selected car
             max_retries: Maximum number of retry attempts
+            prediction_id: ID of an in-flight prediction to reattach to
+            on_prediction: Callback receiving (provider, prediction_id) for new predictions
+            prediction_provider: Provider running ``prediction_id`` (defaults to self.provider)
+            progress_callback: Callback receiving (progress, message) from the provider
+            cancel_event: Set to cancel the provider request
+            deadline: End-to-end budget shared with the caller's later stages
+                (defaults to AppConfig.GENERATION_TIMEOUT_SECONDS from now)
+            use_cache: Whether a cached avatar may be served and the result
+                cached (in demo mode or with a fixed seed); False for
+                Regenerate, which must produce a new avatar
             
         Returns:
             Tuple of (generated_image, generation_time, error_message)
         """
         start_time = time.time()
+        if deadline is None:
+            deadline = Deadline(AppConfig.GENERATION_TIMEOUT_SECONDS)
         
         try:
             # Process the image
-            processed_image = process_uploaded_image(original_image)
+            processed_image = None
+            if original_image is not None:
+                processed_image = process_uploaded_image(original_image)
+            elif not prediction_id:
+                raise ValueError("Original photo is no longer available. Please retake your photo.")
             
-            # Generate prompt
+            # Demo runs repeat the same photo and selections; reuse the avatar
+            # from an identical earlier run instead of calling the provider
+            cache_key = None
+            if use_cache and processed_image is not None and not prediction_id and AppConfig.use_result_cache():
+                cache_key = result_key(
+                    processed_image, AppConfig.get_prompt(superhero, color, car),
+                    self.seed, self.tier, self.variants
+                )
+                cached_image = result_cache.get(cache_key)
+                if cached_image is not None:
+                    print("Serving cached avatar for a repeated photo and selections")
+                    return cached_image, time.time() - start_time, None
+            
+            # Generate prompt; selections that tripped the content filter
+            # before start with the fallback prompt instead of a doomed attempt
             prompt = AppConfig.get_prompt(superhero, color, car)
+            if not prediction_id and AppConfig.ENABLE_SENSITIVITY_CACHE:
+                if sensitivity_cache.is_sensitive(superhero, car, color):
+                    print("Selections were flagged before, starting with the fallback prompt")
+                    prompt = AppConfig.get_fallback_prompt(superhero, color, car)
             
             # Use provider-specific generation
-            generated_image = None
-            
-            if self.provider == "fal":
-                # Fal has its own generate_avatar method
-                generated_image, gen_time, error = self.generator.generate_avatar(
-                    processed_image, prompt, seed=-1
+            if prediction_id:
+                generated_image = self._generate_with_provider(
+                    prediction_provider or self.provider, processed_image, prompt,
+                    superhero, color, car, max_retries, prediction_id, on_prediction,
+                    cancelled=cancel_event, progress_callback=progress_callback,
+                    deadline=deadline
+                )
+            elif AppConfig.ENABLE_HEDGING and len(self.generators) > 1:
+                generated_image = self._generate_hedged(
+                    processed_image, prompt, superhero, color, car,
+                    max_retries, on_prediction, progress_callback=progress_callback,
+                    cancel_event=cancel_event, deadline=deadline
                 )
-                if error:
-                    return None, gen_time, error
             else:
-                # Replicate flow
-                image_data = self._image_to_base64(processed_image)
+                try:
+                    generated_image = self._generate_with_provider(
+                        self.provider, processed_image, prompt, superhero, color, car,
+                        max_retries, on_prediction=on_prediction,
+                        cancelled=cancel_event, progress_callback=progress_callback,
+                        deadline=deadline
+                    )
+                except CircuitOpenError:
+                    # Fail over while the provider's breaker is open
+                    fallback = self._fallback_provider(self.provider)
+                    if fallback is None:
+                        raise
+                    print(f"{self.provider} circuit breaker open, failing over to {fallback}")
+                    generated_image = self._generate_with_provider(
+                        fallback, processed_image, prompt, superhero, color, car,
+                        max_retries, on_prediction=on_prediction,
+                        cancelled=cancel_event, progress_callback=progress_callback,
+                        deadline=deadline
+                    )
+            
+            # Now apply post-processing to the generated image from either provider;
+            # extra variants are finished in parallel so they cost no extra time
+            raw_variants = getattr(generated_image, 'variants', [])
+            variant_pool = None
+            variant_futures = []
+            if raw_variants:
+                variant_pool = ThreadPoolExecutor(max_workers=len(raw_variants), thread_name_prefix="avatar-variant")
+                variant_futures = [
+                    variant_pool.submit(self._finish_image, variant, superhero, color, car, deadline)
+                    for variant in raw_variants
+                ]
+            
+            try:
+                generated_image = self._finish_image(generated_image, superhero, color, car, deadline)
+                variants = self._collect_variants(variant_futures, deadline)
+            finally:
+                if variant_pool is not None:
+                    variant_pool.shutdown(wait=False)
+            
+            generation_time = time.time() - start_time
+            
+            if raw_variants:
+                # Replace the unfinished variants (overlays may return the same object)
+                setattr(generated_image, 'variants', variants)
+            
+            if cache_key is not None:
+                result_cache.put(cache_key, generated_image)
                 
-                # Run the model with retries
-                for attempt in range(max_retries):
-                    try:
-                        output = self.generator.generate(image_data, prompt)
-                        
-                        if output:
-                            # Download and process the generated image
-                            generated_image = self._download_image(output)
-                            break
-                            
-                    except Exception as e:
-                        error_str = str(e)
-                        # Check for sensitivity error
-                        if "E005" in error_str or "flagged as sensitive" in error_str:
-                            # Try with modified prompt on sensitivity errors
-                            if attempt < max_retries - 1:
-                                # Simplify prompt for retry
-                                prompt = f"Professional portrait of person as {superhero} character with {car} and {color} theme. Family-friendly superhero costume."
-                                time.sleep(2 ** attempt)
-                                continue
-                        elif attempt < max_retries - 1:
-                            time.sleep(2 ** attempt)  # Exponential backoff
-                            continue
-                        raise e
-                else:
-                    return None, 0, "Failed to generate image after multiple attempts"
+            return generated_image, generation_time, None
+            
+        except Exception as e:
+            generation_time = time.time() - start_time
+            error_str = str(e)
             
-            # Now apply post-processing to the generated image from either provider
+            # Provide user-friendly error messages
+            if isinstance(e, ProviderError):
+                error_message = error_str
+            elif isinstance(e, PredictionCancelled):
+                error_message = "Generation was cancelled."
+            elif isinstance(e, DeadlineExceeded):
+                error_message = "Generation took too long. Please try again."
+            elif isinstance(e, CircuitOpenError):
+                error_message = "The AI service is temporarily unavailable. Please try again in a minute."
+            elif "E005" in error_str or "flagged as sensitive" in error_str:
+                error_message = "The image generation was blocked by content filters. Please try again with a different photo or contact support if this persists."
+            elif "rate limit" in error_str.lower():
+                error_message = "Service is busy. Please wait a moment and try again."
+            elif "timeout" in error_str.lower():
+                error_message = "Generation took too long. Please try again."
+            else:
+                error_message = f"Generation failed: {error_str}"
+                
+            return None, generation_time, error_message
+    
+    def _finish_image(
+        self,
+        generated_image: Image.Image,
+        superhero: str,
+        color: str,
+        car: str,
+        deadline: Deadline
+    ) -> Image.Image:
+        """Add Claude commentary and logo overlays to a generated image.
+        
+        Args:
+            generated_image: Image returned by the provider
+            superhero: Selected superhero
+            color: Selected color
+            car: Selected car
+            deadline: End-to-end generation deadline; optional stages are
+                skipped when it is close
             
-            # Get Claude commentary and quality score
-            claude_score = None
-            commentary = None
+        Returns:
+            Final image with ``style_score`` and ``commentary`` attributes
+        """
+        # Get Claude commentary and quality score, within what remains
+        # of the budget after holding back time for overlays and saves
+        claude_score = None
+        commentary = None
+        commentary_deadline = deadline.reserve(AppConfig.DEADLINE_FINISH_RESERVE_SECONDS)
+        if not commentary_deadline.has_time_for(AppConfig.DEADLINE_COMMENTARY_MIN_SECONDS):
+            print("Skipping Claude commentary: generation deadline is close")
+            commentary = "Your superhero avatar is ready!"
+        else:
             try:
                 claude_score, commentary = get_claude_commentary(
-                    generated_image, superhero, color, car
+                    generated_image, superhero, color, car,
+                    timeout=commentary_deadline.timeout(AppConfig.CLAUDE_TIMEOUT_SECONDS)
                 )
                 print(f"Claude quality score: {claude_score:.2f}")
                 print(f"Commentary: {commentary}")
@@ -186,107 +550,576 @@ class ImageGenerator:
                 # Fallback when Claude is unavailable
                 claude_score = None
                 commentary = "Your superhero avatar is ready!"
+        
+        if deadline.has_time_for(AppConfig.DEADLINE_OVERLAY_MIN_SECONDS):
+            generated_image = self._add_logo_overlays(generated_image)
+        else:
+            print("Skipping logo overlays: generation deadline is close")
+        
+        # Re-attach the Claude analysis to the final image after logo overlays
+        if claude_score is not None:
+            setattr(generated_image, 'style_score', claude_score)
+        if commentary is not None:
+            setattr(generated_image, 'commentary', commentary)
+        
+        return generated_image
+    
+    def _collect_variants(self, futures: list, deadline: Deadline) -> list:
+        """Wait for finished variants, dropping any that fail or miss the deadline.
+        
+        Args:
+            futures: Futures returning finished variant images
+            deadline: End-to-end generation deadline
             
-            # Add CarMax logo overlay
+        Returns:
+            Finished variant images
+        """
+        variants = []
+        for future in futures:
             try:
-                generated_image = add_logo_to_image(
-                    generated_image,
-                    position="bottom-right",
-                    size_ratio=0.12,  # 12% of image width
-                    padding=15,
-                    opacity=0.85
-                )
-                print("Added CarMax logo overlay")
+                variants.append(future.result(timeout=deadline.timeout()))
+                metrics.increment("generation_variants_total", result="ready")
             except Exception as e:
-                print(f"Warning: Could not add logo overlay: {e}")
+                print(f"Dropping avatar variant: {e}")
+                metrics.increment("generation_variants_total", result="dropped")
+        return variants
+    
+    def _add_logo_overlays(self, generated_image: Image.Image) -> Image.Image:
+        """Brand the avatar with the CarMax, Databricks and Innovation Garage logos.
+        
+        Args:
+            generated_image: Generated avatar
             
-            # Add Databricks logo overlay
-            try:
-                databricks_logo_path = AppConfig.ASSETS_DIR / "Databricks-Logo.png"
-                generated_image = add_logo_to_image(
-                    generated_image,
-                    logo_path=databricks_logo_path,
-                    position="bottom-left",
-                    size_ratio=0.15,  # 15% of image width
-                    padding=20,
-                    opacity=0.9
+        Returns:
+            Avatar with every logo that could be added
+        """
+        # Add CarMax logo overlay
+        try:
+            generated_image = add_logo_to_image(
+                generated_image,
+                position="bottom-right",
+                size_ratio=0.12,  # 12% of image width
+                padding=15,
+                opacity=0.85
+            )
+            print("Added CarMax logo overlay")
+        except Exception as e:
+            print(f"Warning: Could not add logo overlay: {e}")
+        
+        # Add Databricks logo overlay
+        try:
+            databricks_logo_path = AppConfig.ASSETS_DIR / "Databricks-Logo.png"
+            generated_image = add_logo_to_image(
+                generated_image,
+                logo_path=databricks_logo_path,
+                position="bottom-left",
+                size_ratio=0.15,  # 15% of image width
+                padding=20,
+                opacity=0.9
+            )
+            print("Added Databricks logo overlay")
+        except Exception as e:
+            print(f"Warning: Could not add Databricks logo overlay: {e}")
+        
+        # Add Innovation Garage logo overlay
+        try:
+            innovation_garage_logo_path = AppConfig.ASSETS_DIR / "innovation_garage.png"
+            generated_image = add_logo_to_image(
+                generated_image,
+                logo_path=innovation_garage_logo_path,
+                position="top-right",
+                size_ratio=0.18,  # 18% of image width
+                padding=20,
+                opacity=0.85
+            )
+            print("Added Innovation Garage logo overlay")
+        except Exception as e:
+            print(f"Warning: Could not add Innovation Garage logo overlay: {e}")
+        
+        return generated_image
+    
+    def _generate_with_provider(
+        self,
+        provider: str,
+        processed_image: Optional[Image.Image],
+        prompt: str,
+        superhero: str,
+        color: str,
+        car: str,
+        max_retries: int,
+        prediction_id: Optional[str] = None,
+        on_prediction: Optional[Callable[[str, str], None]] = None,
+        cancelled: Optional[threading.Event] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Image.Image:
+        """Generate an image with a single provider.
+        
+        Args:
+            provider: "replicate" or "fal"
+            processed_image: Processed photo (may be None when resuming)
+            prompt: Generation prompt
+            superhero: Selected superhero
+            color: Selected color
+            car: Selected car
+            max_retries: Maximum number of retry attempts
+            prediction_id: ID of an in-flight prediction to reattach to
+            on_prediction: Callback receiving (provider, prediction_id) for new predictions
+            cancelled: Set when the caller cancelled this generation on purpose,
+                so the failure is not counted against the provider
+            progress_callback: Callback receiving (progress, message)
+            deadline: End-to-end generation deadline
+            
+        Returns:
+            Generated image
+            
+        Raises:
+            ProviderError: If the provider reported a failure
+            DeadlineExceeded: If the deadline passed first
+        """
+        generator = self._get_generator(provider)
+        # Latency and failures are tracked per model, so tiers on another model
+        # do not skew each other's routing and hedge statistics
+        model_name = self.models[provider]
+        provider_start = time.time()
+        
+        try:
+            generated_image = self._run_provider(
+                provider, generator, processed_image, prompt, superhero, color, car,
+                max_retries, prediction_id, on_prediction, cancelled, progress_callback,
+                deadline
+            )
+        except CircuitOpenError:
+            # Rejected before reaching the provider
+            raise
+        except Exception:
+            if cancelled is None or not cancelled.is_set():
+                record_failure(provider, model_name)
+            raise
+        
+        record_latency(provider, model_name, time.time() - provider_start)
+        return generated_image
+    
+    def _run_provider(
+        self,
+        provider: str,
+        generator,
+        processed_image: Optional[Image.Image],
+        prompt: str,
+        superhero: str,
+        color: str,
+        car: str,
+        max_retries: int,
+        prediction_id: Optional[str],
+        on_prediction: Optional[Callable[[str, str], None]],
+        cancelled: Optional[threading.Event] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Image.Image:
+        """Run a provider's generation flow, including its retries.
+        
+        Attempts go through the provider's shared retry policy. The prediction
+        and its retries must finish early enough to leave the finish reserve
+        of ``deadline`` for download, overlays and saves. Inputs and model
+        follow this generator's tier.
+        """
+        if deadline is None:
+            deadline = Deadline(AppConfig.GENERATION_TIMEOUT_SECONDS)
+        provider_deadline = deadline.reserve(AppConfig.DEADLINE_FINISH_RESERVE_SECONDS)
+
+        def record_prediction(new_prediction_id: str) -> None:
+            if on_prediction:
+                on_prediction(provider, new_prediction_id)
+        
+        breaker = get_circuit_breaker(provider)
+        params = AppConfig.get_tier_params(self.tier, provider)
+        
+        # The photo is uploaded once and reused by every Replicate attempt
+        image_data = None
+        
+        def attempt(number: int) -> Image.Image:
+            nonlocal image_data
+            # Out of time before claiming a half-open probe, which would
+            # otherwise never be released
+            provider_deadline.check("provider")
+            # Fail fast instead of retrying against a provider that is down
+            breaker.check()
+            # Only the first attempt reattaches; retries start fresh predictions
+            resume_id = prediction_id if number == 0 else None
+            
+            if provider == "fal":
+                return self._attempt_fal(
+                    generator, breaker, processed_image, prompt, resume_id,
+                    record_prediction, cancelled, progress_callback, deadline, params
                 )
-                print("Added Databricks logo overlay")
-            except Exception as e:
-                print(f"Warning: Could not add Databricks logo overlay: {e}")
             
-            # Add Innovation Garage logo overlay
+            call_start = time.time()
             try:
-                innovation_garage_logo_path = AppConfig.ASSETS_DIR / "innovation_garage.png"
-                generated_image = add_logo_to_image(
-                    generated_image,
-                    logo_path=innovation_garage_logo_path,
-                    position="top-right",
-                    size_ratio=0.18,  # 18% of image width
-                    padding=20,
-                    opacity=0.85
+                if resume_id is None and image_data is None:
+                    if processed_image is None:
+                        raise ValueError("Original photo is no longer available. Please retake your photo.")
+                    image_data = self._image_input(provider, generator, processed_image)
+                
+                outputs = generator.generate_outputs(
+                    image_data, prompt,
+                    seed=self.seed,
+                    prediction_id=resume_id,
+                    on_prediction=record_prediction,
+                    progress_callback=progress_callback,
+                    cancel_event=cancelled,
+                    deadline=provider_deadline,
+                    params=params,
+                    num_outputs=self.variants
                 )
-                print("Added Innovation Garage logo overlay")
+                
+                # Read and decode the generated image, then any extra variants
+                generated_image = self._load_output(outputs[0], deadline) if outputs else None
+                if generated_image is not None and len(outputs) > 1:
+                    setattr(generated_image, 'variants', self._load_variants(outputs[1:], deadline))
+            except PredictionCancelled:
+                # Cancelled on purpose - never start a replacement
+                breaker.release_probe()
+                raise
+            except DeadlineExceeded as e:
+                if e.stage == "provider":
+                    # The prediction used up the provider budget - a hanging
+                    # provider has to trip the breaker
+                    breaker.record_failure()
+                else:
+                    # Out of budget after the prediction - only a slow call
+                    # says anything about provider health
+                    self._record_breaker_timeout(breaker, call_start)
+                raise
             except Exception as e:
-                print(f"Warning: Could not add Innovation Garage logo overlay: {e}")
+                if classify_error(e) == SAFETY:
+                    # Content problem, not a provider health problem
+                    breaker.release_probe()
+                else:
+                    breaker.record_failure()
+                raise
             
-            generation_time = time.time() - start_time
+            self._record_breaker_outcome(breaker, call_start, failed=generated_image is None)
+            if generated_image is None:
+                raise ProviderError("The AI service returned no image. Please try again.")
+            return generated_image
+        
+        def before_retry(error: BaseException, error_class: str) -> None:
+            nonlocal prompt
+            if error_class == SAFETY:
+                # Remember the selections so later requests skip straight to the fallback
+                if AppConfig.ENABLE_SENSITIVITY_CACHE and prompt == AppConfig.get_prompt(superhero, color, car):
+                    sensitivity_cache.record_flag(superhero, car, color)
+                # Simplify prompt for retry
+                prompt = AppConfig.get_fallback_prompt(superhero, color, car)
+        
+        return get_retry_policy(provider).call(
+            attempt,
+            max_attempts=max_retries,
+            deadline=provider_deadline,
+            on_retry=before_retry,
+            non_retryable=(PredictionCancelled,)
+        )
+    
+    def _attempt_fal(
+        self,
+        generator,
+        breaker: CircuitBreaker,
+        processed_image: Optional[Image.Image],
+        prompt: str,
+        request_id: Optional[str],
+        on_request: Callable[[str], None],
+        cancelled: Optional[threading.Event],
+        progress_callback: Optional[Callable[[int, str], None]],
+        deadline: Deadline,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Image.Image:
+        """Run one Fal attempt, turning its error message into an exception.
+        
+        Returns:
+            Generated image
             
-            # Re-attach the Claude analysis to the final image after logo overlays
-            if claude_score is not None:
-                setattr(generated_image, 'style_score', claude_score)
-            if commentary is not None:
-                setattr(generated_image, 'commentary', commentary)
-                
-            return generated_image, generation_time, None
+        Raises:
+            PredictionCancelled: If the caller cancelled the request
+            ProviderError: If Fal reported a failure
+        """
+        call_start = time.time()
+        generated_image, _, error = generator.generate_avatar(
+            processed_image, prompt, seed=self.seed,
+            request_id=request_id,
+            on_request=on_request,
+            progress_callback=progress_callback,
+            cancel_event=cancelled,
+            deadline=deadline,
+            params=params,
+            num_images=self.variants
+        )
+        if error and cancelled is not None and cancelled.is_set():
+            # Cancelled on purpose - says nothing about provider health
+            breaker.release_probe()
+            raise PredictionCancelled(error)
+        if error and classify_error(ProviderError(error)) == SAFETY:
+            # Content problem, not a provider health problem
+            breaker.release_probe()
+        else:
+            self._record_breaker_outcome(breaker, call_start, failed=bool(error))
+        if error:
+            raise ProviderError(error)
+        return generated_image
+    
+    def _record_breaker_timeout(self, breaker: CircuitBreaker, call_start: float) -> None:
+        """Report a call cut off by the deadline; only a slow call counts as a failure."""
+        if time.time() - call_start > AppConfig.CIRCUIT_SLOW_CALL_SECONDS:
+            breaker.record_failure()
+        else:
+            breaker.release_probe()
+    
+    def _record_breaker_outcome(self, breaker: CircuitBreaker, call_start: float, failed: bool) -> None:
+        """Report a provider call to its circuit breaker; slow calls count as failures."""
+        if failed or time.time() - call_start > AppConfig.CIRCUIT_SLOW_CALL_SECONDS:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    
+    def _fallback_provider(self, provider: str) -> Optional[str]:
+        """Get another provider whose circuit breaker is accepting requests."""
+        for candidate in self.generators:
+            if candidate != provider and get_circuit_breaker(candidate).is_available():
+                return candidate
+        return None
+    
+    def _generate_hedged(
+        self,
+        processed_image: Image.Image,
+        prompt: str,
+        superhero: str,
+        color: str,
+        car: str,
+        max_retries: int,
+        on_prediction: Optional[Callable[[str, str], None]] = None,
+        progress_callback: Optional[Callable[[int, str], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Image.Image:
+        """Race the primary provider against a delayed hedge request.
+        
+        The primary provider starts immediately. If it has not produced an
+        image within the hedge delay, or fails before then, the same request
+        is also sent to the other provider. The first successful image wins and the other
+        provider's prediction is cancelled. Only the winner's prediction is
+        reported to ``on_prediction``, so a reconnecting session never
+        reattaches to the cancelled loser.
+        
+        Args:
+            processed_image: Processed photo
+            prompt: Generation prompt
+            superhero: Selected superhero
+            color: Selected color
+            car: Selected car
+            max_retries: Maximum number of retry attempts per provider
+            on_prediction: Callback receiving (provider, prediction_id) of the winning prediction
+            progress_callback: Callback receiving (progress, message) from either provider
+            cancel_event: Set to cancel both providers' predictions
+            deadline: End-to-end generation deadline shared by both providers
             
-        except Exception as e:
-            generation_time = time.time() - start_time
-            error_str = str(e)
+        Returns:
+            Generated image from the winning provider
+        """
+        primary = self.provider
+        secondary = next(provider for provider in self.generators if provider != primary)
+        predictions = {}
+        cancelled = threading.Event()
+        
+        def run(provider: str) -> Image.Image:
+            def record_prediction(provider_name: str, new_prediction_id: str) -> None:
+                predictions[provider_name] = new_prediction_id
             
-            # Provide user-friendly error messages
-            if "E005" in error_str or "flagged as sensitive" in error_str:
-                error_message = "The image generation was blocked by content filters. Please try again with a different photo or contact support if this persists."
-            elif "rate limit" in error_str.lower():
-                error_message = "Service is busy. Please wait a moment and try again."
-            elif "timeout" in error_str.lower():
-                error_message = "Generation took too long. Please try again."
-            else:
-                error_message = f"Generation failed: {error_str}"
-                
-            return None, generation_time, error_message
+            return self._generate_with_provider(
+                provider, processed_image, prompt, superhero, color, car,
+                max_retries, on_prediction=record_prediction, cancelled=cancelled,
+                progress_callback=progress_callback, deadline=deadline
+            )
+        
+        def record_winner(provider: str) -> None:
+            # Stored only once the race is decided; a racer's ID stored as it
+            # started could be the loser that is about to be cancelled
+            if on_prediction and provider in predictions:
+                on_prediction(provider, predictions[provider])
+        
+        # Hedge after the configured percentile of recent primary latencies
+        hedge_delay = latency_percentile(
+            primary, self.models[primary], AppConfig.HEDGE_PERCENTILE
+        )
+        if hedge_delay is None:
+            hedge_delay = AppConfig.HEDGE_DEFAULT_DELAY_SECONDS
+        
+        start_time = time.time()
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="avatar-hedge")
+        futures = {pool.submit(run, primary): primary}
+        pending = set(futures)
+        errors = []
+        
+        try:
+            # Give the primary its head start
+            done, pending = self._wait_unless_cancelled(pending, cancel_event, timeout=hedge_delay)
+            for future in done:
+                try:
+                    image = future.result()
+                    record_winner(futures[future])
+                    return image
+                except Exception as e:
+                    print(f"{futures[future]} failed before hedge: {e}")
+                    errors.append(e)
+            
+            print(f"Hedging to {secondary} after {time.time() - start_time:.1f}s")
+            hedge = pool.submit(run, secondary)
+            futures[hedge] = secondary
+            pending.add(hedge)
+            
+            # First successful image wins
+            while pending:
+                done, pending = self._wait_unless_cancelled(pending, cancel_event)
+                for future in done:
+                    try:
+                        image = future.result()
+                        print(f"Hedged generation won by {futures[future]}")
+                        record_winner(futures[future])
+                        return image
+                    except Exception as e:
+                        print(f"{futures[future]} failed: {e}")
+                        errors.append(e)
+            
+            raise errors[-1]
+        finally:
+            # Cancel the loser so it stops using provider capacity
+            cancelled.set()
+            for future in pending:
+                provider = futures[future]
+                if provider in predictions:
+                    try:
+                        # Cancel against the tier's model, which the prediction was submitted to
+                        self._get_generator(provider).cancel(predictions[provider], self.models[provider])
+                        print(f"Cancelled {provider} prediction {predictions[provider]}")
+                    except Exception as e:
+                        print(f"Could not cancel {provider} prediction: {e}")
+            pool.shutdown(wait=False)
+    
+    def _wait_unless_cancelled(
+        self,
+        futures: set,
+        cancel_event: Optional[threading.Event],
+        timeout: Optional[float] = None
+    ) -> Tuple[set, set]:
+        """Wait for the first future to finish, checking for cancellation.
+        
+        Args:
+            futures: Futures to wait on
+            cancel_event: Set when the caller cancelled the generation
+            timeout: Maximum seconds to wait (None waits indefinitely)
+            
+        Returns:
+            Tuple of (done, pending) futures
+            
+        Raises:
+            PredictionCancelled: If cancel_event was set
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise PredictionCancelled("Hedged generation was cancelled")
+            
+            step = AppConfig.PROVIDER_POLL_INTERVAL_SECONDS
+            if deadline is not None:
+                step = max(min(step, deadline - time.time()), 0)
+            done, pending = wait(futures, timeout=step, return_when=FIRST_COMPLETED)
+            if done or (deadline is not None and time.time() >= deadline):
+                return done, pending
     
-    def _image_to_base64(self, image: Image.Image) -> str:
+    def _image_input(self, provider: str, generator, image: Image.Image) -> str:
+        """Reference the photo by its uploaded URL, falling back to a data URI.
+        
+        Args:
+            provider: Provider the photo is sent to
+            generator: Provider generator with an ``upload_image`` method
+            image: Processed photo
+            
+        Returns:
+            Uploaded URL, or base64 data URI if uploads are off or failed
+        """
+        profile = getattr(generator, "input_encoding", "png")
+        if AppConfig.ENABLE_INPUT_UPLOADS:
+            try:
+                return upload_cache.get_or_upload(f"{provider}:{profile}", image, generator.upload_image)
+            except Exception as e:
+                print(f"Input upload to {provider} failed, sending inline: {e}")
+        return self._image_to_base64(image, profile)
+    
+    def _image_to_base64(self, image: Image.Image, profile: str = "png") -> str:
         """Convert PIL Image to base64 string.
         
         Args:
             image: PIL Image
+            profile: Encoding profile name
             
         Returns:
             Base64 encoded string with data URI prefix
         """
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_data = buffered.getvalue()
-        base64_encoded = base64.b64encode(img_data).decode('utf-8')
-        return f"data:image/png;base64,{base64_encoded}"
+        return encode_data_uri(image, profile)
     
-    def _download_image(self, url: str) -> Image.Image:
-        """Download image from URL.
+    def _load_output(
+        self,
+        output: Union[FileOutput, str],
+        deadline: Optional[Deadline] = None
+    ) -> Image.Image:
+        """Decode a Replicate output into an image.
+        
+        File outputs are streamed straight into the decoder; legacy string
+        outputs are downloaded by URL. Both enforce the output size limits.
         
         Args:
-            url: Image URL
+            output: File output or image URL
+            deadline: Generation deadline, checked while the image downloads
             
         Returns:
             PIL Image object
         """
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        if isinstance(output, FileOutput):
+            return decode_image_stream(output, provider="replicate", deadline=deadline)
         
-        image_data = io.BytesIO(response.content)
-        image = Image.open(image_data)
+        return self._download_image(output, deadline)
+    
+    def _load_variants(
+        self,
+        outputs: List[Union[FileOutput, str]],
+        deadline: Optional[Deadline] = None
+    ) -> List[Image.Image]:
+        """Decode extra Replicate outputs, skipping any that fail.
+        
+        Args:
+            outputs: File outputs or image URLs after the first
+            deadline: Generation deadline, checked while the images download
+            
+        Returns:
+            Decoded variant images
+        """
+        variants = []
+        for output in outputs:
+            try:
+                variants.append(self._load_output(output, deadline))
+            except Exception as e:
+                print(f"Could not load Replicate variant image: {e}")
+        return variants
+    
+    def _download_image(self, url: str, deadline: Optional[Deadline] = None) -> Image.Image:
+        """Download image from URL.
         
-        return image
+        Args:
+            url: Image URL
+            deadline: Generation deadline bounding the download
+            
+        Returns:
+            PIL Image object
+        """
+        return download_image(url, "replicate", deadline=deadline)
 
 
 def create_test_generator() -> ImageGenerator:
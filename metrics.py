@@ -0,0 +1,107 @@
+"""In-process metrics registry for Superhero Avatar Generator.
+
+Counters, gauges and observation summaries keyed by name and labels. The
+registry is process-wide so background workers and the UI share it.
+"""
+
+import threading
+from typing import Any, Dict, Tuple
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> str:
+    """Build a Prometheus-style key such as ``name{provider=fal}``."""
+    if not labels:
+        return name
+    label_str = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters, gauges and observations."""
+    
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._observations: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+    
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter.
+        
+        Args:
+            name: Metric name
+            value: Amount to add
+            **labels: Metric labels
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Set a gauge to its current value.
+        
+        Args:
+            name: Metric name
+            value: Current value
+            **labels: Metric labels
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+    
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record an observation such as a latency or a size.
+        
+        Args:
+            name: Metric name
+            value: Observed value
+            **labels: Metric labels
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            summary = self._observations.setdefault(
+                key, {"count": 0, "sum": 0.0, "max": value}
+            )
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+    
+    def get_counter(self, name: str, **labels) -> float:
+        """Get a counter's current value (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+    
+    def get_gauge(self, name: str, **labels) -> Tuple[bool, float]:
+        """Get a gauge's current value.
+        
+        Returns:
+            Tuple of (is_set, value)
+        """
+        key = _metric_key(name, labels)
+        with self._lock:
+            return key in self._gauges, self._gauges.get(key, 0)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get a copy of every metric.
+        
+        Returns:
+            Dictionary with counters, gauges and observations
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "observations": {key: dict(value) for key, value in self._observations.items()}
+            }
+    
+    def reset(self) -> None:
+        """Clear every metric."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._observations.clear()
+
+
+# Create global metrics registry instance
+metrics = MetricsRegistry()
@@ -0,0 +1,152 @@
+"""Replicate model version resolution cache for Superhero Avatar Generator.
+
+A bare model name ("owner/name") runs whatever version is latest at the
+time of the call, so a model update can silently change latency in the
+middle of an event. The latest version is resolved once per process and
+pinned; it is only re-resolved when a refresh is requested or the optional
+TTL expires.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import AppConfig
+from metrics import metrics
+
+
+class ModelVersionCache:
+    """Pinned Replicate version IDs keyed by model name."""
+
+    def __init__(self, ttl_seconds: float = 0, retry_seconds: float = 300):
+        """Initialize the cache.
+
+        Args:
+            ttl_seconds: Seconds before a pinned version is re-resolved
+                (0 pins it for the process lifetime)
+            retry_seconds: Seconds before a failed resolution is retried
+        """
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        # model name -> (version ID or None if unresolvable, resolved at)
+        self._versions: Dict[str, Tuple[Optional[str], float]] = {}
+        # model name -> set once its in-flight lookup is stored
+        self._resolving: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(self, client, model_name: str) -> Optional[str]:
+        """Get the pinned version for a model, resolving it on first use.
+
+        Args:
+            client: replicate.Client used to look the model up
+            model_name: "owner/name", or "owner/name:version" (already pinned)
+
+        Returns:
+            Version ID, or None to run the model by name
+        """
+        if ":" in model_name:
+            return model_name.split(":", 1)[1]
+
+        while True:
+            with self._lock:
+                entry = self._versions.get(model_name)
+                if entry is not None and not self._expired(*entry):
+                    return entry[0]
+                resolving = self._resolving.get(model_name)
+                if resolving is None:
+                    resolving = self._resolving[model_name] = threading.Event()
+                    break
+            # Concurrent generations share one lookup per model
+            resolving.wait()
+
+        # Resolve outside the lock so other models are never held up by it
+        version_id = None
+        try:
+            version_id = self._resolve(client, model_name)
+        finally:
+            with self._lock:
+                entry = self._versions.get(model_name)
+                previous = entry[0] if entry else None
+                if version_id is None and previous is not None:
+                    # Keep the pinned version when a refresh lookup fails
+                    version_id = previous
+                self._versions[model_name] = (version_id, time.time())
+                del self._resolving[model_name]
+            resolving.set()
+
+        if version_id and previous and version_id != previous:
+            print(f"Replicate model {model_name} version changed: {previous} -> {version_id}")
+        return version_id
+
+    def refresh(self, model_name: Optional[str] = None) -> None:
+        """Re-resolve versions on next use.
+
+        Args:
+            model_name: Model to refresh (None refreshes every model)
+        """
+        with self._lock:
+            if model_name is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(model_name, None)
+
+    def mark_unversioned(self, model_name: str) -> None:
+        """Run a model by name, e.g. when it does not accept version-pinned predictions.
+
+        Args:
+            model_name: Model to stop pinning
+        """
+        with self._lock:
+            self._versions[model_name] = (None, time.time())
+
+    def _expired(self, version_id: Optional[str], resolved_at: float) -> bool:
+        """Whether an entry should be resolved again. Caller holds the lock."""
+        age = time.time() - resolved_at
+        if version_id is None:
+            return age > self.retry_seconds
+        return self.ttl_seconds > 0 and age > self.ttl_seconds
+
+    @staticmethod
+    def _resolve(client, model_name: str) -> Optional[str]:
+        """Look up a model's latest version."""
+        try:
+            latest_version = client.models.get(model_name).latest_version
+            version_id = getattr(latest_version, "id", None)
+        except Exception as e:
+            print(f"Could not resolve Replicate model version for {model_name}: {e}")
+            metrics.increment("replicate_version_resolutions_total", result="error")
+            return None
+
+        if not isinstance(version_id, str):
+            metrics.increment("replicate_version_resolutions_total", result="unversioned")
+            return None
+
+        print(f"Pinned Replicate model {model_name} to version {version_id}")
+        metrics.increment("replicate_version_resolutions_total", result="resolved")
+        return version_id
+
+
+# Create global model version cache instance
+model_versions = ModelVersionCache(ttl_seconds=AppConfig.REPLICATE_VERSION_TTL_SECONDS)
+
+
+_warm_started = threading.Event()
+
+
+def warm_model_versions() -> None:
+    """Resolve the configured Replicate model's version in the background.
+
+    Called at startup so the first generation does not pay for the lookup;
+    only the first call per process does anything.
+    """
+    if not AppConfig.REPLICATE_API_TOKEN or ":" in AppConfig.REPLICATE_MODEL:
+        return
+    if _warm_started.is_set():
+        return
+    _warm_started.set()
+
+    def resolve() -> None:
+        from http_transport import get_replicate_client
+        model_versions.get(get_replicate_client(AppConfig.REPLICATE_API_TOKEN), AppConfig.REPLICATE_MODEL)
+
+    threading.Thread(target=resolve, name="replicate-version", daemon=True).start()
@@ -0,0 +1,79 @@
+"""Latency-aware provider routing for Superhero Avatar Generator.
+
+Sends each generation to the provider with the best expected completion
+time based on rolling latency and error-rate statistics, with a small
+share of exploration traffic so a provider that has recovered is noticed.
+"""
+
+import random
+from typing import Dict, Optional
+
+from config import AppConfig
+from provider_stats import get_provider_stats
+
+
+class ProviderRouter:
+    """Chooses a provider for each new generation."""
+    
+    def __init__(
+        self,
+        default_provider: str,
+        exploration_rate: float,
+        min_samples: int,
+        rng: Optional[random.Random] = None
+    ):
+        """Initialize the router.
+        
+        Args:
+            default_provider: Provider to use until statistics are available
+            exploration_rate: Share of requests sent to a random provider
+            min_samples: Outcomes needed before a provider's statistics are trusted
+            rng: Random number generator (for tests)
+        """
+        self.default_provider = default_provider
+        self.exploration_rate = exploration_rate
+        self.min_samples = min_samples
+        self._rng = rng or random.Random()
+    
+    def choose(self, candidates: Dict[str, str]) -> str:
+        """Choose a provider.
+        
+        Args:
+            candidates: Mapping of available provider name to model name
+            
+        Returns:
+            Chosen provider name
+        """
+        providers = list(candidates)
+        if len(providers) == 1:
+            return providers[0]
+        
+        # Exploration traffic keeps statistics fresh for every provider
+        if self._rng.random() < self.exploration_rate:
+            return self._rng.choice(providers)
+        
+        best_provider, best_time = None, None
+        for provider, model in candidates.items():
+            stats = get_provider_stats(provider, model)
+            if stats.samples < self.min_samples:
+                continue
+            expected = stats.expected_completion_time()
+            if expected is None:
+                # Warm but nothing succeeded recently
+                continue
+            if best_time is None or expected < best_time:
+                best_provider, best_time = provider, expected
+        
+        if best_provider is not None:
+            return best_provider
+        if self.default_provider in candidates:
+            return self.default_provider
+        return providers[0]
+
+
+# Create global provider router instance
+provider_router = ProviderRouter(
+    default_provider=AppConfig.ROUTER_DEFAULT_PROVIDER,
+    exploration_rate=AppConfig.ROUTER_EXPLORATION_RATE,
+    min_samples=AppConfig.LATENCY_MIN_SAMPLES
+)
@@ -0,0 +1,158 @@
+"""Rolling provider latency and error statistics for Superhero Avatar Generator."""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from config import AppConfig
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies."""
+    
+    def __init__(self, size: int = 100):
+        """Initialize the window.
+        
+        Args:
+            size: Number of most recent samples to keep
+        """
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+    
+    def record(self, seconds: float) -> None:
+        """Record a completed request's latency.
+        
+        Args:
+            seconds: Latency in seconds
+        """
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        """Get a latency percentile.
+        
+        Args:
+            pct: Percentile between 0 and 100
+            
+        Returns:
+            Latency in seconds, or None if there are no samples
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(int(round(pct / 100 * (len(samples) - 1))), len(samples) - 1)
+        return samples[index]
+
+
+class ProviderStats:
+    """Rolling latency and error-rate statistics for one provider and model."""
+    
+    def __init__(self, size: int = 100):
+        """Initialize the statistics.
+        
+        Args:
+            size: Number of most recent requests to keep
+        """
+        self.latency = LatencyWindow(size)
+        self._outcomes: Deque[bool] = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    @property
+    def samples(self) -> int:
+        """Number of recorded outcomes (successes and failures)."""
+        with self._lock:
+            return len(self._outcomes)
+    
+    def record_success(self, seconds: float) -> None:
+        """Record a successful request and its latency."""
+        self.latency.record(seconds)
+        with self._lock:
+            self._outcomes.append(True)
+    
+    def record_failure(self) -> None:
+        """Record a failed request."""
+        with self._lock:
+            self._outcomes.append(False)
+    
+    def error_rate(self) -> float:
+        """Fraction of recent requests that failed."""
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+    
+    def expected_completion_time(self) -> Optional[float]:
+        """Expected time to get an image, including failed attempts.
+        
+        Uses the median latency scaled by the expected number of attempts
+        (1 / success rate).
+        
+        Returns:
+            Seconds, or None if no request has succeeded yet
+        """
+        median = self.latency.percentile(50)
+        if median is None:
+            return None
+        success_rate = max(1.0 - self.error_rate(), 0.05)
+        return median / success_rate
+    
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Get the current statistics as a dictionary."""
+        return {
+            "samples": self.samples,
+            "p50_seconds": self.latency.percentile(50),
+            "p90_seconds": self.latency.percentile(90),
+            "error_rate": self.error_rate(),
+            "expected_seconds": self.expected_completion_time()
+        }
+
+
+_stats: Dict[Tuple[str, str], ProviderStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_provider_stats(provider: str, model: str) -> ProviderStats:
+    """Get the shared statistics for a provider and model."""
+    key = (provider, model)
+    with _stats_lock:
+        if key not in _stats:
+            _stats[key] = ProviderStats(AppConfig.LATENCY_WINDOW_SIZE)
+        return _stats[key]
+
+
+def record_latency(provider: str, model: str, seconds: float) -> None:
+    """Record a successful generation's latency."""
+    get_provider_stats(provider, model).record_success(seconds)
+
+
+def record_failure(provider: str, model: str) -> None:
+    """Record a failed generation."""
+    get_provider_stats(provider, model).record_failure()
+
+
+def latency_percentile(provider: str, model: str, pct: float) -> Optional[float]:
+    """Get a provider's latency percentile.
+    
+    Returns:
+        Latency in seconds, or None until enough samples have been recorded
+    """
+    window = get_provider_stats(provider, model).latency
+    if len(window) < AppConfig.LATENCY_MIN_SAMPLES:
+        return None
+    return window.percentile(pct)
+
+
+def get_all_stats() -> Dict[str, Dict[str, Optional[float]]]:
+    """Get statistics for every provider and model seen so far.
+    
+    Returns:
+        Dictionary keyed by "provider/model"
+    """
+    with _stats_lock:
+        items = list(_stats.items())
+    return {f"{provider}/{model}": stats.snapshot() for (provider, model), stats in items}
@@ -2,13 +2,13 @@
 
 import os
 import uuid
-import json
-from google.cloud import storage
 from PIL import Image
 import io
-from databricks.sdk import WorkspaceClient
 from typing import Union, Optional
 
+from http_transport import get_gcs_client
+from retry_policy import get_retry_policy
+
 
 def upload_to_gcs(image_path_or_pil: Union[str, Image.Image], 
                   bucket_name: str = "innovation_garage01",
@@ -34,9 +34,8 @@ def upload_to_gcs(image_path_or_pil: Union[str, Image.Image],
         # Get Databricks credentials
         gcp_credentials_json = os.getenv("GCP_KEY")
         
-        # Parse JSON credentials and initialize GCS client
-        gcp_credentials = json.loads(gcp_credentials_json)
-        client = storage.Client.from_service_account_info(gcp_credentials)
+        # Reuse the shared GCS client for these credentials
+        client = get_gcs_client(gcp_credentials_json)
         bucket = client.bucket(bucket_name)
         
         # Generate unique filename
@@ -49,8 +48,12 @@ def upload_to_gcs(image_path_or_pil: Union[str, Image.Image],
             img_byte_arr = io.BytesIO()
             try:
                 image_path_or_pil.save(img_byte_arr, format='PNG')
-                img_byte_arr.seek(0)
-                blob.upload_from_file(img_byte_arr, content_type='image/png')
+                
+                def upload(attempt: int) -> None:
+                    img_byte_arr.seek(0)
+                    blob.upload_from_file(img_byte_arr, content_type='image/png')
+                
+                get_retry_policy("storage").call(upload)
             finally:
                 img_byte_arr.close()
         elif isinstance(image_path_or_pil, str):
@@ -59,7 +62,9 @@ def upload_to_gcs(image_path_or_pil: Union[str, Image.Image],
                 raise FileNotFoundError(f"File not found: {image_path_or_pil}")
             
             # Upload from file path
-            blob.upload_from_filename(image_path_or_pil)
+            get_retry_policy("storage").call(
+                lambda attempt: blob.upload_from_filename(image_path_or_pil)
+            )
         else:
             raise TypeError("image_path_or_pil must be either a PIL Image or file path string")
         
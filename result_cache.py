@@ -0,0 +1,347 @@
+"""Generation result cache for Superhero Avatar Generator.
+
+Staff test the booth by running the same demo photos with the same
+selections again and again. When demo mode or a fixed generation seed is
+enabled, finished avatars are cached by a digest of the processed photo's
+pixels, the normalized prompt, the seed and the tier, so a repeated run skips
+the provider call. The photo match is exact: a perceptual hash would let two
+attendees shot against the same booth backdrop share an avatar.
+
+Entries live on local disk (LRU with a TTL) and, on Databricks, in the
+volume so every replica shares them (TTL only, since listing the volume on
+every write would be slow).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from config import AppConfig
+from metrics import metrics
+from upload_cache import image_digest
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so case and whitespace differences share an entry."""
+    return " ".join(prompt.lower().split())
+
+
+def result_key(image: Image.Image, prompt: str, seed: int, tier: str, variants: int = 1) -> str:
+    """Build the content-addressed cache key for a generation.
+
+    Args:
+        image: Processed input photo (normalized by process_uploaded_image,
+            so the same uploaded file always has the same pixels)
+        prompt: Generation prompt
+        seed: Generation seed (-1 for random)
+        tier: Generation tier
+        variants: Images generated per call
+
+    Returns:
+        Hex digest identifying the generation
+    """
+    parts = [image_digest(image), normalize_prompt(prompt), str(seed), tier, str(variants)]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def _png_bytes(image: Image.Image, info: PngInfo) -> bytes:
+    """Encode an image as PNG with text metadata."""
+    style_score = getattr(image, 'style_score', None)
+    commentary = getattr(image, 'commentary', None)
+    if style_score is not None:
+        info.add_text("style_score", str(style_score))
+    if commentary is not None:
+        info.add_text("commentary", commentary)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", pnginfo=info)
+    return buffer.getvalue()
+
+
+def _encode_entry(key: str, image: Image.Image) -> Dict[str, bytes]:
+    """Encode an avatar and its variants as cache files.
+
+    Returns:
+        PNG bytes by filename, variants first so the main file is written last
+    """
+    variants = getattr(image, 'variants', [])
+    files = {f"{key}.{number}.png": _png_bytes(variant, PngInfo()) for number, variant in enumerate(variants, 1)}
+
+    info = PngInfo()
+    info.add_text("cached_at", str(time.time()))
+    info.add_text("variants", str(len(variants)))
+    files[f"{key}.png"] = _png_bytes(image, info)
+    return files
+
+
+def _decode_png(data: bytes) -> Image.Image:
+    """Decode a cached PNG and re-attach its Claude analysis."""
+    image = Image.open(BytesIO(data))
+    image.load()
+    if "style_score" in image.text:
+        setattr(image, 'style_score', float(image.text["style_score"]))
+    if "commentary" in image.text:
+        setattr(image, 'commentary', image.text["commentary"])
+    return image
+
+
+def _read_entry(key: str, read: Callable[[str], bytes]) -> Tuple[Image.Image, Dict[str, bytes]]:
+    """Read an avatar and its variants.
+
+    Args:
+        key: Cache key
+        read: Function returning a cache file's bytes by filename
+
+    Returns:
+        Tuple of (avatar with ``variants`` attached, file bytes by filename)
+    """
+    files = {f"{key}.png": read(f"{key}.png")}
+    image = _decode_png(files[f"{key}.png"])
+    variants = []
+    for number in range(1, int(image.text.get("variants", 0)) + 1):
+        filename = f"{key}.{number}.png"
+        files[filename] = read(filename)
+        variants.append(_decode_png(files[filename]))
+    if variants:
+        setattr(image, 'variants', variants)
+    return image, files
+
+
+class ResultCache:
+    """Finished avatars keyed by photo, prompt, seed and tier."""
+
+    def __init__(
+        self,
+        directory: Path,
+        volume_directory: Optional[str] = None,
+        max_entries: int = 200,
+        ttl_seconds: float = 24 * 3600
+    ):
+        """Initialize the cache.
+
+        Args:
+            directory: Local directory for cached avatars
+            volume_directory: Databricks volume directory shared by replicas
+                (None keeps the cache local)
+            max_entries: Local entries kept before evicting the least recently used
+            ttl_seconds: How long a cached avatar is served
+        """
+        self.directory = Path(directory)
+        self.volume_directory = volume_directory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> last used (epoch seconds), least recently used first
+        self._index: "OrderedDict[str, float]" = OrderedDict()
+        self._loaded = False
+        self._lookups = 0
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        """Get a cached avatar.
+
+        Args:
+            key: Cache key from result_key()
+
+        Returns:
+            Avatar with its ``style_score``, ``commentary`` and ``variants``,
+            or None if missing or expired
+        """
+        image, source = self._get_local(key), "local"
+        if image is None and self.volume_directory:
+            image, source = self._get_volume(key), "volume"
+        hit = image is not None
+
+        with self._lock:
+            self._lookups += 1
+            self._hits += int(hit)
+            hit_rate = self._hits / self._lookups
+
+        if hit:
+            metrics.increment("result_cache_lookups_total", result="hit", source=source)
+        else:
+            metrics.increment("result_cache_lookups_total", result="miss")
+        metrics.set_gauge("result_cache_hit_rate", hit_rate)
+        return image
+
+    def put(self, key: str, image: Image.Image) -> None:
+        """Cache a finished avatar and its variants.
+
+        The volume copy is written in the background so the caller does not
+        wait for the upload.
+
+        Args:
+            key: Cache key from result_key()
+            image: Finished avatar
+        """
+        try:
+            files = _encode_entry(key, image)
+        except Exception as e:
+            print(f"Could not cache avatar: {e}")
+            return
+
+        self._put_local(key, files)
+        if self.volume_directory:
+            threading.Thread(
+                target=self._put_volume, args=(key, files),
+                name="result-cache-volume", daemon=True
+            ).start()
+
+    def hit_rate(self) -> Optional[float]:
+        """Share of lookups served from the cache, or None before any lookup."""
+        with self._lock:
+            return self._hits / self._lookups if self._lookups else None
+
+    def clear(self) -> None:
+        """Delete local entries and forget statistics."""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._delete_local(key)
+            self._index.clear()
+            self._lookups = 0
+            self._hits = 0
+        metrics.set_gauge("result_cache_entries", 0)
+
+    def _expired(self, image: Image.Image) -> bool:
+        """Whether a cached avatar is older than the TTL."""
+        return time.time() - float(image.text.get("cached_at", 0)) > self.ttl_seconds
+
+    def _get_local(self, key: str) -> Optional[Image.Image]:
+        """Read an entry from local disk, refreshing its LRU position."""
+        with self._lock:
+            self._load_index()
+            try:
+                image, _ = _read_entry(key, lambda filename: (self.directory / filename).read_bytes())
+            except FileNotFoundError:
+                self._index.pop(key, None)
+                return None
+            except Exception as e:
+                print(f"Result cache read error: {e}")
+                return None
+
+            if self._expired(image):
+                self._delete_local(key)
+                self._index.pop(key, None)
+                metrics.increment("result_cache_evictions_total", reason="expired")
+                return None
+
+            # Touch the file so the LRU order survives a restart
+            now = time.time()
+            os.utime(self.directory / f"{key}.png", (now, now))
+            self._index[key] = now
+            self._index.move_to_end(key)
+            return image
+
+    def _put_local(self, key: str, files: Dict[str, bytes]) -> None:
+        """Write an entry to local disk and evict the least recently used."""
+        with self._lock:
+            self._load_index()
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                for filename, data in files.items():
+                    # Write then rename so other processes never read a partial file
+                    path = self.directory / filename
+                    temp_path = path.with_name(f"{filename}.tmp")
+                    temp_path.write_bytes(data)
+                    os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Result cache write error: {e}")
+                return
+
+            self._index[key] = time.time()
+            self._index.move_to_end(key)
+            while len(self._index) > self.max_entries:
+                evicted, _ = self._index.popitem(last=False)
+                self._delete_local(evicted)
+                metrics.increment("result_cache_evictions_total", reason="lru")
+            size = len(self._index)
+        metrics.set_gauge("result_cache_entries", size)
+
+    def _delete_local(self, key: str) -> None:
+        """Delete an entry's files. Caller holds the lock."""
+        for path in self.directory.glob(f"{key}*.png"):
+            path.unlink(missing_ok=True)
+
+    def _load_index(self) -> None:
+        """Index local entries by last use once per process. Caller holds the lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.directory.exists():
+            return
+
+        entries = [
+            (path.stat().st_mtime, path.stem) for path in self.directory.glob("*.png")
+            if "." not in path.stem
+        ]
+        for last_used, key in sorted(entries):
+            self._index[key] = last_used
+
+    def _volume_client(self):
+        """Get the Databricks client, or None without credentials."""
+        host = os.getenv("DATABRICKS_HOST")
+        token = os.getenv("DATABRICKS_TOKEN")
+        if not host or not token:
+            return None
+        from http_transport import get_workspace_client
+        return get_workspace_client(host, token)
+
+    def _get_volume(self, key: str) -> Optional[Image.Image]:
+        """Read an entry from the volume and keep a local copy."""
+        try:
+            client = self._volume_client()
+            if client is None:
+                return None
+            image, files = _read_entry(
+                key,
+                lambda filename: client.files.download(f"{self.volume_directory}/{filename}").contents.read()
+            )
+        except Exception as e:
+            # A missing entry is the normal miss
+            if type(e).__name__ != "NotFound":
+                print(f"Result cache volume read error: {e}")
+            return None
+
+        if self._expired(image):
+            metrics.increment("result_cache_evictions_total", reason="expired")
+            for filename in files:
+                try:
+                    client.files.delete(f"{self.volume_directory}/{filename}")
+                except Exception as e:
+                    print(f"Result cache volume delete error: {e}")
+            return None
+
+        self._put_local(key, files)
+        return image
+
+    def _put_volume(self, key: str, files: Dict[str, bytes]) -> None:
+        """Upload an entry to the volume, variants before the main file."""
+        try:
+            client = self._volume_client()
+            if client is None:
+                return
+            from retry_policy import get_retry_policy
+            for filename, data in files.items():
+                path = f"{self.volume_directory}/{filename}"
+                get_retry_policy("storage").call(
+                    lambda attempt: client.files.upload(path, BytesIO(data), overwrite=True)
+                )
+        except Exception as e:
+            print(f"Result cache volume write error: {e}")
+
+
+# Create global result cache instance
+result_cache = ResultCache(
+    AppConfig.RESULT_CACHE_DIR,
+    volume_directory=f"{AppConfig.DATABRICKS_VOLUME}/result_cache" if AppConfig.USE_DATABRICKS_VOLUME else None,
+    max_entries=AppConfig.RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=AppConfig.RESULT_CACHE_TTL_HOURS * 3600
+)
@@ -0,0 +1,286 @@
+"""Shared retry policies for Superhero Avatar Generator.
+
+Replicate, Fal, Claude and storage calls retry through the same engine:
+
+- errors are classified (rate limit, timeout, safety, transient, fatal) and
+  only retryable classes are retried;
+- delays use decorrelated jitter so concurrent sessions do not retry in
+  lockstep against a struggling provider;
+- each policy draws retries from a process-wide budget that is refilled by
+  first attempts, so a provider incident cannot turn into a retry storm;
+- every failure and retry is counted per policy and error class.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+import requests
+
+from circuit_breaker import CircuitOpenError
+from config import AppConfig
+from deadline import Deadline, DeadlineExceeded
+from metrics import metrics
+
+# Error classes
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+SAFETY = "safety"
+TRANSIENT = "transient"
+FATAL = "fatal"
+UNKNOWN = "unknown"
+
+RETRYABLE_CLASSES = (RATE_LIMIT, TIMEOUT, SAFETY, TRANSIENT, UNKNOWN)
+
+_SAFETY_MARKERS = ("e005", "flagged as sensitive", "content filter", "nsfw", "safety")
+_RATE_LIMIT_MARKERS = ("rate limit", "too many requests", "service is busy", "request_limit_exceeded")
+_TIMEOUT_MARKERS = ("timeout", "timed out", "took too long", "deadline_exceeded")
+_TRANSIENT_MARKERS = ("temporarily_unavailable", "internal_error", "connection reset", "bad gateway")
+_FATAL_MARKERS = (
+    "permission_denied", "resource_does_not_exist", "invalid access token",
+    "unauthenticated", "unauthorized", "forbidden"
+)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """Get the HTTP status carried by an SDK or HTTP client error, if any."""
+    for attr in ("status", "status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: BaseException) -> str:
+    """Classify an error for retrying.
+
+    Args:
+        error: Exception raised by a provider, Claude or storage call
+
+    Returns:
+        One of RATE_LIMIT, TIMEOUT, SAFETY, TRANSIENT, FATAL or UNKNOWN
+    """
+    # Out of budget or failing fast - retrying cannot help
+    if isinstance(error, (DeadlineExceeded, CircuitOpenError)):
+        return FATAL
+
+    text = f"{error} {getattr(error, 'error_code', '') or ''}".lower()
+    status = _status_code(error)
+
+    if any(marker in text for marker in _SAFETY_MARKERS):
+        return SAFETY
+    if status == 429 or any(marker in text for marker in _RATE_LIMIT_MARKERS):
+        return RATE_LIMIT
+    if (
+        status in (408, 504)
+        or isinstance(error, (requests.Timeout, httpx.TimeoutException, TimeoutError))
+        or any(marker in text for marker in _TIMEOUT_MARKERS)
+    ):
+        return TIMEOUT
+    if (
+        (status is not None and status >= 500)
+        or isinstance(error, (requests.ConnectionError, httpx.TransportError, ConnectionError))
+        or any(marker in text for marker in _TRANSIENT_MARKERS)
+    ):
+        return TRANSIENT
+    if (
+        (status is not None and 400 <= status < 500)
+        or isinstance(error, (ValueError, TypeError, FileNotFoundError, PermissionError))
+        or any(marker in text for marker in _FATAL_MARKERS)
+    ):
+        return FATAL
+    return UNKNOWN
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a share of first attempts.
+
+    Every first attempt deposits ``ratio`` tokens and every retry spends one.
+    The bucket also refills slowly on its own so a quiet process can still
+    retry occasionally.
+    """
+
+    def __init__(
+        self,
+        ratio: float,
+        min_per_second: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize a full budget.
+
+        Args:
+            ratio: Retries allowed per first attempt
+            min_per_second: Retries allowed per second regardless of traffic
+            capacity: Maximum banked retries
+            clock: Time source (for tests)
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._refilled_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        """Retries currently available."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def record_attempt(self) -> None:
+        """Deposit for a first attempt."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget.
+
+        Returns:
+            True if the retry may go ahead
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self) -> None:
+        """Add the time-based allowance. Caller holds the lock."""
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+
+class RetryPolicy:
+    """Retries a call with classified errors, jittered backoff and a budget."""
+
+    def __init__(
+        self,
+        name: str,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        budget: RetryBudget,
+        rate_limit_delay: float = 0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """Initialize the policy.
+
+        Args:
+            name: Policy name (used in metrics)
+            max_attempts: Attempts including the first
+            base_delay: Smallest delay between attempts in seconds
+            max_delay: Largest delay between attempts in seconds
+            budget: Retry budget shared by every caller of this policy
+            rate_limit_delay: Minimum delay after a rate-limit error
+            sleep: Sleep function (for tests)
+        """
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.rate_limit_delay = rate_limit_delay
+        self._sleep = sleep
+
+    def next_delay(self, previous: float, error_class: str) -> float:
+        """Decorrelated jitter: random between the base and three times the last delay.
+
+        Args:
+            previous: Previous delay (the base delay before the first retry)
+            error_class: Class of the error being retried
+
+        Returns:
+            Seconds to wait before the next attempt
+        """
+        delay = min(self.max_delay, random.uniform(self.base_delay, max(previous, self.base_delay) * 3))
+        if error_class == RATE_LIMIT:
+            delay = max(delay, self.rate_limit_delay)
+        return delay
+
+    def call(
+        self,
+        fn: Callable[[int], Any],
+        max_attempts: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        on_retry: Optional[Callable[[BaseException, str], None]] = None,
+        non_retryable: Tuple[type, ...] = ()
+    ) -> Any:
+        """Call ``fn`` until it succeeds or the error should not be retried.
+
+        Args:
+            fn: Function receiving the attempt number (0 for the first attempt)
+            max_attempts: Overrides the policy's attempt limit
+            deadline: Retries whose delay would not fit before it are skipped
+            on_retry: Callback receiving (error, error_class) before each retry
+            non_retryable: Exception types that are re-raised immediately
+
+        Returns:
+            The first successful result of ``fn``
+
+        Raises:
+            The last error when it is not retryable or retries run out
+        """
+        attempts = max_attempts or self.max_attempts
+        delay = self.base_delay
+        self.budget.record_attempt()
+
+        for attempt in range(attempts):
+            try:
+                return fn(attempt)
+            except non_retryable:
+                raise
+            except Exception as e:
+                error_class = classify_error(e)
+                metrics.increment("retry_errors_total", policy=self.name, error_class=error_class)
+
+                if error_class not in RETRYABLE_CLASSES or attempt == attempts - 1:
+                    raise
+
+                delay = self.next_delay(delay, error_class)
+                if deadline is not None and not deadline.has_time_for(delay):
+                    print(f"Not retrying {self.name}: generation deadline is close")
+                    raise
+                if not self.budget.try_spend():
+                    print(f"Not retrying {self.name}: retry budget exhausted")
+                    metrics.increment("retry_budget_exhausted_total", policy=self.name)
+                    raise
+
+                print(f"Retrying {self.name} after {error_class} error in {delay:.1f}s: {e}")
+                metrics.increment("retries_total", policy=self.name, error_class=error_class)
+                if on_retry:
+                    on_retry(e, error_class)
+                self._sleep(delay)
+
+
+_policies: Dict[str, RetryPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_retry_policy(name: str) -> RetryPolicy:
+    """Get the shared retry policy for "replicate", "fal", "claude" or "storage"."""
+    with _policies_lock:
+        if name not in _policies:
+            settings = AppConfig.RETRY_POLICIES[name]
+            _policies[name] = RetryPolicy(
+                name,
+                max_attempts=settings["max_attempts"],
+                base_delay=settings["base_delay"],
+                max_delay=settings["max_delay"],
+                rate_limit_delay=AppConfig.RETRY_RATE_LIMIT_DELAY_SECONDS,
+                budget=RetryBudget(
+                    ratio=AppConfig.RETRY_BUDGET_RATIO,
+                    min_per_second=AppConfig.RETRY_BUDGET_MIN_PER_SECOND,
+                    capacity=AppConfig.RETRY_BUDGET_CAPACITY
+                )
+            )
+        return _policies[name]
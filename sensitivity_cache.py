@@ -0,0 +1,188 @@
+"""Learned content-filter sensitivity cache for Superhero Avatar Generator.
+
+When a provider rejects a prompt with E005 ("flagged as sensitive"), the
+retry with the simplified prompt usually succeeds, but the first attempt is
+wasted. Flagged selections are remembered in memory and in PostgreSQL so
+later requests with the same combination (or a car that keeps getting
+flagged) start with the fallback prompt instead.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import AppConfig
+from metrics import metrics
+
+
+def normalize_selection(value: str) -> str:
+    """Normalize a selection so spelling variants share a cache entry.
+
+    Args:
+        value: Superhero, car or color as entered
+
+    Returns:
+        Lowercase value with punctuation removed and whitespace collapsed
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", value.lower()).split())
+
+
+def combination_key(superhero: str, car: str, color: str) -> str:
+    """Build the cache key for a combination of selections.
+
+    Args:
+        superhero: Selected superhero
+        car: Selected car
+        color: Selected color
+
+    Returns:
+        Normalized "superhero|car|color" key
+    """
+    return "|".join(normalize_selection(value) for value in (superhero, car, color))
+
+
+class SensitivityCache:
+    """Selections known to trip provider content filters."""
+
+    def __init__(
+        self,
+        feature_threshold: int = 3,
+        feature_ratio: float = 0.5,
+        ttl_seconds: float = 7 * 24 * 3600,
+        persist: bool = True
+    ):
+        """Initialize an empty cache.
+
+        Args:
+            feature_threshold: Flagged combinations needed before a car is
+                treated as sensitive with any superhero and color
+            feature_ratio: Share of lookups with a car that must have been
+                flagged before the car is treated as sensitive
+            ttl_seconds: How long a flag is trusted (filters change)
+            persist: Whether to load and store flags in PostgreSQL
+        """
+        self.feature_threshold = feature_threshold
+        self.feature_ratio = feature_ratio
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        # combination key -> last flagged (epoch seconds)
+        self._flagged: Dict[str, float] = {}
+        self._loaded = not persist
+        # normalized car -> lookups in this process
+        self._car_lookups: Dict[str, int] = {}
+        self._lookups = 0
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    def is_sensitive(self, superhero: str, car: str, color: str) -> bool:
+        """Check whether a combination should start with the fallback prompt.
+
+        Args:
+            superhero: Selected superhero
+            car: Selected car
+            color: Selected color
+
+        Returns:
+            True if the combination, or its car, has been flagged
+        """
+        self._load()
+        key = combination_key(superhero, car, color)
+        car_key = key.split("|")[1]
+
+        with self._lock:
+            self._expire()
+            self._car_lookups[car_key] = self._car_lookups.get(car_key, 0) + 1
+            hit = key in self._flagged or self._sensitive_car(car_key)
+            self._lookups += 1
+            self._hits += int(hit)
+            hit_rate = self._hits / self._lookups
+
+        metrics.increment("sensitivity_cache_lookups_total", result="hit" if hit else "miss")
+        metrics.set_gauge("sensitivity_cache_hit_rate", hit_rate)
+        return hit
+
+    def record_flag(self, superhero: str, car: str, color: str) -> None:
+        """Remember that a combination was flagged by a content filter.
+
+        Args:
+            superhero: Selected superhero
+            car: Selected car
+            color: Selected color
+        """
+        key = combination_key(superhero, car, color)
+        with self._lock:
+            self._flagged[key] = time.time()
+            size = len(self._flagged)
+        metrics.increment("sensitivity_cache_flags_total")
+        metrics.set_gauge("sensitivity_cache_entries", size)
+        print(f"Remembered content-filter flag for {key}")
+
+        if self.persist:
+            try:
+                from database import db_manager
+                db_manager.record_sensitive_prompt(key, *key.split("|"))
+            except Exception as e:
+                print(f"Database update error: {e}")
+
+    def hit_rate(self) -> Optional[float]:
+        """Share of lookups that went straight to the fallback prompt, or None before any lookup."""
+        with self._lock:
+            return self._hits / self._lookups if self._lookups else None
+
+    def clear(self) -> None:
+        """Forget all flags and statistics held in memory."""
+        with self._lock:
+            self._flagged.clear()
+            self._car_lookups.clear()
+            self._lookups = 0
+            self._hits = 0
+
+    def _sensitive_car(self, car: str) -> bool:
+        """Whether a car is flagged often enough to be sensitive with any selections. Caller holds the lock."""
+        flags = sum(1 for flagged_key in self._flagged if flagged_key.split("|")[1] == car)
+        if flags < self.feature_threshold:
+            return False
+        # Flags loaded from PostgreSQL have no lookups in this process
+        lookups = max(self._car_lookups.get(car, 0), flags)
+        return flags / lookups >= self.feature_ratio
+
+    def _expire(self) -> None:
+        """Drop flags older than the TTL. Caller holds the lock."""
+        cutoff = time.time() - self.ttl_seconds
+        for key in [key for key, flagged_at in self._flagged.items() if flagged_at < cutoff]:
+            del self._flagged[key]
+
+    def _load(self) -> None:
+        """Load recent flags from PostgreSQL once per process."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+
+        try:
+            from database import db_manager
+            since = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+            rows = db_manager.get_sensitive_prompts(since)
+        except Exception as e:
+            print(f"Database read error: {e}")
+            return
+
+        with self._lock:
+            for row in rows:
+                flagged_at = datetime.fromisoformat(row["last_flagged_at"]) if row["last_flagged_at"] else datetime.utcnow()
+                # Stored as naive UTC; convert to epoch seconds for the TTL check
+                epoch = (flagged_at - datetime(1970, 1, 1)).total_seconds()
+                self._flagged[row["combination_key"]] = max(self._flagged.get(row["combination_key"], 0), epoch)
+            size = len(self._flagged)
+        metrics.set_gauge("sensitivity_cache_entries", size)
+        print(f"Loaded {len(rows)} content-filter flags")
+
+
+# Create global sensitivity cache instance
+sensitivity_cache = SensitivityCache(
+    feature_threshold=AppConfig.SENSITIVITY_FEATURE_THRESHOLD,
+    feature_ratio=AppConfig.SENSITIVITY_FEATURE_RATIO,
+    ttl_seconds=AppConfig.SENSITIVITY_CACHE_TTL_HOURS * 3600
+)
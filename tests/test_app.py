@@ -91,4 +91,94 @@ class TestAppFunctions:
             import utils
             assert True
         except ImportError as e:
-            pytest.fail(f"Import failed: {e}")
\ No newline at end of file
+            pytest.fail(f"Import failed: {e}")
+
+class SessionState(dict):
+    """Dict with attribute access, like st.session_state."""
+    
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+    
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class TestSpeculativeGeneration:
+    """Test generation started as soon as the photo is captured."""
+    
+    @pytest.fixture
+    def session_state(self):
+        """Session state at step 3 with no job running."""
+        state = SessionState(generation_job=None, speculative_key=None, request_id=None)
+        with patch.object(st, 'session_state', state):
+            yield state
+    
+    def _start(self, session_state):
+        """Fake start_generation that records a new request and job in the session."""
+        def start():
+            session_state.request_id = f"req-{session_state.get('started', 0)}"
+            session_state.started = session_state.get('started', 0) + 1
+            session_state.generation_job = Mock()
+            return session_state.generation_job
+        return start
+    
+    def test_new_photo_starts_job(self, session_state):
+        """Test a captured photo starts a job keyed by the photo."""
+        from app import start_speculative_generation
+        
+        with patch('app.start_generation', side_effect=self._start(session_state)) as mock_start:
+            start_speculative_generation("photo-1")
+        
+        mock_start.assert_called_once()
+        assert session_state.speculative_key == "photo-1"
+    
+    def test_same_photo_keeps_job(self, session_state):
+        """Test reruns with the same photo do not restart the job."""
+        from app import start_speculative_generation
+        
+        with patch('app.start_generation', side_effect=self._start(session_state)) as mock_start, \
+                patch('app.cancel_generation') as mock_cancel:
+            start_speculative_generation("photo-1")
+            start_speculative_generation("photo-1")
+        
+        mock_start.assert_called_once()
+        mock_cancel.assert_not_called()
+    
+    def test_retake_cancels_and_restarts(self, session_state):
+        """Test a new photo cancels the running job and starts another."""
+        from app import start_speculative_generation
+        
+        with patch('app.start_generation', side_effect=self._start(session_state)) as mock_start, \
+                patch('app.cancel_generation') as mock_cancel, \
+                patch('app.db_manager'):
+            start_speculative_generation("photo-1")
+            start_speculative_generation("photo-2")
+        
+        assert mock_start.call_count == 2
+        mock_cancel.assert_called_once()
+        assert session_state.speculative_key == "photo-2"
+    
+    def test_retake_deletes_discarded_request(self, session_state):
+        """Test a retake leaves no failed request behind."""
+        from app import start_speculative_generation
+        
+        with patch('app.start_generation', side_effect=self._start(session_state)), \
+                patch('app.cancel_generation'), \
+                patch('app.db_manager') as mock_db:
+            start_speculative_generation("photo-1")
+            start_speculative_generation("photo-2")
+        
+        mock_db.delete_request.assert_called_once_with("req-0")
+        assert session_state.request_id == "req-1"
+    
+    def test_start_failure_is_not_fatal(self, session_state):
+        """Test a busy pool leaves the Generate click to submit the job."""
+        from app import start_speculative_generation
+        
+        with patch('app.start_generation', side_effect=RuntimeError("Service is busy")):
+            start_speculative_generation("photo-1")
+        
+        assert session_state.speculative_key is None
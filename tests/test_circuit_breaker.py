@@ -0,0 +1,88 @@
+"""Tests for per-provider circuit breakers."""
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import metrics
+
+
+@pytest.fixture
+def breaker(clock):
+    """Create a breaker that opens after 3 failures for 30 seconds."""
+    return CircuitBreaker("test", failure_threshold=3, reset_timeout=30, clock=clock)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    """Test the breaker trips on consecutive failures only."""
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_half_open_allows_single_probe(breaker, clock):
+    """Test only one probe goes through after the cool-down."""
+    for _ in range(3):
+        breaker.record_failure()
+    
+    clock.now = 31
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.is_available()
+    assert breaker.allow_request()
+    assert not breaker.is_available()
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes(breaker, clock):
+    """Test a successful probe closes the breaker."""
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now = 31
+    breaker.allow_request()
+    breaker.record_success()
+    
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(breaker, clock):
+    """Test a failed probe starts a new cool-down."""
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now = 31
+    breaker.allow_request()
+    breaker.record_failure()
+    
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 50
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 62
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_released_probe_can_be_retaken(breaker, clock):
+    """Test a probe without an outcome frees the slot."""
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now = 31
+    breaker.allow_request()
+    breaker.release_probe()
+    
+    assert breaker.allow_request()
+
+
+def test_state_is_exported_as_metric(clock):
+    """Test breaker state is visible in metrics."""
+    breaker = CircuitBreaker("metrics-test", failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    
+    assert metrics.get_gauge("circuit_breaker_state", provider="metrics-test") == (True, 2)
+    assert metrics.get_counter("circuit_breaker_transitions_total", provider="metrics-test", state="open") == 1
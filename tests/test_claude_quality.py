@@ -12,6 +12,7 @@ import base64
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from databricks_claude import DatabricksClaudeCommentator, get_claude_commentary
+from image_encoding import InlineImage
 
 
 class TestDatabricksClaudeCommentator:
@@ -41,14 +42,14 @@ class TestDatabricksClaudeCommentator:
         with pytest.raises(ValueError, match="DATABRICKS_TOKEN is required"):
             DatabricksClaudeCommentator()
     
-    def test_image_to_base64(self, mock_env, sample_image):
-        """Test image to base64 conversion."""
+    def test_inline_image(self, mock_env, sample_image):
+        """Test image encoding for the request body."""
         commentator = DatabricksClaudeCommentator()
-        base64_str = commentator._image_to_base64(sample_image)
+        data_uri = commentator._inline_image(sample_image).to_data_uri()
         
-        # Verify it's a valid base64 string
-        assert isinstance(base64_str, str)
-        assert len(base64_str) > 0
+        # Verify it's a valid PNG data URI
+        header, base64_str = data_uri.split(",", 1)
+        assert header == "data:image/png;base64"
         
         # Verify we can decode it back
         decoded = base64.b64decode(base64_str)
@@ -60,14 +61,14 @@ class TestDatabricksClaudeCommentator:
         
         # Create a large image
         large_image = Image.new('RGB', (2000, 2000), color='blue')
-        base64_str = commentator._image_to_base64(large_image)
+        data_uri = commentator._inline_image(large_image).to_data_uri()
         
         # Decode and check size
-        decoded = base64.b64decode(base64_str)
+        decoded = base64.b64decode(data_uri.split(",", 1)[1])
         img = Image.open(io.BytesIO(decoded))
         assert max(img.width, img.height) <= 1024
     
-    @patch('requests.post')
+    @patch('databricks_claude.http_transport.post')
     def test_call_claude_endpoint_success(self, mock_post, mock_env):
         """Test successful API call to Claude endpoint."""
         commentator = DatabricksClaudeCommentator()
@@ -88,7 +89,8 @@ class TestDatabricksClaudeCommentator:
         }
         mock_post.return_value = mock_response
         
-        result = commentator._call_claude_endpoint("test prompt", "base64data")
+        image = InlineImage(Image.new('RGB', (8, 8)))
+        result = commentator._call_claude_endpoint("test prompt", image)
         
         assert result is not None
         assert "choices" in result
@@ -97,9 +99,11 @@ class TestDatabricksClaudeCommentator:
         # Verify request structure
         call_args = mock_post.call_args
         assert call_args[1]["headers"]["Authorization"] == "Bearer test-token-123"
-        assert "messages" in call_args[1]["json"]
+        body = json.loads(b"".join(call_args[1]["data"]))
+        assert "messages" in body
+        assert body["messages"][0]["content"][1]["image_url"]["url"] == image.to_data_uri()
     
-    @patch('requests.post')
+    @patch('databricks_claude.http_transport.post')
     def test_call_claude_endpoint_failure(self, mock_post, mock_env):
         """Test handling of API call failure."""
         commentator = DatabricksClaudeCommentator()
@@ -110,7 +114,7 @@ class TestDatabricksClaudeCommentator:
         mock_response.text = "Internal Server Error"
         mock_post.return_value = mock_response
         
-        result = commentator._call_claude_endpoint("test prompt", "base64data")
+        result = commentator._call_claude_endpoint("test prompt", InlineImage(Image.new('RGB', (8, 8))))
         
         assert result is None
     
@@ -168,7 +172,7 @@ class TestDatabricksClaudeCommentator:
         assert score == 0.75
         assert "Fantastic superhero avatar!" in commentary
     
-    @patch('requests.post')
+    @patch('databricks_claude.http_transport.post')
     def test_analyze_avatar_full_flow(self, mock_post, mock_env, sample_image):
         """Test the complete analyze_avatar flow."""
         commentator = DatabricksClaudeCommentator()
@@ -200,7 +204,7 @@ class TestDatabricksClaudeCommentator:
         assert analysis["superhero_likeness"] == "strong"
         
         # Verify the prompt contains the context
-        call_args = mock_post.call_args[1]["json"]
+        call_args = json.loads(b"".join(mock_post.call_args[1]["data"]))
         prompt_text = call_args["messages"][0]["content"][0]["text"]
         assert "Iron Man" in prompt_text
         assert "red" in prompt_text
@@ -245,7 +249,7 @@ class TestGetClaudeCommentary:
         assert score == 0.88
         assert commentary == "Super cool!"
         mock_instance.analyze_avatar.assert_called_once_with(
-            sample_image, "Spider-Man", "red", "Audi"
+            sample_image, "Spider-Man", "red", "Audi", None
         )
     
     def test_get_claude_commentary_error(self, sample_image, monkeypatch):
@@ -0,0 +1,110 @@
+"""Tests for the end-to-end generation deadline."""
+
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from deadline import Deadline, DeadlineExceeded, within
+from metrics import metrics
+
+
+class TestDeadline:
+    """Test Deadline budgeting."""
+    
+    def test_remaining_counts_down_to_zero(self, clock):
+        """Test remaining time shrinks and never goes negative."""
+        deadline = Deadline(60, clock=clock)
+        assert deadline.remaining() == 60
+        
+        clock.now += 45
+        assert deadline.remaining() == 15
+        assert deadline.has_time_for(10)
+        assert not deadline.has_time_for(20)
+        
+        clock.now += 30
+        assert deadline.remaining() == 0
+        assert deadline.expired()
+    
+    def test_timeout_is_capped_by_remaining_budget(self, clock):
+        """Test stage timeouts take only what remains."""
+        deadline = Deadline(60, clock=clock)
+        assert deadline.timeout(30) == 30
+        
+        clock.now += 50
+        assert deadline.timeout(30) == 10
+        assert within(deadline, 30) == 10
+        assert within(None, 30) == 30
+    
+    def test_reserve_ends_earlier(self, clock):
+        """Test a reserved deadline leaves time for later stages."""
+        deadline = Deadline(60, clock=clock)
+        provider_deadline = deadline.reserve(5)
+        
+        clock.now += 56
+        assert provider_deadline.expired()
+        assert not deadline.expired()
+    
+    def test_check_raises_and_counts_stage(self, clock):
+        """Test an expired deadline raises with the stage that ran out."""
+        metrics.reset()
+        deadline = Deadline(1, clock=clock)
+        deadline.check("provider")
+        
+        clock.now += 2
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            deadline.check("download")
+        
+        assert exc_info.value.stage == "download"
+        assert metrics.get_counter("generation_deadline_exceeded_total", stage="download") == 1
+
+
+class TestOptionalStagesSkipped:
+    """Test optional post-processing is skipped when time is short."""
+    
+    def test_commentary_and_overlays_skipped_near_deadline(self):
+        """Test a late avatar is returned without commentary or logos."""
+        from image_generator import ImageGenerator
+        
+        with patch('image_generator.AppConfig.REPLICATE_API_TOKEN', 'test_token'):
+            with patch('image_generator.AppConfig.AI_PROVIDER', 'replicate'):
+                with patch('image_generator.AppConfig.ENABLE_HEDGING', False):
+                    with patch('image_generator.get_replicate_client'):
+                        generator = ImageGenerator()
+        avatar = Image.new('RGB', (64, 64), color='red')
+        
+        with patch.object(generator, '_generate_with_provider', return_value=avatar):
+            with patch('image_generator.get_claude_commentary') as mock_claude:
+                with patch('image_generator.add_logo_to_image') as mock_logo:
+                    image, _, error = generator.generate_avatar(
+                        Image.new('RGB', (64, 64)), "Superman", "Blue", "Tesla Model S",
+                        deadline=Deadline(0.5)
+                    )
+        
+        assert error is None
+        assert image is avatar
+        assert image.commentary == "Your superhero avatar is ready!"
+        mock_claude.assert_not_called()
+        mock_logo.assert_not_called()
+    
+    def test_deadline_exceeded_is_reported_as_timeout(self):
+        """Test running out of budget gives a user-friendly error."""
+        from image_generator import ImageGenerator
+        
+        with patch('image_generator.AppConfig.REPLICATE_API_TOKEN', 'test_token'):
+            with patch('image_generator.AppConfig.AI_PROVIDER', 'replicate'):
+                with patch('image_generator.AppConfig.ENABLE_HEDGING', False):
+                    with patch('image_generator.get_replicate_client'):
+                        generator = ImageGenerator()
+        
+        with patch.object(generator, '_generate_with_provider', side_effect=DeadlineExceeded("provider")):
+            image, _, error = generator.generate_avatar(
+                Image.new('RGB', (64, 64)), "Superman", "Blue", "Tesla Model S"
+            )
+        
+        assert image is None
+        assert error == "Generation took too long. Please try again."
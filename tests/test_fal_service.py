@@ -0,0 +1,157 @@
+"""Tests for Fal queue polling and progress reporting."""
+
+import base64
+import io
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import fal_client
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fal_service import FalImageGenerator
+
+
+class TestFalQueuePolling:
+    """Test FalImageGenerator submit/status/result flow."""
+
+    @pytest.fixture
+    def fal_generator(self):
+        """Create FalImageGenerator with a fake key and stubbed uploads."""
+        with patch.dict('os.environ', {'FAL_KEY': 'test_key'}):
+            generator = FalImageGenerator()
+        with patch.object(generator, 'upload_image', return_value="https://fal.media/input.png"):
+            yield generator
+
+    def _handle(self, statuses, result=None):
+        handle = Mock()
+        handle.request_id = "req-123"
+        handle.iter_events.return_value = iter(statuses)
+        handle.get.return_value = result or {"images": [{"url": "http://example.com/avatar.png"}]}
+        return handle
+
+    def test_reports_queue_position_and_progress(self, fal_generator):
+        """Test queue position and inference progress reach the callback."""
+        handle = self._handle([
+            fal_client.Queued(position=2),
+            fal_client.Queued(position=0),
+            fal_client.InProgress(logs=[{"message": "14/28"}]),
+            fal_client.Completed(logs=None, metrics={}),
+        ])
+        progress = Mock()
+
+        with patch('fal_service.fal_client.submit', return_value=handle):
+            with patch.object(fal_generator, '_download_image', return_value=Image.new('RGB', (10, 10))):
+                image, _, error = fal_generator.generate_avatar(
+                    Image.new('RGB', (10, 10)), "prompt", progress_callback=progress
+                )
+
+        assert error is None
+        assert image is not None
+        messages = [call.args[1] for call in progress.call_args_list]
+        assert "Waiting in line... 2 ahead of you" in messages
+        assert "You're next in line..." in messages
+        assert progress.call_args_list[2].args[0] == 50  # halfway between 25 and 75
+        assert progress.call_args_list[-1].args[0] == 75
+
+    def test_cancel_event_cancels_request(self, fal_generator):
+        """Test setting the cancel event cancels the Fal request."""
+        cancel_event = threading.Event()
+        cancel_event.set()
+        handle = self._handle([fal_client.Queued(position=3)])
+
+        with patch('fal_service.fal_client.submit', return_value=handle):
+            image, _, error = fal_generator.generate_avatar(
+                Image.new('RGB', (10, 10)), "prompt", cancel_event=cancel_event
+            )
+
+        assert image is None
+        assert error == "Generation was cancelled."
+        handle.cancel.assert_called_once()
+        handle.get.assert_not_called()
+
+    def test_inference_fraction_falls_back_to_elapsed_time(self):
+        """Test progress is estimated from time when logs have no step counter."""
+        fraction = FalImageGenerator._inference_fraction([{"message": "Loading model"}], 5.0, 20.0)
+        assert fraction == 0.25
+
+        # Never reports done before the result arrives
+        assert FalImageGenerator._inference_fraction([], 60.0, 20.0) == 0.95
+
+
+class TestFalResultLoading:
+    """Test decoding Fal results."""
+
+    @pytest.fixture
+    def fal_generator(self):
+        """Create FalImageGenerator with a fake key and stubbed uploads."""
+        with patch.dict('os.environ', {'FAL_KEY': 'test_key'}):
+            generator = FalImageGenerator()
+        with patch.object(generator, 'upload_image', return_value="https://fal.media/input.png"):
+            yield generator
+
+    def test_inline_result_is_decoded_without_download(self, fal_generator):
+        """Test sync mode data URIs are decoded directly."""
+        buffered = io.BytesIO()
+        Image.new('RGB', (16, 16), color='blue').save(buffered, format='PNG')
+        data_uri = "data:image/png;base64," + base64.b64encode(buffered.getvalue()).decode()
+
+        with patch.object(fal_generator, '_download_image') as mock_download:
+            image = fal_generator._load_result_image(data_uri)
+
+        mock_download.assert_not_called()
+        assert image.size == (16, 16)
+
+    def test_url_result_is_downloaded(self, fal_generator):
+        """Test URL results fall back to a download."""
+        with patch.object(fal_generator, '_download_image', return_value="image") as mock_download:
+            assert fal_generator._load_result_image("https://fal.media/avatar.png") == "image"
+        mock_download.assert_called_once_with("https://fal.media/avatar.png", None)
+
+    def test_sync_mode_is_requested(self, fal_generator):
+        """Test the submitted arguments ask for an inline result."""
+        handle = Mock()
+        handle.iter_events.return_value = iter([fal_client.Completed(logs=None, metrics={})])
+        handle.get.return_value = {"images": [{"url": "https://fal.media/avatar.png"}]}
+        fal_generator.sync_mode = True
+
+        with patch('fal_service.fal_client.submit', return_value=handle) as mock_submit:
+            with patch.object(fal_generator, '_download_image', return_value=Image.new('RGB', (8, 8))):
+                fal_generator.generate_avatar(Image.new('RGB', (10, 10)), "prompt")
+
+        assert mock_submit.call_args.kwargs["arguments"]["sync_mode"] is True
+
+
+class TestFalInputUpload:
+    """Test the photo is uploaded once and referenced by URL."""
+
+    def test_input_uploaded_once(self):
+        """Test repeated generations reuse the uploaded URL."""
+        from upload_cache import upload_cache
+        upload_cache.clear()
+        with patch.dict('os.environ', {'FAL_KEY': 'test_key'}):
+            generator = FalImageGenerator()
+        photo = Image.new('RGB', (10, 10), color='purple')
+
+        with patch('fal_service.fal_client.upload', return_value="https://fal.media/input.png") as mock_upload:
+            first = generator._image_input(photo)
+            second = generator._image_input(photo.copy())
+
+        assert first == second == "https://fal.media/input.png"
+        mock_upload.assert_called_once()
+
+    def test_upload_failure_falls_back_to_data_uri(self):
+        """Test a failed upload still sends the photo inline."""
+        from upload_cache import upload_cache
+        upload_cache.clear()
+        with patch.dict('os.environ', {'FAL_KEY': 'test_key'}):
+            generator = FalImageGenerator()
+
+        with patch('fal_service.fal_client.upload', side_effect=RuntimeError("offline")):
+            image_input = generator._image_input(Image.new('RGB', (10, 10), color='orange'))
+
+        assert image_input.startswith("data:image/png;base64,")
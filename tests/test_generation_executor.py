@@ -0,0 +1,155 @@
+"""Tests for background generation executor."""
+
+import threading
+
+import pytest
+
+from generation_executor import GenerationExecutor
+
+
+class TestGenerationExecutor:
+    """Test GenerationExecutor and GenerationJob."""
+    
+    @pytest.fixture
+    def executor(self):
+        """Create a small executor."""
+        return GenerationExecutor(max_workers=1, max_pending=2)
+    
+    def test_submit_returns_result(self, executor):
+        """Test job result and progress reporting."""
+        def work(value, progress_callback=None, cancel_event=None):
+            progress_callback(50, "Halfway")
+            return value * 2
+        
+        job = executor.submit(work, 21)
+        job._future.result(timeout=5)
+        
+        assert job.done()
+        assert job.result() == 42
+        assert job.status == "completed"
+        assert job.progress == 50
+        assert job.message == "Halfway"
+    
+    def test_progress_never_goes_backwards(self, executor):
+        """Test progress updates are monotonic."""
+        def work(progress_callback=None, cancel_event=None):
+            progress_callback(80, "Almost")
+            progress_callback(20, "Earlier stage")
+        
+        job = executor.submit(work)
+        job._future.result(timeout=5)
+        
+        assert job.progress == 80
+    
+    def test_failed_job_raises(self, executor):
+        """Test exceptions propagate through result()."""
+        def work(progress_callback=None, cancel_event=None):
+            raise ValueError("boom")
+        
+        job = executor.submit(work)
+        with pytest.raises(ValueError, match="boom"):
+            job._future.result(timeout=5)
+        
+        assert job.status == "failed"
+        with pytest.raises(ValueError):
+            job.result()
+    
+    def test_result_before_done_raises(self, executor):
+        """Test result() on a running job."""
+        release = threading.Event()
+        
+        def work(progress_callback=None, cancel_event=None):
+            release.wait(5)
+        
+        job = executor.submit(work)
+        with pytest.raises(RuntimeError, match="still running"):
+            job.result()
+        release.set()
+        job._future.result(timeout=5)
+    
+    def test_rejects_when_full(self, executor):
+        """Test the pool is bounded."""
+        release = threading.Event()
+        
+        def work(progress_callback=None, cancel_event=None):
+            release.wait(5)
+        
+        jobs = [executor.submit(work), executor.submit(work)]
+        with pytest.raises(RuntimeError, match="busy"):
+            executor.submit(work)
+        
+        release.set()
+        for job in jobs:
+            job._future.result(timeout=5)
+        assert executor.pending == 0
+    
+    def test_cancel_signals_running_job(self, executor):
+        """Test cancel() sets the event passed to the running function."""
+        started = threading.Event()
+        
+        def work(progress_callback=None, cancel_event=None):
+            started.set()
+            return cancel_event.wait(5)
+        
+        job = executor.submit(work)
+        started.wait(5)
+        job.cancel()
+        
+        assert job._future.result(timeout=5) is True
+        assert job.status == "cancelled"
+    
+    def test_cancelled_queued_job_never_runs(self, executor):
+        """Test a job cancelled before it starts is skipped."""
+        release = threading.Event()
+        calls = []
+        
+        def blocker(progress_callback=None, cancel_event=None):
+            release.wait(5)
+        
+        def work(progress_callback=None, cancel_event=None):
+            calls.append(1)
+        
+        first = executor.submit(blocker)
+        queued = executor.submit(work)
+        queued.cancel()
+        release.set()
+        first._future.result(timeout=5)
+        queued._future.result(timeout=5)
+        
+        assert calls == []
+        assert queued.status == "cancelled"
+        assert executor.pending == 0
+    
+    def test_submit_once_joins_inflight_job(self, executor):
+        """Test duplicate submissions of a key share the running job."""
+        release = threading.Event()
+        calls = []
+        
+        def work(progress_callback=None, cancel_event=None):
+            calls.append(1)
+            release.wait(5)
+            return "avatar"
+        
+        first = executor.submit_once(("req-1", 0), work)
+        second = executor.submit_once(("req-1", 0), work)
+        release.set()
+        first._future.result(timeout=5)
+        
+        assert second is first
+        assert second.result() == "avatar"
+        assert calls == [1]
+    
+    def test_submit_once_runs_again_after_finish(self, executor):
+        """Test a key is submitted again once its job has finished or been cancelled."""
+        def work(progress_callback=None, cancel_event=None):
+            return "avatar"
+        
+        first = executor.submit_once(("req-1", 0), work)
+        first._future.result(timeout=5)
+        second = executor.submit_once(("req-1", 0), work)
+        second.cancel()
+        third = executor.submit_once(("req-1", 0), work)
+        third._future.result(timeout=5)
+        
+        assert len({first.job_id, second.job_id, third.job_id}) == 3
+        assert executor._inflight == {}
@@ -0,0 +1,206 @@
+"""Tests for the Postgres-backed generation queue and worker."""
+
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from generation_queue import QueuedGenerationJob, encode_job_image, decode_job_image, enqueue_generation
+from generation_worker import GenerationWorker
+
+
+@pytest.fixture
+def test_image():
+    """Create a test image."""
+    return Image.new('RGB', (64, 64), color='red')
+
+
+def test_image_roundtrip(test_image):
+    """Test job images survive encoding."""
+    decoded = decode_job_image(encode_job_image(test_image))
+    assert decoded.size == (64, 64)
+    assert decoded.getpixel((0, 0)) == (255, 0, 0)
+
+
+@patch('generation_queue.db_manager')
+def test_enqueue_passes_attempt(mock_db, test_image):
+    """Test the attempt reaches the idempotent enqueue."""
+    mock_db.enqueue_generation_job.return_value = "job-1"
+    
+    job = enqueue_generation(test_image, "req-1", 2)
+    
+    assert job.job_id == "job-1"
+    request_id, _, attempt = mock_db.enqueue_generation_job.call_args.args
+    assert (request_id, attempt) == ("req-1", 2)
+
+
+class TestQueuedGenerationJob:
+    """Test the queued job handle."""
+    
+    def _state(self, **overrides):
+        state = {
+            "status": "running",
+            "progress": 40,
+            "message": "Working...",
+            "generation_time_seconds": None,
+            "style_score": None,
+            "commentary": None,
+            "original_image_path": None,
+            "generated_image_path": None,
+            "error_message": None,
+            "result_image": None
+        }
+        state.update(overrides)
+        return state
+    
+    @patch('generation_queue.db_manager')
+    def test_running_job(self, mock_db):
+        """Test progress is read from the job row."""
+        mock_db.get_generation_job.return_value = self._state()
+        job = QueuedGenerationJob("job-1")
+        
+        assert job.progress == 40
+        assert job.message == "Working..."
+        assert not job.done()
+        with pytest.raises(RuntimeError):
+            job.result()
+    
+    @patch('generation_queue.db_manager')
+    def test_completed_job(self, mock_db, test_image):
+        """Test completed jobs return the decoded avatar with Claude analysis."""
+        mock_db.get_generation_job.return_value = self._state(
+            status="completed",
+            progress=100,
+            generation_time_seconds=12.5,
+            style_score=0.9,
+            commentary="Super!",
+            generated_image_path="data/avatars/a.png",
+            result_image=encode_job_image(test_image)
+        )
+        job = QueuedGenerationJob("job-1")
+        
+        assert job.done()
+        outcome = job.result()
+        assert outcome["error"] is None
+        assert outcome["generation_time"] == 12.5
+        assert outcome["avatar"].size == (64, 64)
+        assert outcome["avatar"].style_score == 0.9
+        assert outcome["avatar"].commentary == "Super!"
+    
+    @patch('generation_queue.db_manager')
+    def test_failed_job(self, mock_db):
+        """Test failed jobs surface the error message."""
+        mock_db.get_generation_job.return_value = self._state(
+            status="failed", error_message="Service is busy."
+        )
+        job = QueuedGenerationJob("job-1")
+        
+        assert job.done()
+        outcome = job.result()
+        assert outcome["avatar"] is None
+        assert outcome["error"] == "Service is busy."
+    
+    @patch('generation_queue.db_manager')
+    def test_cancel_job(self, mock_db):
+        """Test cancelling marks the job and finishes the handle."""
+        mock_db.get_generation_job.return_value = self._state()
+        job = QueuedGenerationJob("job-1")
+        assert not job.done()
+        
+        mock_db.get_generation_job.return_value = self._state(
+            status="cancelled", error_message="Generation was cancelled."
+        )
+        job.cancel()
+        
+        mock_db.cancel_generation_job.assert_called_once_with("job-1")
+        assert job.done()
+        assert job.result()["error"] == "Generation was cancelled."
+
+
+class TestGenerationWorker:
+    """Test the generation worker."""
+    
+    @patch('generation_worker.run_generation_pipeline')
+    @patch('generation_worker.db_manager')
+    def test_process_completes_job(self, mock_db, mock_pipeline, test_image):
+        """Test a claimed job is run and its result stored."""
+        avatar = Image.new('RGB', (32, 32), color='blue')
+        avatar.style_score = 0.8
+        mock_db.claim_generation_job.return_value = {
+            "job_id": "job-1",
+            "request_id": "req-1",
+            "attempts": 1,
+            "input_image": encode_job_image(test_image)
+        }
+        mock_db.get_request.return_value = {
+            "name": "Jane", "email": "jane@example.com",
+            "superhero": "Thor", "car": "Mustang", "color": "Red"
+        }
+        mock_pipeline.return_value = {
+            "avatar": avatar,
+            "generation_time": 10.0,
+            "error": None,
+            "original_path": "o.jpg",
+            "avatar_path": "a.png"
+        }
+        
+        worker = GenerationWorker(worker_id="worker-1")
+        assert worker.run_once() is True
+        
+        kwargs = mock_db.complete_generation_job.call_args.kwargs
+        assert kwargs["style_score"] == 0.8
+        assert kwargs["generated_image_path"] == "a.png"
+        mock_db.fail_generation_job.assert_not_called()
+        # The first attempt at a request may be served from the result cache
+        assert mock_pipeline.call_args.kwargs["regenerate"] is False
+    
+    @patch('generation_worker.run_generation_pipeline')
+    @patch('generation_worker.db_manager')
+    def test_process_fails_job(self, mock_db, mock_pipeline, test_image):
+        """Test pipeline errors mark the job as failed."""
+        mock_db.claim_generation_job.return_value = {
+            "job_id": "job-1",
+            "request_id": "req-1",
+            "attempts": 1,
+            "input_image": encode_job_image(test_image)
+        }
+        mock_db.get_request.return_value = {"superhero": "Thor", "car": "Mustang", "color": "Red"}
+        mock_pipeline.return_value = {"avatar": None, "generation_time": 1.0, "error": "boom"}
+        
+        worker = GenerationWorker(worker_id="worker-1")
+        worker.run_once()
+        
+        mock_db.fail_generation_job.assert_called_once_with("job-1", "worker-1", "boom")
+    
+    @patch('generation_worker.AppConfig.WORKER_HEARTBEAT_SECONDS', 0.01)
+    @patch('generation_worker.run_generation_pipeline')
+    @patch('generation_worker.db_manager')
+    def test_cancelled_job_cancels_pipeline(self, mock_db, mock_pipeline, test_image):
+        """Test a job cancelled from the app signals the running pipeline."""
+        mock_db.claim_generation_job.return_value = {
+            "job_id": "job-1",
+            "request_id": "req-1",
+            "attempts": 1,
+            "input_image": encode_job_image(test_image)
+        }
+        mock_db.get_request.return_value = {"superhero": "Thor", "car": "Mustang", "color": "Red"}
+        mock_db.heartbeat_generation_job.return_value = False
+        mock_db.get_generation_job.return_value = {"status": "cancelled"}
+        
+        def pipeline(*args, cancel_event=None, **kwargs):
+            cancelled = cancel_event.wait(5)
+            return {"avatar": None, "generation_time": 1.0, "error": "Generation was cancelled." if cancelled else None}
+        
+        mock_pipeline.side_effect = pipeline
+        
+        GenerationWorker(worker_id="worker-1").run_once()
+        
+        assert mock_pipeline.call_args.kwargs["cancel_event"].is_set()
+        # The job row is already cancelled; the worker no longer owns it
+        mock_db.fail_generation_job.assert_not_called()
+    
+    @patch('generation_worker.db_manager')
+    def test_empty_queue(self, mock_db):
+        """Test run_once with no jobs."""
+        mock_db.claim_generation_job.return_value = None
+        assert GenerationWorker(worker_id="worker-1").run_once() is False
@@ -0,0 +1,165 @@
+"""Tests for quality/latency generation tiers."""
+
+import sys
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import AppConfig
+from generation_pipeline import choose_generation_tier
+from image_generator import ImageGenerator
+
+
+class TestTierConfig:
+    """Test tier definitions in AppConfig."""
+
+    def test_standard_tier_matches_provider_defaults(self):
+        """Test the standard tier keeps the original provider parameters."""
+        assert AppConfig.get_tier_params("standard", "replicate") == {"prompt_upsampling": True}
+        assert AppConfig.get_tier_params("standard", "fal") == {"num_inference_steps": 28, "guidance_scale": 10}
+
+    def test_express_tier_is_faster(self):
+        """Test express skips prompt upsampling and uses fewer steps."""
+        assert AppConfig.get_tier_params("express", "replicate")["prompt_upsampling"] is False
+        assert AppConfig.get_tier_params("express", "fal")["num_inference_steps"] < 28
+
+    def test_tier_params_are_copies(self):
+        """Test callers cannot modify the shared tier definitions."""
+        AppConfig.get_tier_params("premium", "replicate").pop("model")
+        assert "model" in AppConfig.get_tier_params("premium", "replicate")
+
+    def test_unknown_tier_raises(self):
+        """Test unknown tiers are rejected."""
+        with pytest.raises(ValueError):
+            AppConfig.get_tier_params("turbo", "replicate")
+
+
+class TestChooseGenerationTier:
+    """Test per-request and load-based tier selection."""
+
+    @patch('generation_pipeline.generation_load', return_value=100)
+    def test_requested_tier_wins(self, mock_load):
+        """Test an explicit tier is used even under load."""
+        assert choose_generation_tier("premium") == "premium"
+        mock_load.assert_not_called()
+
+    @patch('generation_pipeline.AppConfig.EXPRESS_TIER_LOAD_THRESHOLD', 8)
+    @patch('generation_pipeline.generation_load', return_value=2)
+    def test_default_tier_when_quiet(self, mock_load):
+        """Test the default tier is used below the load threshold."""
+        assert choose_generation_tier() == AppConfig.DEFAULT_GENERATION_TIER
+
+    @patch('generation_pipeline.AppConfig.EXPRESS_TIER_LOAD_THRESHOLD', 8)
+    @patch('generation_pipeline.generation_load', return_value=8)
+    def test_switches_to_express_under_load(self, mock_load):
+        """Test requests without a tier switch to express at the threshold."""
+        assert choose_generation_tier() == "express"
+        assert choose_generation_tier("unknown") == "express"
+
+    @patch('generation_pipeline.AppConfig.EXPRESS_TIER_LOAD_THRESHOLD', 0)
+    @patch('generation_pipeline.generation_load', return_value=100)
+    def test_threshold_zero_disables_switch(self, mock_load):
+        """Test a zero threshold never switches tiers."""
+        assert choose_generation_tier() == AppConfig.DEFAULT_GENERATION_TIER
+        mock_load.assert_not_called()
+
+    @patch('generation_pipeline.AppConfig.EXPRESS_TIER_LOAD_THRESHOLD', 8)
+    @patch('generation_pipeline.generation_load', side_effect=RuntimeError("db down"))
+    def test_load_error_keeps_default(self, mock_load):
+        """Test an unreadable load does not fail the request."""
+        assert choose_generation_tier() == AppConfig.DEFAULT_GENERATION_TIER
+
+
+class TestTierParameters:
+    """Test tiers reach the provider inputs."""
+
+    @pytest.fixture
+    def replicate_generator(self):
+        """Create ReplicateImageGenerator with a mocked client."""
+        from image_generator import ReplicateImageGenerator
+        with patch('image_generator.AppConfig.REPLICATE_API_TOKEN', 'test_token'):
+            with patch('image_generator.get_replicate_client'):
+                gen = ReplicateImageGenerator()
+        gen.client = Mock()
+        prediction = Mock(id="pred-1", status="succeeded", output="http://example.com/avatar.png")
+        gen.client.models.predictions.create.return_value = prediction
+        return gen
+
+    @patch('image_generator.model_versions')
+    def test_replicate_applies_tier_inputs(self, mock_versions, replicate_generator):
+        """Test tier inputs override the Replicate defaults."""
+        mock_versions.get.return_value = None
+
+        replicate_generator.generate("data:image/png;base64,xx", "prompt", params={"prompt_upsampling": False})
+
+        input_params = replicate_generator.client.models.predictions.create.call_args.kwargs["input"]
+        assert input_params["prompt_upsampling"] is False
+
+    @patch('image_generator.latency_percentile', return_value=None)
+    @patch('image_generator.model_versions')
+    def test_replicate_tier_model_override(self, mock_versions, mock_latency, replicate_generator):
+        """Test a tier's model replaces the configured one and is not sent as input."""
+        mock_versions.get.return_value = None
+
+        replicate_generator.generate("data:image/png;base64,xx", "prompt", params={"model": "owner/faster"})
+
+        kwargs = replicate_generator.client.models.predictions.create.call_args.kwargs
+        assert kwargs["model"] == "owner/faster"
+        assert "model" not in kwargs["input"]
+        mock_versions.get.assert_called_once_with(replicate_generator.client, "owner/faster")
+        # Progress is estimated from the tier model's latencies
+        mock_latency.assert_called_once_with("replicate", "owner/faster", 50)
+
+    def test_fal_applies_tier_inputs(self):
+        """Test tier inputs and model override reach the Fal submission."""
+        from fal_service import FalImageGenerator
+        with patch.dict('os.environ', {'FAL_KEY': 'test_key'}):
+            generator = FalImageGenerator()
+        handle = Mock(request_id="req-1")
+        handle.get.return_value = {"images": [{"url": "http://example.com/avatar.png"}]}
+
+        with patch('fal_service.fal_client.submit', return_value=handle) as mock_submit, \
+                patch.object(generator, '_wait_for_completion', return_value=True) as mock_wait, \
+                patch.object(generator, '_image_input', return_value="https://fal.media/input.png"), \
+                patch.object(generator, '_load_result_image', return_value=Image.new('RGB', (10, 10))):
+            _, _, error = generator.generate_avatar(
+                Image.new('RGB', (10, 10)), "prompt",
+                params={"model": "fal-ai/fast", "num_inference_steps": 14}
+            )
+
+        assert error is None
+        assert mock_submit.call_args.args[0] == "fal-ai/fast"
+        assert mock_submit.call_args.kwargs["arguments"]["num_inference_steps"] == 14
+        assert mock_wait.call_args.args[-1] == "fal-ai/fast"
+
+    def test_fal_cancel_uses_submitted_model(self):
+        """Test a tier request is cancelled at the endpoint it was submitted to."""
+        from fal_service import FalImageGenerator
+        with patch.dict('os.environ', {'FAL_KEY': 'test_key'}):
+            generator = FalImageGenerator()
+
+        with patch('fal_service.fal_client.cancel') as mock_cancel:
+            generator.cancel("req-1", "fal-ai/flux-pro/kontext/max")
+            generator.cancel("req-2")
+
+        assert mock_cancel.call_args_list[0].args == ("fal-ai/flux-pro/kontext/max", "req-1")
+        assert mock_cancel.call_args_list[1].args == (generator.model_name, "req-2")
+
+    def test_image_generator_models_follow_tier(self):
+        """Test routing and latency stats see the tier's model."""
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.generators = {"replicate": Mock(model_name="replicate-model")}
+
+        gen.tier = "standard"
+        assert gen.models == {"replicate": "replicate-model"}
+        gen.tier = "premium"
+        assert gen.models == {"replicate": AppConfig.GENERATION_TIERS["premium"]["replicate"]["model"]}
+
+    def test_unknown_tier_rejected(self):
+        """Test ImageGenerator refuses an unknown tier."""
+        with pytest.raises(ValueError):
+            ImageGenerator(tier="turbo")
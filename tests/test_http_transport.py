@@ -0,0 +1,59 @@
+"""Tests for the shared HTTP transport."""
+
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+from http_transport import HTTPTransport, _get_client
+from metrics import metrics
+
+
+class TestHTTPTransport:
+    """Test HTTPTransport."""
+    
+    @pytest.fixture
+    def transport(self):
+        """Create a transport with small pools."""
+        return HTTPTransport(pool_hosts=2, pool_size=4, connect_timeout=1, read_timeout=2)
+    
+    def test_session_is_shared_and_pooled(self, transport):
+        """Test one session with sized pools serves every request."""
+        session = transport.session
+        assert transport.session is session
+        
+        adapter = session.get_adapter("https://api.replicate.com")
+        assert adapter._pool_maxsize == 4
+    
+    def test_request_applies_default_timeout_and_metrics(self, transport):
+        """Test default timeouts and per-host metrics."""
+        metrics.reset()
+        response = Mock(status_code=200)
+        
+        with patch.object(requests.Session, 'request', return_value=response) as mock_request:
+            assert transport.get("https://fal.media/a.png") is response
+        
+        assert mock_request.call_args.kwargs["timeout"] == (1, 2)
+        assert metrics.get_counter("http_requests_total", host="fal.media", status=200) == 1
+    
+    def test_request_errors_are_counted(self, transport):
+        """Test connection failures are counted per host."""
+        metrics.reset()
+        
+        with patch.object(requests.Session, 'request', side_effect=requests.ConnectionError("down")):
+            with pytest.raises(requests.ConnectionError):
+                transport.post("https://example.databricks.com/serving")
+        
+        assert metrics.get_counter(
+            "http_request_errors_total", host="example.databricks.com", error="ConnectionError"
+        ) == 1
+
+
+def test_sdk_clients_are_cached():
+    """Test SDK clients are created once per credentials."""
+    factory = Mock(side_effect=lambda: object())
+    
+    first = _get_client("test", "key-1", factory)
+    assert _get_client("test", "key-1", factory) is first
+    assert _get_client("test", "key-2", factory) is not first
+    assert factory.call_count == 2
@@ -0,0 +1,87 @@
+"""Tests for streamed generated-image downloads."""
+
+import io
+from unittest.mock import Mock, patch
+
+import pytest
+from PIL import Image
+
+from image_download import ImageTooLargeError, decode_image_stream, download_image
+from metrics import metrics
+
+
+def _png_bytes(size=(64, 64)):
+    buffered = io.BytesIO()
+    Image.new('RGB', size, color='green').save(buffered, format='PNG')
+    return buffered.getvalue()
+
+
+def _chunks(data, size=100):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestDecodeImageStream:
+    """Test incremental decoding with limits."""
+    
+    def test_decodes_chunks(self):
+        """Test an image split into chunks decodes."""
+        image = decode_image_stream(_chunks(_png_bytes()))
+        assert image.size == (64, 64)
+    
+    def test_rejects_too_many_bytes(self):
+        """Test the byte cap stops the download."""
+        data = _png_bytes()
+        with pytest.raises(ImageTooLargeError, match="byte limit"):
+            decode_image_stream(_chunks(data), max_bytes=len(data) - 1)
+    
+    def test_rejects_too_many_pixels(self):
+        """Test the pixel cap is checked from the header."""
+        consumed = []
+        
+        def chunks():
+            for chunk in _chunks(_png_bytes((200, 200)), size=50):
+                consumed.append(chunk)
+                yield chunk
+        
+        with pytest.raises(ImageTooLargeError, match="pixel limit"):
+            decode_image_stream(chunks(), max_pixels=100 * 100)
+        
+        # Rejected before the whole image arrived
+        assert len(consumed) < len(_chunks(_png_bytes((200, 200)), size=50))
+
+
+class TestDownloadImage:
+    """Test downloading generated images."""
+    
+    def _response(self, data, headers=None):
+        response = Mock()
+        response.headers = headers or {}
+        response.iter_content.return_value = _chunks(data)
+        return response
+    
+    @patch('image_download.http_transport.get')
+    def test_download_records_metrics(self, mock_get):
+        """Test bytes and time-to-first-byte are recorded."""
+        metrics.reset()
+        data = _png_bytes()
+        mock_get.return_value = self._response(data)
+        
+        image = download_image("https://example.com/a.png", "fal")
+        
+        assert image.size == (64, 64)
+        assert mock_get.call_args.kwargs["stream"] is True
+        snapshot = metrics.snapshot()
+        assert snapshot["observations"]["image_download_bytes{provider=fal}"]["sum"] == len(data)
+        assert "image_download_ttfb_seconds{provider=fal}" in snapshot["observations"]
+        mock_get.return_value.close.assert_called_once()
+    
+    @patch('image_download.http_transport.get')
+    def test_declared_length_rejected_up_front(self, mock_get):
+        """Test oversized Content-Length is rejected before reading."""
+        response = self._response(_png_bytes(), headers={"Content-Length": str(10**10)})
+        mock_get.return_value = response
+        
+        with pytest.raises(ImageTooLargeError):
+            download_image("https://example.com/a.png", "replicate")
+        
+        response.iter_content.assert_not_called()
@@ -0,0 +1,88 @@
+"""Tests for input image encoding profiles."""
+
+import base64
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from config import AppConfig
+from image_encoding import (
+    InlineImage,
+    StreamingJSONBody,
+    encode_data_uri,
+    encode_image,
+    get_encoding_profile
+)
+
+
+@pytest.fixture
+def test_image():
+    """Create a test image."""
+    return Image.new('RGB', (64, 64), color='red')
+
+
+class TestEncodingProfiles:
+    """Test encoding profiles."""
+    
+    @pytest.mark.parametrize("profile", list(AppConfig.INPUT_ENCODING_PROFILES))
+    def test_profiles_roundtrip(self, test_image, profile):
+        """Test every profile produces a decodable image of its MIME type."""
+        data, mime_type = encode_image(test_image, profile)
+        decoded = Image.open(io.BytesIO(data))
+        
+        assert decoded.size == (64, 64)
+        assert mime_type == f"image/{decoded.format.lower()}"
+    
+    def test_jpeg_converts_alpha(self):
+        """Test RGBA photos can be encoded as JPEG."""
+        data, mime_type = encode_image(Image.new('RGBA', (8, 8)), "jpeg-hq")
+        assert mime_type == "image/jpeg"
+        assert Image.open(io.BytesIO(data)).mode == "RGB"
+    
+    def test_data_uri(self, test_image):
+        """Test data URIs carry the profile's MIME type."""
+        uri = encode_data_uri(test_image, "jpeg-hq")
+        header, encoded = uri.split(",", 1)
+        
+        assert header == "data:image/jpeg;base64"
+        assert Image.open(io.BytesIO(base64.b64decode(encoded))).size == (64, 64)
+    
+    def test_unknown_profile(self):
+        """Test unknown profiles are rejected."""
+        with pytest.raises(ValueError, match="Unknown encoding profile"):
+            get_encoding_profile("gif")
+
+
+class TestStreamingJSONBody:
+    """Test streamed JSON request bodies."""
+    
+    def test_body_matches_json_serialization(self, test_image):
+        """Test the streamed body equals the equivalent json.dumps output."""
+        image = InlineImage(test_image, "png")
+        payload = {"messages": [{"content": [{"type": "text", "text": "hi \"there\""},
+                                             {"image_url": {"url": image}}]}], "max_tokens": 300}
+        
+        body = StreamingJSONBody(payload, chunk_size=10)
+        streamed = b"".join(body)
+        
+        expected = json.dumps({"messages": [{"content": [{"type": "text", "text": "hi \"there\""},
+                                                         {"image_url": {"url": encode_data_uri(test_image)}}]}],
+                               "max_tokens": 300})
+        assert streamed == expected.encode()
+        assert len(body) == len(streamed)
+    
+    def test_body_is_streamed_in_chunks(self, test_image):
+        """Test no chunk holds the whole base64 image."""
+        image = InlineImage(Image.effect_noise((128, 128), 50).convert('RGB'))
+        body = StreamingJSONBody({"url": image}, chunk_size=3 * 1024)
+        
+        chunks = list(body)
+        assert max(len(chunk) for chunk in chunks) <= 4 * 1024
+        assert len(chunks) > 3
+    
+    def test_body_can_be_resent(self, test_image):
+        """Test the body can be iterated again for retries."""
+        body = StreamingJSONBody({"url": InlineImage(test_image)})
+        assert b"".join(body) == b"".join(body)
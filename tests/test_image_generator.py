@@ -5,6 +5,7 @@ from unittest.mock import Mock, patch, MagicMock
 import pytest
 from PIL import Image
 import io
+import base64
 
 from image_generator import ImageGenerator
 
@@ -53,7 +54,7 @@ class TestImageGenerator:
         assert base64_str.startswith("data:image/png;base64,")
         assert len(base64_str) > 100
     
-    @patch('requests.get')
+    @patch('image_download.http_transport.get')
     def test_download_image(self, mock_get, generator):
         """Test image download."""
         # Create a mock response with image data
@@ -63,7 +64,8 @@ class TestImageGenerator:
         test_image_bytes.seek(0)
         
         mock_response = Mock()
-        mock_response.content = test_image_bytes.getvalue()
+        mock_response.iter_content.return_value = [test_image_bytes.getvalue()]
+        mock_response.headers = {}
         mock_response.raise_for_status = Mock()
         mock_get.return_value = mock_response
         
@@ -98,7 +100,7 @@ class TestImageGenerator:
         
         assert result is None
     
-    @patch('requests.get')
+    @patch('image_download.http_transport.get')
     def test_generate_avatar_success(self, mock_get, generator, test_image):
         """Test successful avatar generation."""
         # Mock the model output
@@ -111,7 +113,8 @@ class TestImageGenerator:
         avatar_bytes.seek(0)
         
         mock_response = Mock()
-        mock_response.content = avatar_bytes.getvalue()
+        mock_response.iter_content.return_value = [avatar_bytes.getvalue()]
+        mock_response.headers = {}
         mock_response.raise_for_status = Mock()
         mock_get.return_value = mock_response
         
@@ -169,4 +172,365 @@ class TestImageGenerator:
             
             assert result_img is not None
             assert error is None
-            assert generator.client.run.call_count == 3
\ No newline at end of file
+            assert generator.client.run.call_count == 3
+
+class TestReplicateImageGenerator:
+    """Test ReplicateImageGenerator prediction lifecycle."""
+    
+    @pytest.fixture
+    def replicate_generator(self):
+        """Create ReplicateImageGenerator with mocked client."""
+        from image_generator import ReplicateImageGenerator
+        with patch('image_generator.AppConfig.REPLICATE_API_TOKEN', 'test_token'):
+            with patch('replicate.Client'):
+                gen = ReplicateImageGenerator()
+                gen.client = Mock()
+                return gen
+    
+    def _prediction(self, status="succeeded", output="http://example.com/avatar.png"):
+        prediction = Mock()
+        prediction.id = "pred-123"
+        prediction.status = status
+        prediction.output = output
+        return prediction
+    
+    def test_generate_records_new_prediction(self, replicate_generator):
+        """Test new predictions are reported through on_prediction."""
+        replicate_generator.client.models.predictions.create.return_value = self._prediction()
+        on_prediction = Mock()
+        
+        result = replicate_generator.generate("data:image/png;base64,xx", "prompt", on_prediction=on_prediction)
+        
+        assert result == "http://example.com/avatar.png"
+        on_prediction.assert_called_once_with("pred-123")
+    
+    def test_generate_reattaches_to_prediction(self, replicate_generator):
+        """Test resuming an in-flight prediction does not create a new one."""
+        replicate_generator.client.predictions.get.return_value = self._prediction()
+        
+        result = replicate_generator.generate(None, "prompt", prediction_id="pred-123")
+        
+        assert result == "http://example.com/avatar.png"
+        replicate_generator.client.predictions.get.assert_called_once_with("pred-123")
+        replicate_generator.client.models.predictions.create.assert_not_called()
+    
+    def test_generate_failed_prediction_raises(self, replicate_generator):
+        """Test failed predictions raise."""
+        replicate_generator.client.models.predictions.create.return_value = self._prediction(status="failed")
+        
+        with pytest.raises(Exception):
+            replicate_generator.generate("data:image/png;base64,xx", "prompt")
+    
+    def test_generate_polls_until_finished(self, replicate_generator):
+        """Test predictions are polled and progress is reported."""
+        prediction = self._prediction(status="starting")
+        prediction.progress = None
+        statuses = iter(["processing", "succeeded"])
+        prediction.reload.side_effect = lambda: setattr(prediction, "status", next(statuses))
+        replicate_generator.client.models.predictions.create.return_value = prediction
+        progress = Mock()
+        
+        with patch('image_generator.time.sleep'):
+            result = replicate_generator.generate(
+                "data:image/png;base64,xx", "prompt", progress_callback=progress
+            )
+        
+        assert result == "http://example.com/avatar.png"
+        assert prediction.reload.call_count == 2
+        assert progress.call_args_list[0].args == (25, "Warming up the AI model...")
+        assert progress.call_args_list[-1].args[0] == 75
+    
+    def test_generate_cancels_prediction(self, replicate_generator):
+        """Test setting the cancel event cancels the running prediction."""
+        import threading
+        from image_generator import PredictionCancelled
+        
+        prediction = self._prediction(status="processing")
+        replicate_generator.client.models.predictions.create.return_value = prediction
+        cancel_event = threading.Event()
+        cancel_event.set()
+        
+        with pytest.raises(PredictionCancelled):
+            replicate_generator.generate("data:image/png;base64,xx", "prompt", cancel_event=cancel_event)
+        
+        prediction.cancel.assert_called_once()
+    
+    def test_generate_cancels_prediction_at_deadline(self, replicate_generator):
+        """Test a prediction still running at the deadline is cancelled."""
+        from deadline import Deadline, DeadlineExceeded
+        
+        prediction = self._prediction(status="processing")
+        replicate_generator.client.models.predictions.create.return_value = prediction
+        
+        with pytest.raises(DeadlineExceeded):
+            replicate_generator.generate("data:image/png;base64,xx", "prompt", deadline=Deadline(0))
+        
+        prediction.cancel.assert_called_once()
+
+
+    def test_generate_returns_file_output(self, replicate_generator):
+        """Test HTTPS outputs are returned as readable file outputs."""
+        from replicate.helpers import FileOutput
+        replicate_generator.client.models.predictions.create.return_value = self._prediction(
+            output=["https://replicate.delivery/avatar.png"]
+        )
+        
+        result = replicate_generator.generate("data:image/png;base64,xx", "prompt")
+        
+        assert isinstance(result, FileOutput)
+        assert result.url == "https://replicate.delivery/avatar.png"
+    
+    def test_upload_image_returns_file_url(self, replicate_generator):
+        """Test input photos are uploaded to Replicate file storage."""
+        uploaded = Mock()
+        uploaded.urls = {"get": "https://api.replicate.com/v1/files/abc/download"}
+        replicate_generator.client.files.create.return_value = uploaded
+        
+        url = replicate_generator.upload_image(Image.new('RGB', (8, 8)))
+        
+        assert url == "https://api.replicate.com/v1/files/abc/download"
+        assert replicate_generator.client.files.create.call_args.kwargs["content_type"] == "image/png"
+
+
+class TestOutputLoading:
+    """Test decoding Replicate outputs."""
+    
+    @pytest.fixture
+    def generator(self):
+        """Create ImageGenerator without providers."""
+        return ImageGenerator.__new__(ImageGenerator)
+    
+    def test_file_output_is_decoded_without_download(self, generator):
+        """Test file outputs are streamed into the decoder."""
+        from replicate.helpers import FileOutput
+        buffered = io.BytesIO()
+        Image.new('RGB', (16, 16), color='green').save(buffered, format='PNG')
+        data_url = "data:image/png;base64," + base64.b64encode(buffered.getvalue()).decode()
+        
+        with patch('image_download.http_transport.get') as mock_get:
+            image = generator._load_output(FileOutput(data_url, Mock()))
+        
+        mock_get.assert_not_called()
+        assert image.size == (16, 16)
+        assert image.getpixel((0, 0)) == (0, 128, 0)
+    
+    def test_string_output_is_downloaded(self, generator):
+        """Test legacy URL outputs fall back to a download."""
+        with patch.object(generator, '_download_image', return_value="image") as mock_download:
+            assert generator._load_output("http://example.com/avatar.png") == "image"
+        mock_download.assert_called_once_with("http://example.com/avatar.png", None)
+
+
+class TestHedgedGeneration:
+    """Test hedged Replicate/Fal generation."""
+    
+    @pytest.fixture
+    def hedged_generator(self):
+        """Create a hedged ImageGenerator with mocked providers."""
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        gen.provider = "replicate"
+        gen.generators = {"replicate": Mock(model_name="replicate-model"), "fal": Mock(model_name="fal-model")}
+        gen.generator = gen.generators["replicate"]
+        return gen
+    
+    def test_primary_wins_before_hedge(self, hedged_generator):
+        """Test no hedge is sent when the primary is fast."""
+        primary_image = Image.new('RGB', (10, 10), color='red')
+        calls = []
+        
+        def fake_generate(provider, *args, **kwargs):
+            calls.append(provider)
+            return primary_image
+        
+        with patch.object(hedged_generator, '_generate_with_provider', side_effect=fake_generate):
+            with patch('image_generator.latency_percentile', return_value=5.0):
+                result = hedged_generator._generate_hedged(None, "prompt", "Thor", "Red", "Mustang", 1)
+        
+        assert result is primary_image
+        assert calls == ["replicate"]
+    
+    def test_hedge_wins_and_cancels_primary(self, hedged_generator):
+        """Test a slow primary is hedged and cancelled."""
+        import threading
+        fal_image = Image.new('RGB', (10, 10), color='blue')
+        release = threading.Event()
+        
+        def fake_generate(provider, *args, on_prediction=None, **kwargs):
+            on_prediction(provider, f"{provider}-pred")
+            if provider == "replicate":
+                release.wait(5)
+                raise RuntimeError("cancelled")
+            return fal_image
+        
+        on_prediction = Mock()
+        with patch.object(hedged_generator, '_generate_with_provider', side_effect=fake_generate):
+            with patch('image_generator.latency_percentile', return_value=0.05):
+                result = hedged_generator._generate_hedged(
+                    None, "prompt", "Thor", "Red", "Mustang", 1, on_prediction=on_prediction
+                )
+        release.set()
+        
+        assert result is fal_image
+        hedged_generator.generator.cancel.assert_called_once_with("replicate-pred", "replicate-model")
+        # Only the winner is stored for reattaching
+        on_prediction.assert_called_once_with("fal", "fal-pred")
+    
+    def test_primary_failure_fails_over_immediately(self, hedged_generator):
+        """Test a failed primary triggers the hedge without waiting."""
+        fal_image = Image.new('RGB', (10, 10), color='blue')
+        
+        def fake_generate(provider, *args, **kwargs):
+            if provider == "replicate":
+                raise RuntimeError("Replicate down")
+            return fal_image
+        
+        with patch.object(hedged_generator, '_generate_with_provider', side_effect=fake_generate):
+            with patch('image_generator.latency_percentile', return_value=30.0):
+                result = hedged_generator._generate_hedged(None, "prompt", "Thor", "Red", "Mustang", 1)
+        
+        assert result is fal_image
+
+
+class TestCircuitBreakerFailover:
+    """Test failover when a provider's circuit breaker is open."""
+    
+    def test_fallback_skips_open_breakers(self):
+        """Test the fallback provider must be accepting requests."""
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        gen.provider = "replicate"
+        gen.generators = {"replicate": Mock(), "fal": Mock()}
+        
+        open_breaker = Mock()
+        open_breaker.is_available.return_value = False
+        closed_breaker = Mock()
+        closed_breaker.is_available.return_value = True
+        
+        with patch('image_generator.get_circuit_breaker', return_value=closed_breaker):
+            assert gen._fallback_provider("replicate") == "fal"
+        with patch('image_generator.get_circuit_breaker', return_value=open_breaker):
+            assert gen._fallback_provider("replicate") is None
+    
+    @pytest.mark.parametrize("stage, failure_recorded", [("provider", True), ("download", False)])
+    def test_provider_deadline_counts_as_failure(self, stage, failure_recorded):
+        """Test a prediction that uses up the provider budget trips the breaker."""
+        from deadline import DeadlineExceeded
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        replicate = Mock(model_name="replicate-model")
+        replicate.generate_outputs.side_effect = DeadlineExceeded(stage)
+        breaker = Mock()
+        
+        with patch('image_generator.get_circuit_breaker', return_value=breaker), \
+                patch.object(gen, '_image_input', return_value="data:image/png;base64,xx"):
+            with pytest.raises(DeadlineExceeded):
+                gen._run_provider(
+                    "replicate", replicate, Image.new('RGB', (8, 8)), "prompt",
+                    "Thor", "Red", "Mustang", 1, None, None
+                )
+        
+        assert breaker.record_failure.called is failure_recorded
+    
+    def test_expired_deadline_leaves_probe_free(self, clock):
+        """Test running out of time before the call never takes the half-open probe."""
+        from circuit_breaker import CircuitBreaker
+        from deadline import Deadline, DeadlineExceeded
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        breaker = CircuitBreaker("probe-test", failure_threshold=1, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        clock.now = 31
+        
+        with patch('image_generator.get_circuit_breaker', return_value=breaker):
+            with pytest.raises(DeadlineExceeded):
+                gen._run_provider(
+                    "replicate", Mock(), Image.new('RGB', (8, 8)), "prompt",
+                    "Thor", "Red", "Mustang", 1, None, None, deadline=Deadline(0)
+                )
+        
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+
+
+class TestGenerationVariants:
+    """Test extra outputs kept for an instant Regenerate."""
+    
+    @pytest.fixture
+    def generator(self):
+        """Create a Replicate-only ImageGenerator requesting two variants."""
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 2
+        gen.seed = -1
+        gen.provider = "replicate"
+        gen.generators = {"replicate": Mock(model_name="replicate-model", input_encoding="png")}
+        gen.generator = gen.generators["replicate"]
+        return gen
+    
+    def test_replicate_returns_every_output(self):
+        """Test one prediction requests and returns several outputs."""
+        from image_generator import ReplicateImageGenerator
+        with patch('image_generator.AppConfig.REPLICATE_API_TOKEN', 'test_token'):
+            with patch('image_generator.get_replicate_client'):
+                gen = ReplicateImageGenerator()
+        gen.client = Mock()
+        gen.client.models.predictions.create.return_value = Mock(
+            id="pred-1", status="succeeded", output=["http://example.com/a.png", "http://example.com/b.png"]
+        )
+        
+        with patch('image_generator.model_versions') as mock_versions:
+            mock_versions.get.return_value = None
+            outputs = gen.generate_outputs("data:image/png;base64,xx", "prompt", num_outputs=2)
+        
+        assert outputs == ["http://example.com/a.png", "http://example.com/b.png"]
+        assert gen.client.models.predictions.create.call_args.kwargs["input"]["num_outputs"] == 2
+    
+    def test_variants_are_finished_and_attached(self, generator):
+        """Test extra outputs get commentary and overlays and ride along on the avatar."""
+        replicate = generator.generators["replicate"]
+        replicate.generate_outputs.return_value = ["first", "second"]
+        images = {"first": Image.new('RGB', (8, 8), 'red'), "second": Image.new('RGB', (8, 8), 'blue')}
+        
+        with patch('image_generator.get_circuit_breaker', return_value=Mock()), \
+                patch.object(generator, '_image_input', return_value="data:image/png;base64,xx"), \
+                patch.object(generator, '_load_output', side_effect=lambda output, deadline=None: images[output].copy()), \
+                patch.object(generator, '_add_logo_overlays', side_effect=lambda image: image), \
+                patch('image_generator.get_claude_commentary', return_value=(0.9, "Nice")):
+            avatar, _, error = generator.generate_avatar(Image.new('RGB', (64, 64)), "Thor", "Red", "Mustang")
+        
+        assert error is None
+        assert avatar.getpixel((0, 0)) == (255, 0, 0)
+        assert len(avatar.variants) == 1
+        assert avatar.variants[0].getpixel((0, 0)) == (0, 0, 255)
+        assert avatar.variants[0].commentary == "Nice"
+        assert replicate.generate_outputs.call_args.kwargs["num_outputs"] == 2
+    
+    def test_failed_variant_is_dropped(self, generator):
+        """Test a variant that fails post-processing does not fail the avatar."""
+        replicate = generator.generators["replicate"]
+        replicate.generate_outputs.return_value = ["first", "second"]
+        
+        def overlay(image):
+            if image.getpixel((0, 0)) == (0, 0, 255):
+                raise RuntimeError("overlay failed")
+            return image
+        
+        images = {"first": Image.new('RGB', (8, 8), 'red'), "second": Image.new('RGB', (8, 8), 'blue')}
+        with patch('image_generator.get_circuit_breaker', return_value=Mock()), \
+                patch.object(generator, '_image_input', return_value="data:image/png;base64,xx"), \
+                patch.object(generator, '_load_output', side_effect=lambda output, deadline=None: images[output].copy()), \
+                patch.object(generator, '_add_logo_overlays', side_effect=overlay), \
+                patch('image_generator.get_claude_commentary', return_value=(0.9, "Nice")):
+            avatar, _, error = generator.generate_avatar(Image.new('RGB', (64, 64)), "Thor", "Red", "Mustang")
+        
+        assert error is None
+        assert avatar.variants == []
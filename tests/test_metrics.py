@@ -0,0 +1,38 @@
+"""Tests for the in-process metrics registry."""
+
+from metrics import MetricsRegistry
+
+
+def test_counters_and_labels():
+    """Test counters are tracked per label set."""
+    registry = MetricsRegistry()
+    registry.increment("requests_total", provider="fal")
+    registry.increment("requests_total", provider="fal")
+    registry.increment("requests_total", 5, provider="replicate")
+    
+    assert registry.get_counter("requests_total", provider="fal") == 2
+    assert registry.get_counter("requests_total", provider="replicate") == 5
+    assert registry.get_counter("requests_total", provider="other") == 0
+    assert "requests_total{provider=fal}" in registry.snapshot()["counters"]
+
+
+def test_gauges():
+    """Test gauges keep the latest value."""
+    registry = MetricsRegistry()
+    assert registry.get_gauge("queue_depth") == (False, 0)
+    registry.set_gauge("queue_depth", 3)
+    registry.set_gauge("queue_depth", 1)
+    assert registry.get_gauge("queue_depth") == (True, 1)
+
+
+def test_observations():
+    """Test observation summaries."""
+    registry = MetricsRegistry()
+    for value in [1.0, 3.0, 2.0]:
+        registry.observe("latency_seconds", value, stage="download")
+    
+    summary = registry.snapshot()["observations"]["latency_seconds{stage=download}"]
+    assert summary == {"count": 3, "sum": 6.0, "max": 3.0}
+    
+    registry.reset()
+    assert registry.snapshot()["observations"] == {}
@@ -0,0 +1,131 @@
+"""Tests for Replicate model version pinning."""
+
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+from replicate.exceptions import ReplicateError
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from model_versions import ModelVersionCache
+
+
+def _client(*version_ids):
+    client = Mock()
+    client.models.get.side_effect = [Mock(latest_version=Mock(id=version_id)) for version_id in version_ids]
+    return client
+
+
+class TestModelVersionCache:
+    """Test ModelVersionCache."""
+    
+    def test_version_resolved_once_and_pinned(self):
+        """Test the latest version is looked up once and reused."""
+        cache = ModelVersionCache()
+        client = _client("v1", "v2")
+        
+        assert cache.get(client, "owner/model") == "v1"
+        assert cache.get(client, "owner/model") == "v1"
+        client.models.get.assert_called_once_with("owner/model")
+    
+    def test_refresh_picks_up_new_version(self):
+        """Test a requested refresh resolves the latest version again."""
+        cache = ModelVersionCache()
+        client = _client("v1", "v2")
+        cache.get(client, "owner/model")
+        
+        cache.refresh()
+        
+        assert cache.get(client, "owner/model") == "v2"
+    
+    def test_ttl_expiry_keeps_pin_when_lookup_fails(self):
+        """Test an expired pin is kept if the refresh lookup fails."""
+        cache = ModelVersionCache(ttl_seconds=60)
+        client = Mock()
+        client.models.get.side_effect = [Mock(latest_version=Mock(id="v1")), RuntimeError("offline")]
+        
+        with patch('model_versions.time.time', return_value=1000.0):
+            assert cache.get(client, "owner/model") == "v1"
+        with patch('model_versions.time.time', return_value=1100.0):
+            assert cache.get(client, "owner/model") == "v1"
+        assert client.models.get.call_count == 2
+    
+    def test_lookup_does_not_block_other_models(self):
+        """Test a slow lookup holds up only callers of the same model."""
+        cache = ModelVersionCache()
+        cache.get(_client("cached"), "owner/cached")
+        started = threading.Event()
+        release = threading.Event()
+        
+        def slow_lookup(model_name):
+            started.set()
+            release.wait(5)
+            return Mock(latest_version=Mock(id="v1"))
+        
+        client = Mock()
+        client.models.get.side_effect = slow_lookup
+        results = []
+        callers = [threading.Thread(target=lambda: results.append(cache.get(client, "owner/slow"))) for _ in range(2)]
+        callers[0].start()
+        assert started.wait(5)
+        callers[1].start()
+        
+        assert cache.get(Mock(), "owner/cached") == "cached"
+        release.set()
+        for caller in callers:
+            caller.join(5)
+        assert results == ["v1", "v1"]
+        client.models.get.assert_called_once_with("owner/slow")
+    
+    def test_explicit_version_needs_no_lookup(self):
+        """Test "owner/model:version" names are already pinned."""
+        client = Mock()
+        assert ModelVersionCache().get(client, "owner/model:abc123") == "abc123"
+        client.models.get.assert_not_called()
+
+
+class TestPinnedPredictions:
+    """Test ReplicateImageGenerator runs the pinned version."""
+    
+    @pytest.fixture
+    def replicate_generator(self):
+        """Create ReplicateImageGenerator with a mocked client."""
+        from image_generator import ReplicateImageGenerator
+        with patch('image_generator.AppConfig.REPLICATE_API_TOKEN', 'test_token'):
+            with patch('image_generator.get_replicate_client', return_value=Mock()):
+                gen = ReplicateImageGenerator()
+        gen.model_name = "owner/model"
+        return gen
+    
+    def _prediction(self):
+        return Mock(id="pred-1", status="succeeded", output="http://example.com/avatar.png")
+    
+    def test_prediction_uses_pinned_version(self, replicate_generator):
+        """Test predictions are created on the resolved version."""
+        replicate_generator.client.predictions.create.return_value = self._prediction()
+        
+        with patch('image_generator.model_versions', ModelVersionCache()) as cache:
+            with patch.object(cache, '_resolve', return_value="v1"):
+                replicate_generator.generate("data:image/png;base64,xx", "prompt")
+        
+        assert replicate_generator.client.predictions.create.call_args.kwargs["version"] == "v1"
+        replicate_generator.client.models.predictions.create.assert_not_called()
+    
+    def test_version_rejection_falls_back_to_model_endpoint(self, replicate_generator):
+        """Test models that refuse pinned versions run by name from then on."""
+        replicate_generator.client.predictions.create.side_effect = ReplicateError(
+            status=422, detail="Invalid version or not permitted"
+        )
+        replicate_generator.client.models.predictions.create.return_value = self._prediction()
+        cache = ModelVersionCache()
+        
+        with patch('image_generator.model_versions', cache):
+            with patch.object(cache, '_resolve', return_value="v1"):
+                replicate_generator.generate("data:image/png;base64,xx", "prompt")
+                replicate_generator.generate("data:image/png;base64,xx", "prompt")
+        
+        assert replicate_generator.client.predictions.create.call_count == 1
+        assert replicate_generator.client.models.predictions.create.call_count == 2
@@ -0,0 +1,71 @@
+"""Tests for latency-aware provider routing."""
+
+import random
+from unittest.mock import patch
+
+import pytest
+
+from provider_router import ProviderRouter
+from provider_stats import ProviderStats
+
+
+@pytest.fixture
+def stats():
+    """Isolated statistics per provider."""
+    registry = {}
+    
+    def get_stats(provider, model):
+        return registry.setdefault((provider, model), ProviderStats())
+    
+    with patch('provider_router.get_provider_stats', side_effect=get_stats):
+        yield get_stats
+
+
+CANDIDATES = {"replicate": "flux-replicate", "fal": "flux-fal"}
+
+
+def _router(exploration_rate=0.0):
+    return ProviderRouter("replicate", exploration_rate, min_samples=3, rng=random.Random(1))
+
+
+def test_single_candidate():
+    """Test a single provider is always chosen."""
+    assert _router().choose({"fal": "flux-fal"}) == "fal"
+
+
+def test_default_until_warm(stats):
+    """Test the default provider is used before statistics exist."""
+    assert _router().choose(CANDIDATES) == "replicate"
+
+
+def test_prefers_faster_provider(stats):
+    """Test the provider with the best expected time wins."""
+    for _ in range(3):
+        stats("replicate", "flux-replicate").record_success(40.0)
+        stats("fal", "flux-fal").record_success(15.0)
+    
+    assert _router().choose(CANDIDATES) == "fal"
+
+
+def test_avoids_failing_provider(stats):
+    """Test error rate outweighs raw latency."""
+    for _ in range(3):
+        stats("replicate", "flux-replicate").record_success(30.0)
+        stats("fal", "flux-fal").record_success(10.0)
+    for _ in range(20):
+        stats("fal", "flux-fal").record_failure()
+    
+    assert _router().choose(CANDIDATES) == "replicate"
+
+
+def test_exploration_traffic(stats):
+    """Test some traffic still reaches the slower provider."""
+    for _ in range(3):
+        stats("replicate", "flux-replicate").record_success(40.0)
+        stats("fal", "flux-fal").record_success(15.0)
+    
+    router = _router(exploration_rate=0.5)
+    choices = [router.choose(CANDIDATES) for _ in range(200)]
+    
+    assert "replicate" in choices
+    assert choices.count("fal") > choices.count("replicate")
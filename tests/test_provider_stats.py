@@ -0,0 +1,82 @@
+"""Tests for provider latency statistics."""
+
+from unittest.mock import patch
+
+from provider_stats import (
+    LatencyWindow,
+    ProviderStats,
+    get_all_stats,
+    latency_percentile,
+    record_latency
+)
+
+
+class TestLatencyWindow:
+    """Test LatencyWindow class."""
+    
+    def test_empty_window(self):
+        """Test percentile of an empty window."""
+        assert LatencyWindow().percentile(90) is None
+    
+    def test_percentiles(self):
+        """Test percentile selection."""
+        window = LatencyWindow()
+        for seconds in range(1, 101):
+            window.record(float(seconds))
+        
+        assert window.percentile(0) == 1.0
+        assert window.percentile(50) in (50.0, 51.0)
+        assert window.percentile(90) in (90.0, 91.0)
+        assert window.percentile(100) == 100.0
+    
+    def test_window_is_bounded(self):
+        """Test old samples are dropped."""
+        window = LatencyWindow(size=3)
+        for seconds in [100.0, 1.0, 2.0, 3.0]:
+            window.record(seconds)
+        
+        assert len(window) == 3
+        assert window.percentile(100) == 3.0
+
+
+def test_latency_percentile_requires_min_samples():
+    """Test the percentile is withheld until enough samples exist."""
+    with patch('provider_stats.AppConfig.LATENCY_MIN_SAMPLES', 3):
+        record_latency("test-provider", "model", 10.0)
+        assert latency_percentile("test-provider", "model", 90) is None
+        record_latency("test-provider", "model", 20.0)
+        record_latency("test-provider", "model", 30.0)
+        assert latency_percentile("test-provider", "model", 90) == 30.0
+    
+    assert "test-provider/model" in get_all_stats()
+
+
+class TestProviderStats:
+    """Test ProviderStats class."""
+    
+    def test_error_rate(self):
+        """Test error rate over recent outcomes."""
+        stats = ProviderStats()
+        stats.record_success(10.0)
+        stats.record_failure()
+        
+        assert stats.samples == 2
+        assert stats.error_rate() == 0.5
+    
+    def test_expected_completion_time_accounts_for_errors(self):
+        """Test errors inflate the expected completion time."""
+        healthy, flaky = ProviderStats(), ProviderStats()
+        for _ in range(4):
+            healthy.record_success(10.0)
+            flaky.record_success(10.0)
+        for _ in range(4):
+            flaky.record_failure()
+        
+        assert healthy.expected_completion_time() == 10.0
+        assert flaky.expected_completion_time() == 20.0
+    
+    def test_no_successes(self):
+        """Test expected time is unknown without successes."""
+        stats = ProviderStats()
+        stats.record_failure()
+        assert stats.expected_completion_time() is None
@@ -0,0 +1,258 @@
+"""Tests for the generation result cache."""
+
+import io
+import sys
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from image_generator import ImageGenerator
+from metrics import metrics
+from result_cache import ResultCache, result_key
+
+
+def make_photo(shade: int = 0) -> Image.Image:
+    """Create a photo-like image with some structure."""
+    image = Image.new('RGB', (256, 256), color=(200, 180, 160))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((60 + shade, 40, 196, 200), fill=(90, 60, 40))
+    draw.rectangle((0, 200, 256, 256), fill=(30, 30, 120))
+    return image
+
+
+def make_avatar(commentary: str = "Looking heroic!") -> Image.Image:
+    """Create a finished avatar with Claude analysis attached."""
+    avatar = Image.new('RGB', (32, 32), color='blue')
+    setattr(avatar, 'style_score', 0.9)
+    setattr(avatar, 'commentary', commentary)
+    return avatar
+
+
+class TestResultKey:
+    """Test cache keys."""
+
+    def test_same_upload_shares_key(self):
+        """Test the same photo file uploaded again gets the same key."""
+        buffer = io.BytesIO()
+        make_photo().save(buffer, format="JPEG", quality=70)
+        first = Image.open(io.BytesIO(buffer.getvalue()))
+        second = Image.open(io.BytesIO(buffer.getvalue()))
+
+        assert result_key(first, "a hero", -1, "standard") == result_key(second, "a hero", -1, "standard")
+
+    def test_similar_photos_do_not_share_key(self):
+        """Test two attendees in front of the same backdrop never share an avatar."""
+        photo = make_photo()
+        other = photo.copy()
+        other.putpixel((128, 128), (91, 60, 40))
+
+        assert result_key(photo, "a hero", -1, "standard") != result_key(other, "a hero", -1, "standard")
+
+    def test_key_normalizes_prompt(self):
+        """Test case and whitespace differences share a key."""
+        photo = make_photo()
+        assert result_key(photo, "A  Hero\n", -1, "standard") == result_key(photo, "a hero", -1, "standard")
+
+    def test_key_includes_seed_and_tier(self):
+        """Test seed and tier produce different keys."""
+        photo = make_photo()
+        key = result_key(photo, "a hero", 42, "standard")
+        assert key != result_key(photo, "a hero", 7, "standard")
+        assert key != result_key(photo, "a hero", 42, "premium")
+
+
+class TestResultCache:
+    """Test ResultCache on local disk."""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Create a local-only cache."""
+        return ResultCache(tmp_path / "result_cache", max_entries=2, ttl_seconds=3600)
+
+    def test_roundtrip_keeps_analysis_and_variants(self, cache):
+        """Test a cached avatar comes back with its commentary, score and variants."""
+        avatar = make_avatar()
+        setattr(avatar, 'variants', [make_avatar("Variant!")])
+        cache.put("key-1", avatar)
+
+        cached = cache.get("key-1")
+
+        assert cached.size == (32, 32)
+        assert cached.commentary == "Looking heroic!"
+        assert cached.style_score == pytest.approx(0.9)
+        assert [variant.commentary for variant in cached.variants] == ["Variant!"]
+
+    def test_hit_and_miss_metrics(self, cache):
+        """Test lookups are counted as hits and misses."""
+        hits = metrics.snapshot()["counters"].get("result_cache_lookups_total{result=hit,source=local}", 0)
+        misses = metrics.snapshot()["counters"].get("result_cache_lookups_total{result=miss}", 0)
+
+        assert cache.get("key-1") is None
+        cache.put("key-1", make_avatar())
+        assert cache.get("key-1") is not None
+
+        counters = metrics.snapshot()["counters"]
+        assert counters["result_cache_lookups_total{result=hit,source=local}"] == hits + 1
+        assert counters["result_cache_lookups_total{result=miss}"] == misses + 1
+        assert cache.hit_rate() == 0.5
+
+    def test_expired_entry_is_deleted(self, cache):
+        """Test entries older than the TTL are not served."""
+        with patch('result_cache.time.time', return_value=0):
+            cache.put("key-1", make_avatar())
+
+        assert cache.get("key-1") is None
+        assert not list(cache.directory.glob("key-1*"))
+
+    def test_least_recently_used_evicted(self, cache):
+        """Test the least recently used entry goes first."""
+        cache.put("key-1", make_avatar())
+        cache.put("key-2", make_avatar())
+        cache.get("key-1")
+        cache.put("key-3", make_avatar())
+
+        assert cache.get("key-2") is None
+        assert cache.get("key-1") is not None
+        assert cache.get("key-3") is not None
+
+    def test_index_reloaded_from_disk(self, cache):
+        """Test a new process sees entries written earlier."""
+        cache.put("key-1", make_avatar())
+
+        reloaded = ResultCache(cache.directory, max_entries=2, ttl_seconds=3600)
+
+        assert reloaded.get("key-1").commentary == "Looking heroic!"
+
+
+class TestGenerateAvatarCache:
+    """Test the cache is consulted by ImageGenerator.generate_avatar."""
+
+    @pytest.fixture
+    def generator(self):
+        """Create ImageGenerator without provider setup."""
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.provider = "replicate"
+        gen.generators = {"replicate": Mock()}
+        gen.generator = gen.generators["replicate"]
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        return gen
+
+    @patch('image_generator.AppConfig.ENABLE_DEMO_MODE', True)
+    @patch('image_generator.result_cache')
+    def test_hit_skips_provider(self, mock_cache, generator):
+        """Test a cached avatar is returned without a provider call."""
+        mock_cache.get.return_value = make_avatar()
+
+        with patch.object(generator, '_generate_with_provider') as mock_generate:
+            image, _, error = generator.generate_avatar(make_photo(), "Thor", "Red", "Mustang")
+
+        assert error is None
+        assert image.commentary == "Looking heroic!"
+        mock_generate.assert_not_called()
+        mock_cache.put.assert_not_called()
+
+    @patch('image_generator.AppConfig.ENABLE_SENSITIVITY_CACHE', False)
+    @patch('image_generator.AppConfig.ENABLE_DEMO_MODE', True)
+    @patch('image_generator.result_cache')
+    def test_miss_stores_result(self, mock_cache, generator):
+        """Test a generated avatar is cached under the lookup key."""
+        mock_cache.get.return_value = None
+        avatar = make_avatar()
+
+        with patch.object(generator, '_generate_with_provider', return_value=avatar), \
+                patch.object(generator, '_finish_image', return_value=avatar):
+            image, _, error = generator.generate_avatar(make_photo(), "Thor", "Red", "Mustang")
+
+        assert error is None
+        mock_cache.put.assert_called_once_with(mock_cache.get.call_args.args[0], avatar)
+
+    @patch('image_generator.AppConfig.ENABLE_SENSITIVITY_CACHE', False)
+    @patch('image_generator.AppConfig.ENABLE_DEMO_MODE', False)
+    @patch('image_generator.AppConfig.GENERATION_SEED', -1)
+    @patch('image_generator.result_cache')
+    def test_disabled_without_demo_mode_or_seed(self, mock_cache, generator):
+        """Test random-seed generations never use the cache."""
+        avatar = make_avatar()
+
+        with patch.object(generator, '_generate_with_provider', return_value=avatar), \
+                patch.object(generator, '_finish_image', return_value=avatar):
+            generator.generate_avatar(make_photo(), "Thor", "Red", "Mustang")
+
+        mock_cache.get.assert_not_called()
+        mock_cache.put.assert_not_called()
+
+    @patch('image_generator.AppConfig.ENABLE_SENSITIVITY_CACHE', False)
+    @patch('image_generator.AppConfig.ENABLE_DEMO_MODE', True)
+    @patch('image_generator.result_cache')
+    def test_regenerate_skips_cache(self, mock_cache, generator):
+        """Test a Regenerate never gets the avatar already shown."""
+        avatar = make_avatar()
+
+        with patch.object(generator, '_generate_with_provider', return_value=avatar), \
+                patch.object(generator, '_finish_image', return_value=avatar):
+            image, _, error = generator.generate_avatar(make_photo(), "Thor", "Red", "Mustang", use_cache=False)
+
+        assert image is avatar
+        mock_cache.get.assert_not_called()
+        mock_cache.put.assert_not_called()
+
+
+class TestRegenerateBypassesCache:
+    """Test Regenerate and prefetch ask for a new avatar."""
+
+    @patch('generation_pipeline.ImageGenerator')
+    def test_prefetch_uses_random_seed_without_cache(self, mock_generator_class):
+        """Test a prefetched variant is never the cached or fixed-seed avatar."""
+        from generation_pipeline import generate_variant
+        mock_generator_class.return_value.generate_avatar.return_value = (make_avatar(), 1.0, None)
+
+        generate_variant(make_photo(), {"superhero": "Thor", "color": "Red", "car": "Mustang"})
+
+        assert mock_generator_class.call_args.kwargs["seed"] == -1
+        assert mock_generator_class.return_value.generate_avatar.call_args.kwargs["use_cache"] is False
+
+    @pytest.mark.parametrize("regenerate, seed, use_cache", [(False, None, True), (True, -1, False)])
+    @patch('generation_pipeline.ImageGenerator')
+    def test_pipeline_regenerate(self, mock_generator_class, regenerate, seed, use_cache):
+        """Test only a regenerating pipeline run bypasses the cache and fixed seed."""
+        from generation_pipeline import run_generation_pipeline
+        mock_generator_class.return_value.generate_avatar.return_value = (None, 0, "stop here")
+
+        with patch('generation_pipeline.choose_generation_tier', return_value="standard"):
+            run_generation_pipeline(
+                make_photo(), {"superhero": "Thor", "color": "Red", "car": "Mustang"},
+                regenerate=regenerate
+            )
+
+        assert mock_generator_class.call_args.kwargs["seed"] == seed
+        assert mock_generator_class.return_value.generate_avatar.call_args.kwargs["use_cache"] is use_cache
+
+
+class TestPredictionResume:
+    """Test a refresh reattaches only to the current attempt's prediction."""
+
+    @pytest.mark.parametrize("status, keep_prediction", [("completed", False), ("processing", True)])
+    @patch('generation_pipeline.ImageGenerator')
+    @patch('generation_pipeline.db_manager')
+    def test_new_attempt_clears_prediction(self, mock_db, mock_generator_class, status, keep_prediction):
+        """Test a Regenerate forgets the finished prediction while a rerun keeps the running one."""
+        from generation_pipeline import run_generation_pipeline
+        mock_db.get_request.return_value = {
+            "status": status, "prediction_provider": "replicate", "prediction_id": "pred-1", "tier": None
+        }
+        mock_generator_class.return_value.generators = {"replicate": Mock()}
+        mock_generator_class.return_value.generate_avatar.return_value = (None, 0, "stop here")
+
+        with patch('generation_pipeline.choose_generation_tier', return_value="standard"):
+            run_generation_pipeline(
+                make_photo(), {"superhero": "Thor", "color": "Red", "car": "Mustang"},
+                request_id="req-1", regenerate=not keep_prediction
+            )
+
+        mock_db.update_request_processing.assert_called_once_with("req-1", "standard", keep_prediction=keep_prediction)
@@ -0,0 +1,177 @@
+"""Tests for the shared retry policy engine."""
+
+import sys
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from circuit_breaker import CircuitOpenError
+from deadline import Deadline, DeadlineExceeded
+from metrics import metrics
+from retry_policy import (
+    FATAL, RATE_LIMIT, SAFETY, TIMEOUT, TRANSIENT, UNKNOWN,
+    RetryBudget, RetryPolicy, classify_error
+)
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = Mock(status_code=status)
+    return requests.HTTPError(f"HTTP {status}", response=response)
+
+
+class TestClassifyError:
+    """Test error classification."""
+    
+    @pytest.mark.parametrize("error, expected", [
+        (Exception("E005: input was flagged as sensitive"), SAFETY),
+        (_http_error(429), RATE_LIMIT),
+        (Exception("Service is busy. Please wait a moment and try again."), RATE_LIMIT),
+        (requests.Timeout("read timed out"), TIMEOUT),
+        (_http_error(503), TRANSIENT),
+        (requests.ConnectionError("connection refused"), TRANSIENT),
+        (_http_error(401), FATAL),
+        (ValueError("Original photo is no longer available"), FATAL),
+        (DeadlineExceeded("provider"), FATAL),
+        (CircuitOpenError("fal circuit breaker is open"), FATAL),
+        (RuntimeError("CUDA error"), UNKNOWN),
+    ])
+    def test_classification(self, error, expected):
+        """Test each error maps to its class."""
+        assert classify_error(error) == expected
+
+
+class TestRetryBudget:
+    """Test the retry token bucket."""
+    
+    def test_budget_runs_out_and_refills(self, clock):
+        """Test retries are capped and come back with traffic and time."""
+        budget = RetryBudget(ratio=0.5, min_per_second=0.1, capacity=2, clock=clock)
+        
+        assert budget.try_spend()
+        assert budget.try_spend()
+        assert not budget.try_spend()
+        
+        budget.record_attempt()
+        budget.record_attempt()
+        assert budget.try_spend()
+        
+        clock.now += 10
+        assert budget.try_spend()
+
+
+class TestRetryPolicy:
+    """Test RetryPolicy.call."""
+    
+    @pytest.fixture
+    def sleep(self):
+        """Record sleeps instead of waiting."""
+        return Mock()
+    
+    def _policy(self, sleep, capacity=10, max_attempts=3):
+        budget = RetryBudget(ratio=0.2, min_per_second=0, capacity=capacity)
+        return RetryPolicy(
+            "test", max_attempts=max_attempts, base_delay=1.0, max_delay=8.0,
+            budget=budget, rate_limit_delay=5.0, sleep=sleep
+        )
+    
+    def test_retries_transient_errors_until_success(self, sleep):
+        """Test transient failures are retried with jittered delays."""
+        metrics.reset()
+        fn = Mock(side_effect=[_http_error(502), requests.ConnectionError("reset"), "ok"])
+        
+        assert self._policy(sleep).call(fn) == "ok"
+        
+        assert [call.args[0] for call in fn.call_args_list] == [0, 1, 2]
+        assert sleep.call_count == 2
+        assert all(1.0 <= call.args[0] <= 8.0 for call in sleep.call_args_list)
+        assert metrics.get_counter("retries_total", policy="test", error_class=TRANSIENT) == 2
+    
+    def test_fatal_errors_are_not_retried(self, sleep):
+        """Test fatal errors are raised on the first attempt."""
+        fn = Mock(side_effect=_http_error(400))
+        
+        with pytest.raises(requests.HTTPError):
+            self._policy(sleep).call(fn)
+        
+        assert fn.call_count == 1
+        sleep.assert_not_called()
+    
+    def test_rate_limit_waits_at_least_the_rate_limit_delay(self, sleep):
+        """Test rate-limit retries back off further."""
+        fn = Mock(side_effect=[_http_error(429), "ok"])
+        
+        self._policy(sleep).call(fn)
+        
+        assert sleep.call_args.args[0] >= 5.0
+    
+    def test_exhausted_budget_stops_retries(self, sleep):
+        """Test an empty budget turns a retry into a failure."""
+        metrics.reset()
+        fn = Mock(side_effect=_http_error(503))
+        
+        with pytest.raises(requests.HTTPError):
+            self._policy(sleep, capacity=0).call(fn)
+        
+        assert fn.call_count == 1
+        assert metrics.get_counter("retry_budget_exhausted_total", policy="test") == 1
+    
+    def test_deadline_stops_retries(self, sleep):
+        """Test no retry is started when its delay would overrun the deadline."""
+        fn = Mock(side_effect=_http_error(503))
+        
+        with pytest.raises(requests.HTTPError):
+            self._policy(sleep).call(fn, deadline=Deadline(0.5))
+        
+        assert fn.call_count == 1
+    
+    def test_on_retry_and_non_retryable(self, sleep):
+        """Test the retry hook sees the error class and listed types propagate."""
+        on_retry = Mock()
+        fn = Mock(side_effect=[Exception("E005 flagged as sensitive"), KeyError("stop")])
+        
+        with pytest.raises(KeyError):
+            self._policy(sleep).call(fn, on_retry=on_retry, non_retryable=(KeyError,))
+        
+        assert on_retry.call_args.args[1] == SAFETY
+        assert fn.call_count == 2
+
+
+class TestProviderRetries:
+    """Test provider calls go through the retry policy."""
+    
+    def test_fal_rate_limit_is_retried(self):
+        """Test Fal errors are now retried instead of failing the generation."""
+        from image_generator import ImageGenerator
+        
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        gen.provider = "fal"
+        fal = Mock(model_name="fal-model")
+        avatar = Image.new('RGB', (10, 10))
+        fal.generate_avatar.side_effect = [
+            (None, 1.0, "Service is busy. Please wait a moment and try again."),
+            (avatar, 1.0, None),
+        ]
+        gen.generators = {"fal": fal}
+        gen.generator = fal
+        
+        policy = RetryPolicy(
+            "fal", max_attempts=3, base_delay=1.0, max_delay=8.0,
+            budget=RetryBudget(ratio=0.2, min_per_second=0, capacity=10), sleep=Mock()
+        )
+        breaker = Mock()
+        with patch('image_generator.get_retry_policy', return_value=policy):
+            with patch('image_generator.get_circuit_breaker', return_value=breaker):
+                result = gen._run_provider(
+                    "fal", fal, avatar, "prompt", "Thor", "Red", "Mustang", 3, None, None
+                )
+        
+        assert result is avatar
+        assert fal.generate_avatar.call_count == 2
@@ -0,0 +1,137 @@
+"""Tests for the learned content-filter sensitivity cache."""
+
+import sys
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from metrics import metrics
+from retry_policy import RetryBudget, RetryPolicy
+from sensitivity_cache import SensitivityCache, combination_key
+
+
+class TestSensitivityCache:
+    """Test SensitivityCache lookups."""
+    
+    @pytest.fixture
+    def cache(self):
+        """Create an in-memory cache."""
+        return SensitivityCache(feature_threshold=2, persist=False)
+    
+    def test_combination_key_is_normalized(self):
+        """Test spelling variants share a key."""
+        assert combination_key("Spider-Man", " Ford  Mustang ", "RED") == "spider man|ford mustang|red"
+    
+    def test_flagged_combination_is_sensitive(self, cache):
+        """Test a flagged combination is a hit and the hit rate is reported."""
+        metrics.reset()
+        assert not cache.is_sensitive("Hulk", "Dodge Viper", "Green")
+        
+        cache.record_flag("Hulk", "Dodge Viper", "Green")
+        
+        assert cache.is_sensitive("hulk", "dodge viper", "green")
+        assert not cache.is_sensitive("Hulk", "Tesla Model S", "Green")
+        assert cache.hit_rate() == pytest.approx(1 / 3)
+        assert metrics.get_counter("sensitivity_cache_lookups_total", result="hit") == 1
+    
+    def test_repeatedly_flagged_car_is_sensitive_with_any_hero(self, cache):
+        """Test a car flagged in enough combinations marks every combination with it."""
+        cache.record_flag("Hulk", "Dodge Viper", "Green")
+        assert not cache.is_sensitive("Thor", "Dodge Viper", "Blue")
+        
+        cache.record_flag("Batman", "Dodge Viper", "Black")
+        
+        assert cache.is_sensitive("Thor", "Dodge Viper", "Blue")
+    
+    def test_superhero_and_color_are_not_generalized(self, cache):
+        """Test a common superhero or color never makes other combinations sensitive."""
+        cache.record_flag("Batman", "Dodge Viper", "Red")
+        cache.record_flag("Batman", "Mustang", "Red")
+        cache.record_flag("Batman", "Tesla Model S", "Red")
+        
+        assert not cache.is_sensitive("Batman", "Honda Civic", "Blue")
+        assert not cache.is_sensitive("Thor", "Honda Civic", "Red")
+    
+    def test_car_needs_flag_ratio(self, cache):
+        """Test a car flagged in only a small share of its lookups stays usable."""
+        for _ in range(8):
+            cache.is_sensitive("Thor", "Dodge Viper", "Blue")
+        cache.record_flag("Hulk", "Dodge Viper", "Green")
+        cache.record_flag("Batman", "Dodge Viper", "Black")
+        
+        assert not cache.is_sensitive("Thor", "Dodge Viper", "Blue")
+    
+    def test_flags_expire(self):
+        """Test flags older than the TTL are forgotten."""
+        cache = SensitivityCache(ttl_seconds=60, persist=False)
+        with patch('sensitivity_cache.time.time', return_value=1000.0):
+            cache.record_flag("Hulk", "Dodge Viper", "Green")
+        with patch('sensitivity_cache.time.time', return_value=1100.0):
+            assert not cache.is_sensitive("Hulk", "Dodge Viper", "Green")
+    
+    def test_flags_are_persisted_and_loaded(self):
+        """Test flags are written to and loaded from the database."""
+        db_manager = Mock()
+        db_manager.get_sensitive_prompts.return_value = [{
+            "combination_key": "hulk|dodge viper|green",
+            "last_flagged_at": "2099-01-01T00:00:00"
+        }]
+        
+        with patch.dict(sys.modules, {"database": Mock(db_manager=db_manager)}):
+            cache = SensitivityCache()
+            assert cache.is_sensitive("Hulk", "Dodge Viper", "Green")
+            cache.record_flag("Thor", "Mustang", "Blue")
+        
+        db_manager.record_sensitive_prompt.assert_called_once_with(
+            "thor|mustang|blue", "thor", "mustang", "blue"
+        )
+
+
+class TestPromptSelection:
+    """Test the generator uses the cache."""
+    
+    @pytest.fixture
+    def generator(self):
+        """Create a Replicate-only ImageGenerator with a mocked provider."""
+        from image_generator import ImageGenerator
+        gen = ImageGenerator.__new__(ImageGenerator)
+        gen.tier = "standard"
+        gen.variants = 1
+        gen.seed = -1
+        gen.provider = "replicate"
+        gen.generators = {"replicate": Mock(model_name="replicate-model", input_encoding="png")}
+        gen.generator = gen.generators["replicate"]
+        return gen
+    
+    def test_flag_is_learned_and_skips_next_first_attempt(self, generator):
+        """Test an E005 is remembered and the next request starts with the fallback prompt."""
+        from config import AppConfig
+        
+        cache = SensitivityCache(persist=False)
+        replicate = generator.generators["replicate"]
+        replicate.generate_outputs.side_effect = [Exception("E005: flagged as sensitive"), ["url"], ["url"]]
+        policy = RetryPolicy(
+            "replicate", max_attempts=3, base_delay=1.0, max_delay=8.0,
+            budget=RetryBudget(ratio=0.2, min_per_second=0, capacity=10), sleep=Mock()
+        )
+        
+        with patch('image_generator.sensitivity_cache', cache), \
+                patch('image_generator.get_retry_policy', return_value=policy), \
+                patch('image_generator.get_circuit_breaker', return_value=Mock()), \
+                patch.object(generator, '_image_input', return_value="data:image/png;base64,xx"), \
+                patch.object(generator, '_load_output', return_value=Image.new('RGB', (8, 8))), \
+                patch.object(generator, '_add_logo_overlays', side_effect=lambda image: image), \
+                patch('image_generator.get_claude_commentary', return_value=(0.9, "Nice")):
+            photo = Image.new('RGB', (64, 64))
+            _, _, first_error = generator.generate_avatar(photo, "Hulk", "Green", "Dodge Viper")
+            _, _, second_error = generator.generate_avatar(photo, "Hulk", "Green", "Dodge Viper")
+        
+        fallback = AppConfig.get_fallback_prompt("Hulk", "Green", "Dodge Viper")
+        prompts = [call.args[1] for call in replicate.generate_outputs.call_args_list]
+        assert first_error is None and second_error is None
+        assert prompts == [AppConfig.get_prompt("Hulk", "Green", "Dodge Viper"), fallback, fallback]
+        assert cache.hit_rate() == 0.5
@@ -0,0 +1,48 @@
+"""Tests for the provider input upload cache."""
+
+from unittest.mock import Mock, patch
+
+from PIL import Image
+
+from upload_cache import UploadCache, image_digest
+
+
+class TestUploadCache:
+    """Test UploadCache."""
+    
+    def test_uploads_once_per_provider(self):
+        """Test the same image is uploaded once for each provider."""
+        cache = UploadCache()
+        upload = Mock(side_effect=["https://a/1.png", "https://b/1.png"])
+        image = Image.new('RGB', (8, 8), color='red')
+        
+        assert cache.get_or_upload("replicate", image, upload) == "https://a/1.png"
+        assert cache.get_or_upload("replicate", image.copy(), upload) == "https://a/1.png"
+        assert cache.get_or_upload("fal", image, upload) == "https://b/1.png"
+        assert upload.call_count == 2
+    
+    def test_different_images_upload_separately(self):
+        """Test the key depends on pixel data."""
+        red = Image.new('RGB', (8, 8), color='red')
+        blue = Image.new('RGB', (8, 8), color='blue')
+        assert image_digest(red) != image_digest(blue)
+    
+    def test_expired_entries_are_reuploaded(self):
+        """Test URLs are only reused within the TTL."""
+        cache = UploadCache(ttl_seconds=10)
+        cache.put("fal", "digest", "https://old.png")
+        
+        with patch('upload_cache.time.time', return_value=10**12):
+            assert cache.get("fal", "digest") is None
+    
+    def test_evicts_oldest(self):
+        """Test the cache is bounded."""
+        cache = UploadCache(max_entries=2)
+        cache.put("fal", "a", "https://a.png")
+        cache.put("fal", "b", "https://b.png")
+        cache.get("fal", "a")
+        cache.put("fal", "c", "https://c.png")
+        
+        assert cache.get("fal", "b") is None
+        assert cache.get("fal", "a") == "https://a.png"
+        assert cache.get("fal", "c") == "https://c.png"
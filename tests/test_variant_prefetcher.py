@@ -0,0 +1,96 @@
+"""Tests for background prefetch of Regenerate variants."""
+
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from variant_prefetcher import VariantPrefetcher
+
+FORM_DATA = {"superhero": "Thor", "color": "Red", "car": "Mustang"}
+
+
+class TestVariantPrefetcher:
+    """Test VariantPrefetcher."""
+
+    @pytest.fixture
+    def release(self):
+        """Event that lets fake prefetches finish."""
+        event = threading.Event()
+        yield event
+        event.set()
+
+    @pytest.fixture
+    def fake_generate(self, release):
+        """Patch variant generation with one that waits for ``release``."""
+        def generate(photo, form_data, progress_callback=None, cancel_event=None):
+            release.wait(timeout=5)
+            return {"avatar": photo, "generation_time": 1.0, "error": None, "prefetched": True}
+
+        with patch('variant_prefetcher.generate_variant', side_effect=generate) as mock_generate:
+            yield mock_generate
+
+    @patch('variant_prefetcher.generation_load', return_value=0)
+    def test_prefetch_is_taken_once(self, mock_load, fake_generate, release):
+        """Test a finished prefetch is handed out once per request."""
+        prefetcher = VariantPrefetcher(max_concurrent=1, max_load=4)
+        photo = Image.new('RGB', (8, 8))
+
+        assert prefetcher.start("req-1", photo, FORM_DATA)
+        assert prefetcher.start("req-1", photo, FORM_DATA)  # already running
+        release.set()
+
+        job = prefetcher.take("req-1")
+        job._future.result(timeout=5)
+        assert job.result()["avatar"] is photo
+        assert prefetcher.take("req-1") is None
+        fake_generate.assert_called_once()
+
+    @patch('variant_prefetcher.generation_load', return_value=4)
+    def test_skipped_when_generations_are_busy(self, mock_load, fake_generate):
+        """Test no prefetch starts while first-time generations are at the load limit."""
+        prefetcher = VariantPrefetcher(max_concurrent=1, max_load=4)
+
+        assert not prefetcher.start("req-1", Image.new('RGB', (8, 8)), FORM_DATA)
+        assert prefetcher.take("req-1") is None
+        fake_generate.assert_not_called()
+
+    @patch('variant_prefetcher.generation_load', return_value=0)
+    def test_skipped_at_concurrency_cap(self, mock_load, fake_generate):
+        """Test prefetches beyond the global cap are skipped, not queued."""
+        prefetcher = VariantPrefetcher(max_concurrent=1, max_load=4)
+        photo = Image.new('RGB', (8, 8))
+
+        assert prefetcher.start("req-1", photo, FORM_DATA)
+        assert not prefetcher.start("req-2", photo, FORM_DATA)
+
+    @patch('variant_prefetcher.generation_load', return_value=0)
+    def test_discard_cancels_prefetch(self, mock_load, fake_generate):
+        """Test discarding a request cancels its prefetch."""
+        prefetcher = VariantPrefetcher(max_concurrent=1, max_load=4)
+        prefetcher.start("req-1", Image.new('RGB', (8, 8)), FORM_DATA)
+        job = prefetcher._jobs["req-1"]
+
+        prefetcher.discard("req-1")
+
+        assert job.cancel_event.is_set()
+        assert prefetcher.take("req-1") is None
+
+    @patch('variant_prefetcher.generation_load', return_value=0)
+    def test_oldest_prefetch_evicted(self, mock_load, fake_generate, release):
+        """Test abandoned prefetches are dropped once the entry limit is reached."""
+        prefetcher = VariantPrefetcher(max_concurrent=2, max_load=4, max_entries=1)
+        photo = Image.new('RGB', (8, 8))
+
+        prefetcher.start("req-1", photo, FORM_DATA)
+        first = prefetcher._jobs["req-1"]
+        prefetcher.start("req-2", photo, FORM_DATA)
+
+        assert first.cancel_event.is_set()
+        assert prefetcher.take("req-1") is None
+        assert prefetcher.take("req-2") is not None
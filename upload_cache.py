@@ -0,0 +1,121 @@
+"""Provider input upload cache for Superhero Avatar Generator.
+
+The processed photo is uploaded to each provider's file storage once and
+then referenced by URL for every retry and regeneration, instead of
+resending a multi-megabyte data URI with each request.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from PIL import Image
+
+from config import AppConfig
+
+
+def image_digest(image: Image.Image) -> str:
+    """Get a digest identifying an image's pixels.
+
+    Args:
+        image: PIL Image
+
+    Returns:
+        Hex digest of the mode, size and pixel data
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """Bounded cache of uploaded input URLs keyed by provider and image."""
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 3600):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum uploads to remember before evicting the oldest
+            ttl_seconds: How long an uploaded URL is reused
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, digest: str) -> Optional[str]:
+        """Get a cached upload URL.
+
+        Args:
+            provider: Provider the image was uploaded to
+            digest: Image digest
+
+        Returns:
+            Uploaded URL, or None if missing or expired
+        """
+        key = (provider, digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            url, uploaded_at = entry
+            if time.time() - uploaded_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return url
+
+    def put(self, provider: str, digest: str, url: str) -> None:
+        """Remember an uploaded URL.
+
+        Args:
+            provider: Provider the image was uploaded to
+            digest: Image digest
+            url: Uploaded URL
+        """
+        with self._lock:
+            self._entries[(provider, digest)] = (url, time.time())
+            self._entries.move_to_end((provider, digest))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_upload(
+        self,
+        provider: str,
+        image: Image.Image,
+        upload: Callable[[Image.Image], str]
+    ) -> str:
+        """Get the uploaded URL for an image, uploading it on first use.
+
+        Args:
+            provider: Provider whose storage the image belongs in
+            image: Image to upload
+            upload: Function uploading the image and returning its URL
+
+        Returns:
+            URL referencing the uploaded image
+        """
+        digest = image_digest(image)
+        url = self.get(provider, digest)
+        if url is not None:
+            return url
+
+        url = upload(image)
+        self.put(provider, digest, url)
+        print(f"Uploaded input image to {provider}")
+        return url
+
+    def clear(self) -> None:
+        """Forget all uploads."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Create global upload cache instance
+upload_cache = UploadCache(
+    max_entries=AppConfig.INPUT_UPLOAD_CACHE_SIZE,
+    ttl_seconds=AppConfig.INPUT_UPLOAD_TTL_SECONDS
+)
@@ -155,22 +155,28 @@ def save_image(image: Image.Image, directory: Path, filename: str) -> Path:
                 raise ValueError("Missing Databricks credentials")
             
             # Use Databricks SDK to upload to volume
-            from databricks.sdk import WorkspaceClient
+            from http_transport import get_workspace_client
+            from retry_policy import get_retry_policy
             from io import BytesIO
             
             print(f"Attempting to upload to Databricks volume: {filepath}")
             
-            # Initialize Databricks client with timeout
-            w = WorkspaceClient(host=os.getenv("DATABRICKS_HOST"), token=os.getenv("DATABRICKS_TOKEN"))
+            # Reuse the shared Databricks client and its connections
+            w = get_workspace_client(os.getenv("DATABRICKS_HOST"), os.getenv("DATABRICKS_TOKEN"))
             
             # Convert PIL Image to bytes
             buffer = BytesIO()
             image.save(buffer, format="PNG", optimize=True)
             buffer.seek(0)
             
-            # Upload to Databricks volume
+            # Upload to Databricks volume, retrying transient failures
             volume_file_path = str(filepath)
-            w.files.upload(volume_file_path, buffer, overwrite=True)
+            
+            def upload(attempt: int) -> None:
+                buffer.seek(0)
+                w.files.upload(volume_file_path, buffer, overwrite=True)
+            
+            get_retry_policy("storage").call(upload)
             
             print(f"Successfully uploaded image to Databricks volume: {volume_file_path}")
         except Exception as e:
@@ -298,13 +304,36 @@ def show_info(message: str) -> None:
     st.info(f"ℹ️ {message}")
 
 
+def cancel_generation() -> None:
+    """Cancel the session's in-flight generation, if any.
+    
+    The provider prediction is cancelled so it stops using provider
+    capacity. The request is forgotten so the next attempt starts a fresh
+    prediction instead of reattaching to the cancelled one.
+    """
+    job = st.session_state.get("generation_job")
+    if job is not None:
+        try:
+            if not job.done():
+                job.cancel()
+        except Exception as e:
+            print(f"Could not cancel generation: {e}")
+        st.session_state.generation_job = None
+        st.session_state.request_id = None
+        st.query_params.pop("request_id", None)
+        st.query_params.pop("attempt", None)
+
+
 def reset_session_state() -> None:
     """Reset all session state variables."""
+    cancel_generation()
     keys_to_reset = [
         "name", "email", "superhero", "car", "color",
         "photo", "generated_avatar", "generation_time",
-        "step", "form_submitted", "request_id"
+        "step", "form_submitted", "request_id", "generation_job", "variant_pool",
+        "speculative_key", "generation_attempt"
     ]
     for key in keys_to_reset:
         if key in st.session_state:
-            del st.session_state[key]
\ No newline at end of file
+            del st.session_state[key]
+    st.query_params.clear()
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""Background prefetch of Regenerate variants for Superhero Avatar Generator.
+
+While a user looks at their result, one more avatar is generated for the
+request on a small dedicated pool, so "Regenerate" can show it immediately.
+Prefetching is speculative: it has its own concurrency cap and is skipped
+when first-time generations are busy, so it never takes a generation
+worker away from another session.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from PIL import Image
+
+from config import AppConfig
+from generation_executor import GenerationExecutor, GenerationJob
+from generation_pipeline import generate_variant, generation_load
+from metrics import metrics
+
+
+class VariantPrefetcher:
+    """Prefetched Regenerate jobs keyed by request ID."""
+
+    def __init__(self, max_concurrent: int, max_load: int, max_entries: int = 32):
+        """Initialize the prefetcher.
+
+        Args:
+            max_concurrent: Prefetches running at once across all sessions
+            max_load: Generations running or queued at which prefetching stops
+            max_entries: Prefetched jobs kept before the oldest is dropped
+                (covers sessions that leave without regenerating)
+        """
+        self.max_load = max_load
+        self.max_entries = max_entries
+        self._executor = GenerationExecutor(max_workers=max_concurrent, max_pending=max_concurrent)
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, request_id: str, photo: Image.Image, form_data: Dict[str, str]) -> bool:
+        """Start prefetching a variant for a request if there is spare capacity.
+
+        Args:
+            request_id: Request the variant belongs to
+            photo: Original photo
+            form_data: User's selections (and optional tier)
+
+        Returns:
+            True if a prefetch is running or ready for the request
+        """
+        with self._lock:
+            if request_id in self._jobs:
+                return True
+
+        try:
+            load = generation_load()
+        except Exception as e:
+            print(f"Could not read generation load: {e}")
+            load = self.max_load
+        if load >= self.max_load:
+            metrics.increment("variant_prefetch_total", result="skipped_load")
+            return False
+
+        try:
+            job = self._executor.submit(generate_variant, photo, dict(form_data))
+        except RuntimeError:
+            # Every prefetch slot is taken
+            metrics.increment("variant_prefetch_total", result="skipped_cap")
+            return False
+
+        with self._lock:
+            self._jobs[request_id] = job
+            evicted = []
+            while len(self._jobs) > self.max_entries:
+                evicted.append(self._jobs.popitem(last=False)[1])
+        for old_job in evicted:
+            old_job.cancel()
+            metrics.increment("variant_prefetch_total", result="evicted")
+
+        metrics.increment("variant_prefetch_total", result="started")
+        return True
+
+    def take(self, request_id: str) -> Optional[GenerationJob]:
+        """Claim a request's prefetch job, finished or still running.
+
+        Args:
+            request_id: Request to regenerate
+
+        Returns:
+            Job to poll like any generation job, or None if none was started
+        """
+        with self._lock:
+            job = self._jobs.pop(request_id, None)
+        if job is not None:
+            metrics.increment("variant_prefetch_total", result="used" if job.done() else "used_running")
+        return job
+
+    def discard(self, request_id: Optional[str]) -> None:
+        """Cancel and forget a request's prefetch, e.g. when the session resets.
+
+        Args:
+            request_id: Request whose prefetch is no longer wanted
+        """
+        with self._lock:
+            job = self._jobs.pop(request_id, None) if request_id else None
+        if job is not None:
+            job.cancel()
+            metrics.increment("variant_prefetch_total", result="discarded")
+
+
+# Create global variant prefetcher instance
+variant_prefetcher = VariantPrefetcher(
+    max_concurrent=AppConfig.PREFETCH_MAX_CONCURRENT,
+    max_load=AppConfig.PREFETCH_MAX_LOAD
+)